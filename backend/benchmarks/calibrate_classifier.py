@@ -0,0 +1,217 @@
+"""
+Calibrate the local category classifier against labelled images and the LLM.
+
+Samples are read from a directory with one sub-directory per category:
+    samples/artist/, samples/cartoonist/, samples/sticker/, samples/realistic/
+(the full category names are accepted too). Without --samples the built-in
+reference images are used, which is only useful as a smoke test.
+
+Run from the backend/ directory:
+    python benchmarks/calibrate_classifier.py --samples samples/ --llm
+    python benchmarks/calibrate_classifier.py --samples samples/ --fit category_model.json
+
+The report shows local accuracy against the labels and, with --llm, against
+the configured vision LLM, plus how many images each confidence threshold
+would keep local and how accurate those local decisions are.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from run_benchmarks import build_reference_images  # noqa: E402
+
+from services.category_classifier import (  # noqa: E402
+    CATEGORIES,
+    CategoryClassifier,
+    extract_features,
+    fit_model,
+)
+
+LABEL_ALIASES = {
+    "artist": "Artist",
+    "cartoonist": "Cartoonist",
+    "cartoon": "Cartoonist",
+    "sticker": "Sticker",
+    "realistic": "Realistic Image Store",
+    "realistic image store": "Realistic Image Store",
+    "photo": "Realistic Image Store",
+}
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
+
+REFERENCE_LABELS = {
+    "photo_1600_jpeg": "Realistic Image Store",
+    "cartoon_1024_png": "Cartoonist",
+    "sticker_800_rgba_png": "Sticker",
+    "large_3000x2000_jpeg": "Realistic Image Store",
+}
+
+THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95]
+
+
+def load_samples(directory: Optional[str]) -> List[Tuple[str, str, bytes]]:
+    """Return (name, label, image bytes) for every labelled sample"""
+    if not directory:
+        images = build_reference_images()
+        return [(name, REFERENCE_LABELS[name], data) for name, data in images.items()]
+
+    samples = []
+    for folder in sorted(Path(directory).iterdir()):
+        if not folder.is_dir():
+            continue
+        label = LABEL_ALIASES.get(folder.name.lower().replace("_", " ").replace("-", " "))
+        if label is None:
+            print(f"Skipping {folder}: not a category name")
+            continue
+        for path in sorted(folder.iterdir()):
+            if path.suffix.lower() in IMAGE_SUFFIXES:
+                samples.append((f"{folder.name}/{path.name}", label, path.read_bytes()))
+    return samples
+
+
+async def llm_labels(samples: List[Tuple[str, str, bytes]]) -> List[Optional[str]]:
+    from services.http_client import http_client
+    from services.llm_service import LLMService
+
+    service = LLMService()
+    labels = []
+    try:
+        for _, _, data in samples:
+            analysis = await service.analyze_image(data)
+            category = analysis.get("category")
+            labels.append(category if category in CATEGORIES else None)
+    finally:
+        await http_client.close()
+    return labels
+
+
+def _accuracy(pairs: List[Tuple[Optional[str], Optional[str]]]) -> Optional[float]:
+    pairs = [(a, b) for a, b in pairs if a is not None and b is not None]
+    if not pairs:
+        return None
+    return sum(a == b for a, b in pairs) / len(pairs)
+
+
+def build_calibration_report(
+    samples: List[Tuple[str, str, bytes]],
+    predictions: List[Dict[str, Any]],
+    llm: Optional[List[Optional[str]]],
+) -> Dict[str, Any]:
+    labels = [label for _, label, _ in samples]
+    local = [p["category"] for p in predictions]
+    report: Dict[str, Any] = {
+        "samples": len(samples),
+        "local_accuracy": _accuracy(list(zip(local, labels))),
+        "median_ms": sorted(p["ms"] for p in predictions)[len(predictions) // 2] if predictions else None,
+        "thresholds": [],
+    }
+    if llm is not None:
+        report["llm_accuracy"] = _accuracy(list(zip(llm, labels)))
+        report["local_vs_llm_agreement"] = _accuracy(list(zip(local, llm)))
+
+    for threshold in THRESHOLDS:
+        kept = [i for i, p in enumerate(predictions) if p["confidence"] >= threshold]
+        row: Dict[str, Any] = {
+            "threshold": threshold,
+            "local_fraction": len(kept) / len(predictions) if predictions else 0.0,
+            "local_accuracy": _accuracy([(local[i], labels[i]) for i in kept]),
+        }
+        if llm is not None:
+            # What the deployed pipeline would return: local when confident, LLM otherwise
+            combined = [local[i] if i in kept else llm[i] for i in range(len(predictions))]
+            row["local_vs_llm_agreement"] = _accuracy([(local[i], llm[i]) for i in kept])
+            row["pipeline_accuracy"] = _accuracy(list(zip(combined, labels)))
+        report["thresholds"].append(row)
+
+    confusion: Dict[str, Dict[str, int]] = {c: {p: 0 for p in CATEGORIES} for c in CATEGORIES}
+    for label, prediction in zip(labels, local):
+        if prediction is not None:
+            confusion[label][prediction] += 1
+    report["confusion"] = confusion
+    return report
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 100:.1f}%"
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"samples: {report['samples']}   median classify time: {report['median_ms']:.2f} ms")
+    print(f"local accuracy: {_fmt(report['local_accuracy'])}")
+    if "llm_accuracy" in report:
+        print(f"LLM accuracy: {_fmt(report['llm_accuracy'])}   local/LLM agreement: {_fmt(report['local_vs_llm_agreement'])}")
+    print()
+    header = f"{'threshold':>9}  {'kept local':>10}  {'local acc':>9}"
+    if "llm_accuracy" in report:
+        header += f"  {'vs LLM':>7}  {'pipeline':>8}"
+    print(header)
+    for row in report["thresholds"]:
+        line = f"{row['threshold']:>9.2f}  {_fmt(row['local_fraction']):>10}  {_fmt(row['local_accuracy']):>9}"
+        if "llm_accuracy" in report:
+            line += f"  {_fmt(row['local_vs_llm_agreement']):>7}  {_fmt(row['pipeline_accuracy']):>8}"
+        print(line)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", help="Directory of labelled images, one sub-directory per category")
+    parser.add_argument("--model", help="Category model JSON to evaluate (default: built-in priors)")
+    parser.add_argument("--llm", action="store_true", help="Also classify every sample with the configured vision LLM")
+    parser.add_argument("--fit", help="Fit a model from the samples and write it to this path")
+    parser.add_argument("--output", help="Where to write the JSON report")
+    args = parser.parse_args(argv)
+
+    samples = load_samples(args.samples)
+    if not samples:
+        print("No labelled samples found")
+        return 1
+
+    classifier = CategoryClassifier(model_path=args.model)
+    # Measured whether or not serving would enable it
+    classifier.enabled = True
+    if args.fit:
+        model = fit_model([extract_features(data) for _, _, data in samples], [label for _, label, _ in samples])
+        with open(args.fit, "w", encoding="utf-8") as f:
+            json.dump(model, f, indent=2)
+            f.write("\n")
+        classifier.load_model(model)
+        print(f"Wrote fitted model to {args.fit} (use CATEGORY_MODEL_PATH to load it)\n")
+
+    predictions = []
+    for _, _, data in samples:
+        started = time.perf_counter()
+        result = classifier.classify(data) or {"category": None, "confidence": 0.0}
+        result["ms"] = (time.perf_counter() - started) * 1000
+        predictions.append(result)
+
+    llm = asyncio.run(llm_labels(samples)) if args.llm else None
+    report = build_calibration_report(samples, predictions, llm)
+    report["samples_detail"] = [
+        {
+            "name": name,
+            "label": label,
+            "local": p["category"],
+            "confidence": round(p["confidence"], 4),
+            **({"llm": llm[i]} if llm is not None else {}),
+        }
+        for i, ((name, label, _), p) in enumerate(zip(samples, predictions))
+    ]
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,562 @@
+"""
+Benchmark suite for the rendering, scraping and response parsing hot paths.
+
+Run from the backend/ directory:
+    python benchmarks/run_benchmarks.py --output benchmark_results.json
+    python benchmarks/run_benchmarks.py --compare baseline.json --threshold 0.15
+
+Results are written as JSON so runs from different releases can be compared.
+With --compare, the script exits with status 1 when any benchmark's median
+time regresses by more than the threshold.
+"""
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+sys.path.insert(0, str(BACKEND_DIR))
+
+import orjson  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+from services import motion_engine  # noqa: E402
+from services.compression import CompressionMiddleware  # noqa: E402
+from services.copy_engine import CopyEngine  # noqa: E402
+from services.http_client import http_client  # noqa: E402
+from services.image_index import HASH_FUNCTIONS, PerceptualIndex  # noqa: E402
+from services.image_service import ImageService  # noqa: E402
+from services.llm_service import LLMService  # noqa: E402
+from services.motion_service import MotionService  # noqa: E402
+from services.product_scraper import ProductScraper  # noqa: E402
+from services.selector_memory import SelectorMemory  # noqa: E402
+from services import text_layout  # noqa: E402
+
+SCHEMA_VERSION = 1
+
+AD_SIZES = {
+    "facebook": (1080, 1080),
+    "twitter": (1200, 675),
+    "tiktok": (1080, 1920),
+}
+
+# ---------------------------------------------------------------------------
+# Reference inputs
+# ---------------------------------------------------------------------------
+
+def _encode(img: Image.Image, fmt: str, **kwargs) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, **kwargs)
+    return buffer.getvalue()
+
+
+def build_reference_images() -> Dict[str, bytes]:
+    """Build a deterministic set of reference images covering each visual style"""
+    images = {}
+
+    # Photo-like: smooth gradient with a soft subject and fine noise
+    photo = Image.linear_gradient("L").resize((1600, 1600)).convert("RGB")
+    noise = Image.effect_noise((1600, 1600), 24).convert("RGB")
+    photo = Image.blend(photo, noise, 0.15)
+    draw = ImageDraw.Draw(photo)
+    draw.ellipse((400, 400, 1200, 1200), fill=(120, 90, 60))
+    images["photo_1600_jpeg"] = _encode(photo, "JPEG", quality=90)
+
+    # Cartoon: a handful of flat colours and hard outlines
+    cartoon = Image.new("RGB", (1024, 1024), (255, 220, 120))
+    draw = ImageDraw.Draw(cartoon)
+    draw.ellipse((212, 212, 812, 812), fill=(250, 150, 60), outline=(20, 20, 20), width=12)
+    draw.ellipse((380, 420, 460, 500), fill=(20, 20, 20))
+    draw.ellipse((564, 420, 644, 500), fill=(20, 20, 20))
+    draw.arc((380, 520, 644, 700), 10, 170, fill=(20, 20, 20), width=12)
+    images["cartoon_1024_png"] = _encode(cartoon, "PNG")
+
+    # Sticker: bold shape on a transparent background
+    sticker = Image.new("RGBA", (800, 800), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(sticker)
+    draw.rounded_rectangle((80, 80, 720, 720), radius=120, fill=(255, 255, 255, 255))
+    draw.rounded_rectangle((120, 120, 680, 680), radius=100, fill=(90, 170, 255, 255))
+    draw.polygon([(400, 180), (620, 600), (180, 600)], fill=(255, 90, 120, 255))
+    images["sticker_800_rgba_png"] = _encode(sticker, "PNG")
+
+    # Large camera-sized photo to exercise the decode/resize path
+    large = Image.effect_noise((3000, 2000), 48).convert("RGB")
+    images["large_3000x2000_jpeg"] = _encode(large, "JPEG", quality=85)
+
+    return images
+
+
+def load_html_fixtures() -> Dict[str, bytes]:
+    """Load the stored retail product page corpus"""
+    return {
+        path.stem: path.read_bytes()
+        for path in sorted((FIXTURES_DIR / "html").glob("*.html"))
+    }
+
+
+def load_llm_fixtures() -> List[Dict[str, Any]]:
+    """Load recorded provider outputs"""
+    with open(FIXTURES_DIR / "llm_responses.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@contextlib.contextmanager
+def serve_image(image_data: bytes):
+    """Serve one image over local HTTP so the real fetch path is exercised"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(image_data)))
+            self.end_headers()
+            self.wfile.write(image_data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/product.jpg"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# ---------------------------------------------------------------------------
+# Timing
+# ---------------------------------------------------------------------------
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def measure(fn: Callable[[], Any], repeat: int, warmup: int = 1) -> List[float]:
+    """Call fn repeatedly and return per-call wall times in seconds"""
+    # Services print on every call; keep that noise out of the report
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        for _ in range(warmup):
+            fn()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(name: str, group: str, timings: List[float], params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    ms = [t * 1000 for t in timings]
+    return {
+        "name": name,
+        "group": group,
+        "params": params or {},
+        "iterations": len(ms),
+        "min_ms": round(min(ms), 4),
+        "median_ms": round(statistics.median(ms), 4),
+        "mean_ms": round(statistics.fmean(ms), 4),
+        "p95_ms": round(_percentile(ms, 95), 4),
+        "max_ms": round(max(ms), 4),
+        "stdev_ms": round(statistics.stdev(ms), 4) if len(ms) > 1 else 0.0,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Benchmark groups
+# ---------------------------------------------------------------------------
+
+def bench_image_service(loop, images: Dict[str, bytes], repeat: int) -> List[Dict[str, Any]]:
+    service = ImageService()
+    # Measure the render itself, not the render cache; product images stay in memory only
+    service.render_cache.enabled = False
+    service.product_images.disk.enabled = False
+    results = []
+    keywords = ["WARMTH", "MERINO", "TRAIL READY", "PACKABLE", "SALE"]
+
+    def render(url: str, size: tuple):
+        return loop.run_until_complete(service._create_ad_image_with_overlay(
+            product_image_url=url,
+            title="Alpine Merino Hoodie - Forest Green, Responsibly Sourced Wool",
+            keywords=keywords,
+            primary_cta="Shop Now",
+            size=size,
+            category="Realistic Image Store",
+        ))
+
+    for platform_name, size in AD_SIZES.items():
+        timings = measure(lambda: render("", size), repeat)
+        results.append(summarize(
+            f"image_service.render.{platform_name}.no_image", "image_service", timings,
+            {"size": list(size), "product_image": None},
+        ))
+
+    with serve_image(images["photo_1600_jpeg"]) as url:
+        # Fetched and decoded on every render, as on a product image cache miss
+        service.product_images.enabled = False
+        for platform_name, size in AD_SIZES.items():
+            timings = measure(lambda: render(url, size), repeat)
+            results.append(summarize(
+                f"image_service.render.{platform_name}.with_image", "image_service", timings,
+                {"size": list(size), "product_image": "photo_1600_jpeg"},
+            ))
+        # Served decoded from the product image cache
+        service.product_images.enabled = True
+        for platform_name, size in AD_SIZES.items():
+            timings = measure(lambda: render(url, size), repeat)
+            results.append(summarize(
+                f"image_service.render.{platform_name}.with_cached_image", "image_service", timings,
+                {"size": list(size), "product_image": "photo_1600_jpeg", "product_image_cache": True},
+            ))
+
+    return results
+
+
+def bench_gradient(repeat: int) -> List[Dict[str, Any]]:
+    service = ImageService()
+    results = []
+    for platform_name, (width, height) in AD_SIZES.items():
+        timings = measure(
+            lambda: service._create_gradient_background(width, height, "Artist"),
+            repeat,
+        )
+        results.append(summarize(
+            f"image_service.gradient.{platform_name}", "gradient", timings,
+            {"size": [width, height], "category": "Artist"},
+        ))
+    return results
+
+
+def bench_text_layout(pages: Dict[str, bytes], repeat: int) -> List[Dict[str, Any]]:
+    scraper = ProductScraper()
+    titles = [scraper.parse_product_html(content).get("title") or "" for content in pages.values()]
+
+    def fit_all():
+        for width, height in AD_SIZES.values():
+            for title in titles:
+                text_layout.fit_text(title, int(width * 0.92), int(height * 0.105), int(height * 0.08), 27, 2)
+
+    def cold():
+        for cached in (text_layout.fit_text, text_layout.measure, text_layout.line_height):
+            cached.cache_clear()
+        fit_all()
+
+    results = []
+    for name, fn in (("cold", cold), ("memoized", fit_all)):
+        timings = measure(fn, repeat)
+        results.append(summarize(
+            f"text_layout.fit_titles.{name}", "text_layout", timings,
+            {"titles": len(titles), "sizes": len(AD_SIZES)},
+        ))
+    return results
+
+
+def bench_motion(loop, images: Dict[str, bytes], repeat: int) -> List[Dict[str, Any]]:
+    service = MotionService()
+    service.render_cache.enabled = False
+    results = []
+    try:
+        for image_name, image_data in images.items():
+            timings = measure(lambda: loop.run_until_complete(service._apply_simple_effect(image_data)), repeat)
+            results.append(summarize(
+                f"motion_service.animation.{image_name}", "motion_service", timings,
+                {"image": image_name, "input_bytes": len(image_data), "effect": service._effect_for(None),
+                 "frames": service.frame_count, "frame_size": service.frame_size,
+                 "format": service.output_format, "workers": service.workers},
+            ))
+    finally:
+        service.close()
+
+    # Frame throughput of each effect in one process, without decode or encode
+    base = motion_engine.prepare_base(images["photo_1600_jpeg"], service.frame_size)
+    out_size = (service.frame_size, service.frame_size)
+    for effect in motion_engine.EFFECTS:
+        timings = measure(
+            lambda: motion_engine.render_frames(base, effect, out_size, service.frame_count), repeat
+        )
+        result = summarize(
+            f"motion_engine.frames.{effect}", "motion_service", timings,
+            {"effect": effect, "frames": service.frame_count, "frame_size": list(out_size)},
+        )
+        result["frames_per_second"] = round(service.frame_count / statistics.median(timings), 1)
+        results.append(result)
+
+    for fmt in ("webp", "gif"):
+        frames = motion_engine.render_frames(base, "ken_burns", out_size, service.frame_count)
+        timings = measure(lambda: motion_engine.encode_animation(frames, fmt, service.fps), repeat)
+        results.append(summarize(
+            f"motion_engine.encode.{fmt}", "motion_service", timings,
+            {"format": fmt, "frames": service.frame_count, "frame_size": list(out_size)},
+        ))
+    return results
+
+
+def bench_scraper(pages: Dict[str, bytes], repeat: int) -> List[Dict[str, Any]]:
+    scraper = ProductScraper()
+    # Keep learned strategies out of the real cache directory
+    scraper.selector_memory = SelectorMemory(path=os.path.join(tempfile.mkdtemp(), "selector_memory.json"))
+    results = []
+    for page_name, content in pages.items():
+        timings = measure(lambda: scraper.parse_product_html(content), repeat)
+        results.append(summarize(
+            f"product_scraper.extract.{page_name}", "product_scraper", timings,
+            {"page": page_name, "input_bytes": len(content)},
+        ))
+
+    timings = measure(lambda: [scraper.parse_product_html(c) for c in pages.values()], repeat)
+    results.append(summarize(
+        "product_scraper.extract.corpus", "product_scraper", timings,
+        {"pages": len(pages)},
+    ))
+
+    # Same pages with a known domain: the warmup call learns each field's strategy
+    for page_name, content in pages.items():
+        timings = measure(lambda: scraper.parse_product_html(content, domain=page_name), repeat)
+        results.append(summarize(
+            f"product_scraper.extract_learned.{page_name}", "product_scraper", timings,
+            {"page": page_name, "input_bytes": len(content), "selector_memory": True},
+        ))
+    return results
+
+
+def bench_llm_parsing(responses: List[Dict[str, Any]], repeat: int) -> List[Dict[str, Any]]:
+    service = LLMService()
+    results = []
+    for response in responses:
+        text = response["text"]
+        timings = measure(lambda: service._parse_llm_response(text), repeat)
+        results.append(summarize(
+            f"llm_service.parse_response.{response['name']}", "llm_parsing", timings,
+            {"provider": response["provider"], "kind": response["kind"], "input_chars": len(text)},
+        ))
+    return results
+
+
+def bench_copy_engine(pages: Dict[str, bytes], repeat: int) -> List[Dict[str, Any]]:
+    # Fast copy mode has a 5 ms budget per product
+    engine = CopyEngine()
+    scraper = ProductScraper()
+    results = []
+    for page_name, content in pages.items():
+        product_info = scraper.parse_product_html(content)
+        timings = measure(lambda: engine.analyze(product_info), repeat)
+        results.append(summarize(
+            f"copy_engine.analyze.{page_name}", "copy_engine", timings,
+            {"page": page_name, "input_chars": len(str(product_info.get("description") or ""))},
+        ))
+    return results
+
+
+def bench_image_index(images: Dict[str, bytes], repeat: int, sizes: List[int]) -> List[Dict[str, Any]]:
+    results = []
+    for hash_name, hash_fn in HASH_FUNCTIONS.items():
+        for image_name, image_data in images.items():
+            timings = measure(lambda: hash_fn(image_data), repeat)
+            results.append(summarize(
+                f"image_index.{hash_name}.{image_name}", "image_index", timings,
+                {"image": image_name, "input_bytes": len(image_data)},
+            ))
+
+    rng = random.Random(1234)
+    for size in sizes:
+        index = PerceptualIndex(path=os.path.join(tempfile.mkdtemp(), "image_index.json"))
+        index.max_entries = size
+        hashes = [rng.getrandbits(64) for _ in range(size)]
+        for image_hash in hashes:
+            index.add(image_hash, category="Realistic Image Store")
+        # Half the queries are near-duplicates of indexed images, half are unseen
+        queries = []
+        for image_hash in hashes[:500]:
+            for bit in rng.sample(range(64), index.max_distance):
+                image_hash ^= 1 << bit
+            queries.append(image_hash)
+        queries += [rng.getrandbits(64) for _ in range(500)]
+        timings = measure(lambda: [index.lookup(q) for q in queries], repeat)
+        results.append(summarize(
+            f"image_index.lookup_1000.{size}", "image_index", timings,
+            {"entries": size, "queries": len(queries), "max_distance": index.max_distance},
+        ))
+    return results
+
+
+def bench_response_encoding(images: Dict[str, bytes], repeat: int) -> List[Dict[str, Any]]:
+    # Shaped like a generate-ad-from-url response: three creatives as data URLs
+    creative = "data:image/jpeg;base64," + base64.b64encode(images["large_3000x2000_jpeg"]).decode("ascii")
+    payload = {
+        "status": "success",
+        "category": "Realistic Image Store",
+        "ad_sizes": {name: {"url": creative, "size": list(size)} for name, size in AD_SIZES.items()},
+        "ad_images": [creative] * 3,
+        "keywords": ["WARMTH", "MERINO", "TRAIL READY", "PACKABLE", "SALE"],
+    }
+    body = orjson.dumps(payload)
+    params = {"payload_bytes": len(body)}
+    results = [
+        summarize("response.serialize.json", "response_encoding",
+                  measure(lambda: json.dumps(payload, ensure_ascii=False).encode("utf-8"), repeat), params),
+        summarize("response.serialize.orjson", "response_encoding",
+                  measure(lambda: orjson.dumps(payload), repeat), params),
+    ]
+    middleware = CompressionMiddleware(None, gzip_level=1)
+    for name, huffman_only in (("gzip", False), ("gzip_huffman", True)):
+        compressed = middleware._compress(body, "gzip", huffman_only)
+        results.append(summarize(
+            f"response.compress.{name}", "response_encoding",
+            measure(lambda: middleware._compress(body, "gzip", huffman_only), repeat),
+            dict(params, compressed_bytes=len(compressed)),
+        ))
+    return results
+
+
+GROUPS = ["image_service", "gradient", "text_layout", "motion_service", "image_index", "product_scraper", "llm_parsing", "copy_engine", "response_encoding"]
+
+
+def run(groups: List[str], quick: bool) -> List[Dict[str, Any]]:
+    scale = 0.2 if quick else 1.0
+
+    def reps(n: int) -> int:
+        return max(2, int(n * scale))
+
+    images = build_reference_images()
+    results: List[Dict[str, Any]] = []
+    loop = asyncio.new_event_loop()
+    try:
+        if "image_service" in groups:
+            results += bench_image_service(loop, images, reps(10))
+        if "gradient" in groups:
+            results += bench_gradient(reps(5))
+        if "text_layout" in groups:
+            results += bench_text_layout(load_html_fixtures(), reps(20))
+        if "motion_service" in groups:
+            results += bench_motion(loop, images, reps(5))
+        if "image_index" in groups:
+            results += bench_image_index(images, reps(10), [10_000] if quick else [10_000, 100_000, 500_000])
+        if "product_scraper" in groups:
+            results += bench_scraper(load_html_fixtures(), reps(50))
+        if "llm_parsing" in groups:
+            results += bench_llm_parsing(load_llm_fixtures(), reps(2000))
+        if "copy_engine" in groups:
+            results += bench_copy_engine(load_html_fixtures(), reps(500))
+        if "response_encoding" in groups:
+            results += bench_response_encoding(images, reps(20))
+    finally:
+        loop.run_until_complete(http_client.close())
+        loop.close()
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def build_report(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Compare median timings against a baseline report"""
+    baseline_by_name = {r["name"]: r for r in baseline.get("results", [])}
+    rows = []
+    for result in current["results"]:
+        previous = baseline_by_name.get(result["name"])
+        if not previous or previous["median_ms"] <= 0:
+            continue
+        ratio = result["median_ms"] / previous["median_ms"]
+        rows.append({
+            "name": result["name"],
+            "baseline_median_ms": previous["median_ms"],
+            "current_median_ms": result["median_ms"],
+            "ratio": round(ratio, 4),
+            "regression": ratio > 1 + threshold,
+        })
+    return rows
+
+
+def print_table(results: List[Dict[str, Any]]):
+    width = max(len(r["name"]) for r in results)
+    print(f"{'benchmark':<{width}}  {'median ms':>10}  {'p95 ms':>10}  {'iters':>6}")
+    print("-" * (width + 32))
+    for r in results:
+        print(f"{r['name']:<{width}}  {r['median_ms']:>10.3f}  {r['p95_ms']:>10.3f}  {r['iterations']:>6}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON report")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed median slowdown before flagging (0.15 = 15%%)")
+    parser.add_argument("--group", action="append", choices=GROUPS, help="Only run the given group (repeatable)")
+    parser.add_argument("--quick", action="store_true", help="Fewer iterations for a fast smoke run")
+    args = parser.parse_args(argv)
+
+    results = run(args.group or GROUPS, args.quick)
+    report = build_report(results)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["comparison"] = {
+            "baseline": args.compare,
+            "baseline_commit": baseline.get("git_commit"),
+            "threshold": args.threshold,
+            "rows": compare(report, baseline, args.threshold),
+        }
+        if any(row["regression"] for row in report["comparison"]["rows"]):
+            exit_code = 1
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+    print_table(results)
+    if args.compare:
+        for row in report["comparison"]["rows"]:
+            if row["regression"]:
+                print(f"REGRESSION {row['name']}: {row['baseline_median_ms']:.3f} ms -> {row['current_median_ms']:.3f} ms (x{row['ratio']})")
+    print(f"\nWrote {len(results)} results to {args.output}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
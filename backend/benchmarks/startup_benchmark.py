@@ -0,0 +1,141 @@
+"""
+Startup-time benchmark: application boot plus per-provider import and init cost.
+
+Every sample runs in a fresh interpreter so module import caches are cold,
+which is what a new worker or autoscaled instance pays.
+
+Run from the backend/ directory:
+    python benchmarks/startup_benchmark.py --repeat 5 --output startup_results.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from run_benchmarks import BACKEND_DIR, build_report, compare, print_table, summarize  # noqa: E402
+
+PROVIDER_MODULES = {
+    "openai": "openai",
+    "anthropic": "anthropic",
+    "google": "google.generativeai",
+}
+
+# Timings are printed as one JSON object on the last line of stdout
+PROVIDER_SNIPPET = """
+import json, time, warnings
+warnings.simplefilter("ignore")
+t0 = time.perf_counter()
+import {module}
+t1 = time.perf_counter()
+from services.llm_service import PROVIDER_FACTORIES
+t2 = time.perf_counter()
+client = PROVIDER_FACTORIES[{name!r}]()
+t3 = time.perf_counter()
+print(json.dumps({{"import": t1 - t0, "init": t3 - t2, "available": client is not None}}))
+"""
+
+APP_SNIPPET = """
+import json, time, warnings
+warnings.simplefilter("ignore")
+t0 = time.perf_counter()
+from services.llm_service import LLMService
+t1 = time.perf_counter()
+service = LLMService()
+t2 = time.perf_counter()
+import main
+t3 = time.perf_counter()
+loaded = [name for name in ("openai", "anthropic", "google") if service.providers.is_loaded(name)]
+print(json.dumps({{"import_llm_service": t1 - t0, "construct_llm_service": t2 - t1, "import_main": t3 - t2, "eager_providers": loaded}}))
+"""
+
+FIRST_USE_SNIPPET = """
+import json, time, warnings
+warnings.simplefilter("ignore")
+from services.llm_service import LLMService
+service = LLMService()
+t0 = time.perf_counter()
+service.providers.get({name!r})
+t1 = time.perf_counter()
+print(json.dumps({{"first_use": t1 - t0}}))
+"""
+
+
+def _run(snippet: str) -> Dict[str, Any]:
+    env = dict(os.environ)
+    # Dummy keys make every factory build a client without network access
+    env.update({
+        "OPENAI_API_KEY": "bench-openai-key",
+        "ANTHROPIC_API_KEY": "bench-anthropic-key",
+        "GOOGLE_API_KEY": "bench-google-key",
+        "LOG_LEVEL": "ERROR",
+    })
+    env.pop("GOOGLE_API_ENDPOINT", None)
+    output = subprocess.check_output(
+        [sys.executable, "-c", snippet], cwd=BACKEND_DIR, env=env, stderr=subprocess.DEVNULL
+    )
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def run(repeat: int, providers: List[str]) -> List[Dict[str, Any]]:
+    results = []
+
+    app_samples = [_run(APP_SNIPPET.format()) for _ in range(repeat)]
+    for key in ("import_llm_service", "construct_llm_service", "import_main"):
+        results.append(summarize(
+            f"startup.app.{key}", "startup", [s[key] for s in app_samples],
+            {"eager_providers": app_samples[-1]["eager_providers"]},
+        ))
+
+    for name in providers:
+        module = PROVIDER_MODULES[name]
+        try:
+            samples = [_run(PROVIDER_SNIPPET.format(module=module, name=name)) for _ in range(repeat)]
+            first_use = [_run(FIRST_USE_SNIPPET.format(name=name)) for _ in range(repeat)]
+        except subprocess.CalledProcessError:
+            print(f"Skipping {name}: {module} is not installed")
+            continue
+        params = {"module": module, "available": samples[-1]["available"]}
+        results.append(summarize(f"startup.provider.{name}.import", "provider_startup", [s["import"] for s in samples], params))
+        results.append(summarize(f"startup.provider.{name}.init", "provider_startup", [s["init"] for s in samples], params))
+        results.append(summarize(f"startup.provider.{name}.first_use", "provider_startup", [s["first_use"] for s in first_use], params))
+
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreter runs per measurement")
+    parser.add_argument("--provider", action="append", choices=list(PROVIDER_MODULES), help="Only measure the given provider (repeatable)")
+    parser.add_argument("--output", default="startup_results.json", help="Where to write the JSON report")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed median slowdown before flagging")
+    args = parser.parse_args(argv)
+
+    results = run(max(2, args.repeat), args.provider or list(PROVIDER_MODULES))
+    report = build_report(results)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.threshold)
+        report["comparison"] = {"baseline": args.compare, "threshold": args.threshold, "rows": rows}
+        exit_code = 1 if any(row["regression"] for row in rows) else 0
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+    print_table(results)
+    print(f"\nWrote {len(results)} results to {args.output}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
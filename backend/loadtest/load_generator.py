@@ -0,0 +1,216 @@
+"""
+Open-loop load generator for the ad generation API.
+
+Drives /api/generate-ad-from-url and /api/generate-motion-effect at a target
+request rate and reports p50/p95/p99 latency, throughput and error rate.
+Requests are launched on a fixed schedule regardless of how long earlier
+requests take, so slow responses show up as latency instead of silently
+lowering the offered load.
+
+Run from the backend/ directory with the API pointed at the mock providers
+(see loadtest/mock_providers.py):
+    python loadtest/load_generator.py --target http://127.0.0.1:8000 \\
+        --mock http://127.0.0.1:8100 --rps 5 --duration 60 \\
+        --mix ad=3 --mix motion=1 --output loadtest_results.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from PIL import Image, ImageDraw
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures" / "html"
+
+ENDPOINTS = {
+    "ad": "/api/generate-ad-from-url",
+    "motion": "/api/generate-motion-effect",
+}
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def _upload_image() -> bytes:
+    img = Image.new("RGB", (1024, 1024), (250, 200, 120))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((200, 200, 824, 824), fill=(60, 120, 200), outline=(20, 20, 20), width=10)
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+class LoadGenerator:
+    def __init__(self, target: str, mock: str, rps: float, duration: float, mix: Dict[str, int], timeout: float):
+        self.target = target.rstrip("/")
+        self.mock = mock.rstrip("/")
+        self.rps = rps
+        self.duration = duration
+        self.mix = mix
+        self.timeout = timeout
+        self.product_pages = [p.stem for p in sorted(FIXTURES_DIR.glob("*.html"))]
+        self.upload = _upload_image()
+        self.samples: List[Dict[str, Any]] = []
+
+    def _pick_endpoint(self) -> str:
+        names = list(self.mix)
+        return random.choices(names, weights=[self.mix[n] for n in names])[0]
+
+    async def _send(self, session: aiohttp.ClientSession, endpoint: str, scheduled: float):
+        start = time.perf_counter()
+        status = None
+        error = None
+        try:
+            if endpoint == "ad":
+                page = random.choice(self.product_pages)
+                payload = {"product_url": f"{self.mock}/products/{page}"}
+                async with session.post(self.target + ENDPOINTS["ad"], json=payload) as response:
+                    await response.read()
+                    status = response.status
+            else:
+                form = aiohttp.FormData()
+                form.add_field("image", self.upload, filename="upload.jpg", content_type="image/jpeg")
+                async with session.post(self.target + ENDPOINTS["motion"], data=form) as response:
+                    await response.read()
+                    status = response.status
+        except Exception as e:
+            error = type(e).__name__
+        end = time.perf_counter()
+        self.samples.append({
+            "endpoint": endpoint,
+            "status": status,
+            "error": error,
+            "latency_s": end - start,
+            # Time spent waiting for the event loop to launch the request
+            "start_lag_s": start - scheduled,
+            "finished_at": end,
+        })
+
+    async def run(self):
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            tasks = []
+            interval = 1.0 / self.rps
+            self.started_at = time.perf_counter()
+            total = int(self.rps * self.duration)
+            for i in range(total):
+                scheduled = self.started_at + i * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(self._send(session, self._pick_endpoint(), scheduled)))
+            self.finished_sending_at = time.perf_counter()
+            await asyncio.gather(*tasks)
+            self.finished_at = time.perf_counter()
+
+    def _stats(self, samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+        ok = [s for s in samples if s["status"] is not None and s["status"] < 400]
+        latencies_ms = [s["latency_s"] * 1000 for s in ok]
+        statuses: Dict[str, int] = {}
+        for s in samples:
+            key = str(s["status"]) if s["status"] is not None else (s["error"] or "unknown")
+            statuses[key] = statuses.get(key, 0) + 1
+        elapsed = self.finished_at - self.started_at
+        return {
+            "requests": len(samples),
+            "successes": len(ok),
+            "errors": len(samples) - len(ok),
+            "error_rate": round((len(samples) - len(ok)) / len(samples), 4) if samples else 0.0,
+            # Shed by admission control: fast 429s rather than slow failures
+            "rejected": statuses.get("429", 0),
+            "throughput_rps": round(len(ok) / elapsed, 3) if elapsed > 0 else 0.0,
+            "latency_ms": {
+                "p50": _percentile(latencies_ms, 50),
+                "p95": _percentile(latencies_ms, 95),
+                "p99": _percentile(latencies_ms, 99),
+                "mean": statistics.fmean(latencies_ms) if latencies_ms else None,
+                "max": max(latencies_ms) if latencies_ms else None,
+            },
+            "max_start_lag_ms": round(max((s["start_lag_s"] for s in samples), default=0) * 1000, 3),
+            "status_counts": statuses,
+        }
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "config": {
+                "target": self.target,
+                "mock": self.mock,
+                "rps": self.rps,
+                "duration_s": self.duration,
+                "mix": self.mix,
+            },
+            "elapsed_s": round(self.finished_at - self.started_at, 3),
+            "overall": self._stats(self.samples),
+            "endpoints": {
+                name: self._stats([s for s in self.samples if s["endpoint"] == name])
+                for name in self.mix
+            },
+        }
+
+
+def _fmt(value: Optional[float]) -> str:
+    return f"{value:9.1f}" if value is not None else f"{'-':>9}"
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{'scope':<10} {'reqs':>6} {'err%':>6} {'rps':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = [("overall", report["overall"])] + list(report["endpoints"].items())
+    for name, stats in rows:
+        lat = stats["latency_ms"]
+        print(f"{name:<10} {stats['requests']:>6} {stats['error_rate'] * 100:>5.1f}% {stats['throughput_rps']:>7.2f} "
+              f"{_fmt(lat['p50'])} {_fmt(lat['p95'])} {_fmt(lat['p99'])}")
+    print(f"status counts: {report['overall']['status_counts']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="http://127.0.0.1:8000", help="Base URL of the API under test")
+    parser.add_argument("--mock", default="http://127.0.0.1:8100", help="Base URL of loadtest/mock_providers.py")
+    parser.add_argument("--rps", type=float, default=2.0, help="Target requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load for")
+    parser.add_argument("--mix", action="append", metavar="ENDPOINT=WEIGHT",
+                        help="Endpoint weights, e.g. ad=3 motion=1 (default: ad=1 motion=1)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, help="Random seed for endpoint/page selection")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    mix = {}
+    for item in args.mix or ["ad=1", "motion=1"]:
+        name, _, weight = item.partition("=")
+        if name not in ENDPOINTS:
+            parser.error(f"Unknown endpoint {name!r}; expected one of {', '.join(ENDPOINTS)}")
+        mix[name] = int(weight or 1)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    generator = LoadGenerator(args.target, args.mock, args.rps, args.duration, mix, args.timeout)
+    asyncio.run(generator.run())
+    report = generator.report()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Wrote report to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
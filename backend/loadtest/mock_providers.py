@@ -0,0 +1,435 @@
+"""
+Local stand-in for the external providers used by the backend.
+
+Speaks the request/response shapes that LLMService and ImageService rely on,
+so main.py can be load-tested without spending real provider quota:
+
+    OpenAI     POST /v1/chat/completions, POST /v1/images/generations
+    Anthropic  POST /v1/messages
+    Gemini     POST /v1beta/models/{model}:generateContent, :streamGenerateContent
+    Stability  POST /v1/generation/{engine}/text-to-image
+    Replicate  POST /v1/predictions, /v1/models/{owner}/{name}/predictions,
+               GET /v1/predictions/{id}, POST /v1/predictions/{id}/cancel
+
+It also serves product pages from the benchmark HTML fixtures
+(GET /products/{name}) with their image URLs rewritten to GET /images/{name}.
+
+Streaming requests get the same text in small chunks, with the sampled
+latency as time to first chunk and --chunk-delay between chunks. Replicate
+predictions are created immediately and report "processing" until the
+sampled latency has passed, so polling clients see a realistic job.
+
+Run from the backend/ directory:
+    python loadtest/mock_providers.py --port 8100 \\
+        --latency default=lognormal:600:0.4 --latency stability=uniform:2000:4000 \\
+        --error-rate openai=0.02
+
+Then start the API against it:
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=mock \\
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8100 ANTHROPIC_API_KEY=mock \\
+    GOOGLE_API_ENDPOINT=http://127.0.0.1:8100 GOOGLE_API_KEY=mock \\
+    STABILITY_API_HOST=http://127.0.0.1:8100 IMAGE_GENERATION_API_KEY=mock \\
+    REPLICATE_API_BASE=http://127.0.0.1:8100 REPLICATE_API_TOKEN=mock \\
+    uvicorn main:app --port 8000
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import math
+import random
+import re
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from aiohttp import web
+from PIL import Image
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures" / "html"
+
+PROVIDERS = ["openai", "anthropic", "google", "stability", "replicate", "products", "images"]
+
+IMAGE_ANALYSIS = {
+    "description": "A clean studio product shot on a neutral background with soft shadows.",
+    "category": "Realistic Image Store",
+    "keywords": ["premium", "studio", "quality", "modern", "bestseller"],
+    "category_description": "Professional product photography",
+}
+
+PRODUCT_ANALYSIS = {
+    "primary_cta": "SHOP NOW",
+    "keywords": ["BESTSELLER", "LIMITED", "PREMIUM", "NEW", "DEAL", "TRENDING", "EXCLUSIVE", "SALE", "HOT", "TOP RATED"],
+    "captions": ["Upgrade your everyday.", "Made to last.", "Loved by thousands."],
+    "target_audience": "Online shoppers aged 25-45",
+}
+
+
+# ---------------------------------------------------------------------------
+# Latency / error configuration
+# ---------------------------------------------------------------------------
+
+def parse_distribution(spec: str) -> Callable[[], float]:
+    """
+    Parse a latency spec into a sampler returning seconds.
+
+    fixed:MS | uniform:LO_MS:HI_MS | normal:MEAN_MS:SD_MS | lognormal:MEDIAN_MS:SIGMA
+    """
+    kind, *args = spec.split(":")
+    values = [float(a) for a in args]
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0] / 1000
+    if kind == "uniform" and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == "normal" and len(values) == 2:
+        return lambda: max(0.0, random.gauss(values[0], values[1])) / 1000
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1]) / 1000
+    raise argparse.ArgumentTypeError(f"Invalid latency distribution: {spec}")
+
+
+class ProviderBehaviour:
+    """Latency samplers and error rates per provider, with a shared default"""
+
+    def __init__(self, latency: Dict[str, str], error_rate: Dict[str, float], error_status: int = 500, chunk_delay: float = 0.02):
+        self.latency = {name: parse_distribution(spec) for name, spec in latency.items()}
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.chunk_delay = chunk_delay
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def _get(self, table: Dict[str, Any], provider: str, default: Any) -> Any:
+        return table.get(provider, table.get("default", default))
+
+    def sample_latency(self, provider: str) -> float:
+        sampler = self._get(self.latency, provider, None)
+        return sampler() if sampler else 0.0
+
+    async def apply(self, provider: str, sleep: bool = True) -> Optional[web.Response]:
+        """Sleep for the sampled latency (unless sleep is False), then maybe return an injected error"""
+        counter = self.counters.setdefault(provider, {"requests": 0, "errors": 0})
+        counter["requests"] += 1
+        if sleep:
+            await asyncio.sleep(self.sample_latency(provider))
+        if random.random() < self._get(self.error_rate, provider, 0.0):
+            counter["errors"] += 1
+            headers = {"Retry-After": "1"} if self.error_status == 429 else None
+            return web.json_response(
+                {"error": {"message": "Injected mock provider error", "type": "mock_error"}},
+                status=self.error_status,
+                headers=headers,
+            )
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Payload helpers
+# ---------------------------------------------------------------------------
+
+def _is_image_request(payload: Any) -> bool:
+    """Image analysis requests carry an image part; product analysis is text only"""
+    text = json.dumps(payload)
+    return '"image_url"' in text or '"type": "image"' in text or "inline_data" in text or "inlineData" in text
+
+
+def _analysis_text(payload: Any) -> str:
+    if not _is_image_request(payload):
+        return json.dumps(PRODUCT_ANALYSIS)
+    if "Product Title" in json.dumps(payload):
+        # Combined mode: one multimodal request answers both schemas
+        return json.dumps({**IMAGE_ANALYSIS, **PRODUCT_ANALYSIS})
+    return json.dumps(IMAGE_ANALYSIS)
+
+
+def _text_chunks(text: str, size: int = 16):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+async def _stream(request: web.Request, frames, content_type: str, delay: float) -> web.StreamResponse:
+    response = web.StreamResponse(headers={"Content-Type": content_type, "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    for i, frame in enumerate(frames):
+        if i and delay:
+            await asyncio.sleep(delay)
+        await response.write(frame.encode("utf-8"))
+    await response.write_eof()
+    return response
+
+
+def _sse(data: Any, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {data if isinstance(data, str) else json.dumps(data)}\n\n"
+
+
+def _make_image(width: int, height: int, seed: int = 0) -> bytes:
+    gradient = Image.linear_gradient("L").resize((width, height))
+    img = Image.merge("RGB", (
+        gradient,
+        gradient.transpose(Image.Transpose.FLIP_TOP_BOTTOM),
+        Image.new("L", (width, height), 80 + seed % 120),
+    ))
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+# ---------------------------------------------------------------------------
+# Application
+# ---------------------------------------------------------------------------
+
+def create_app(behaviour: ProviderBehaviour, fixtures_dir: Path = FIXTURES_DIR) -> web.Application:
+    product_image = _make_image(1200, 1200)
+    generated_image = _make_image(1024, 1024, seed=7)
+    pages = {path.stem: path.read_text(encoding="utf-8") for path in sorted(fixtures_dir.glob("*.html"))}
+    image_url_pattern = re.compile(r'(?:https?:)?//[^"\'\s>]+?\.(?:jpg|jpeg|png|webp)(?:\?[^"\'\s>]*)?', re.IGNORECASE)
+
+    async def openai_chat(request: web.Request) -> web.Response:
+        payload = await request.json()
+        error = await behaviour.apply("openai")
+        if error:
+            return error
+        if payload.get("stream"):
+            base = {
+                "id": f"chatcmpl-mock-{int(time.time() * 1000)}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model", "gpt-4"),
+            }
+            frames = [
+                _sse({**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+                for piece in _text_chunks(_analysis_text(payload))
+            ]
+            frames.append(_sse({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+            frames.append(_sse("[DONE]"))
+            return await _stream(request, frames, "text/event-stream", behaviour.chunk_delay)
+        return web.json_response({
+            "id": f"chatcmpl-mock-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-4"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": _analysis_text(payload)},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 200, "completion_tokens": 120, "total_tokens": 320},
+        })
+
+    async def openai_images(request: web.Request) -> web.Response:
+        await request.json()
+        error = await behaviour.apply("openai")
+        if error:
+            return error
+        return web.json_response({
+            "created": int(time.time()),
+            "data": [{"url": f"{request.scheme}://{request.host}/images/generated.jpg", "revised_prompt": None}],
+        })
+
+    async def anthropic_messages(request: web.Request) -> web.Response:
+        payload = await request.json()
+        error = await behaviour.apply("anthropic")
+        if error:
+            return error
+        if payload.get("stream"):
+            message = {
+                "id": f"msg_mock_{int(time.time() * 1000)}",
+                "type": "message",
+                "role": "assistant",
+                "model": payload.get("model", "claude-3-opus-20240229"),
+                "content": [],
+                "stop_reason": None,
+                "stop_sequence": None,
+                "usage": {"input_tokens": 200, "output_tokens": 0},
+            }
+            frames = [
+                _sse({"type": "message_start", "message": message}, "message_start"),
+                _sse({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}, "content_block_start"),
+            ]
+            frames += [
+                _sse({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": piece}}, "content_block_delta")
+                for piece in _text_chunks(_analysis_text(payload))
+            ]
+            frames += [
+                _sse({"type": "content_block_stop", "index": 0}, "content_block_stop"),
+                _sse({"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": 120}}, "message_delta"),
+                _sse({"type": "message_stop"}, "message_stop"),
+            ]
+            return await _stream(request, frames, "text/event-stream", behaviour.chunk_delay)
+        return web.json_response({
+            "id": f"msg_mock_{int(time.time() * 1000)}",
+            "type": "message",
+            "role": "assistant",
+            "model": payload.get("model", "claude-3-opus-20240229"),
+            "content": [{"type": "text", "text": _analysis_text(payload)}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": 200, "output_tokens": 120},
+        })
+
+    async def google_generate(request: web.Request) -> web.Response:
+        payload = await request.json()
+        error = await behaviour.apply("google")
+        if error:
+            return error
+        return web.json_response({
+            "candidates": [{
+                "content": {"parts": [{"text": _analysis_text(payload)}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {"promptTokenCount": 200, "candidatesTokenCount": 120, "totalTokenCount": 320},
+        })
+
+    async def google_stream_generate(request: web.Request) -> web.StreamResponse:
+        payload = await request.json()
+        error = await behaviour.apply("google")
+        if error:
+            return error
+        # The REST transport reads a JSON array of responses as it arrives
+        pieces = _text_chunks(_analysis_text(payload))
+        frames = []
+        for i, piece in enumerate(pieces):
+            chunk = {"candidates": [{"content": {"parts": [{"text": piece}], "role": "model"}, "index": 0}]}
+            if i == len(pieces) - 1:
+                chunk["candidates"][0]["finishReason"] = "STOP"
+            frames.append(("[" if i == 0 else ",\r\n") + json.dumps(chunk))
+        frames.append("]")
+        return await _stream(request, frames, "application/json", behaviour.chunk_delay)
+
+    async def stability_text_to_image(request: web.Request) -> web.Response:
+        await request.json()
+        error = await behaviour.apply("stability")
+        if error:
+            return error
+        return web.json_response({
+            "artifacts": [{
+                "base64": base64.b64encode(generated_image).decode("utf-8"),
+                "seed": 0,
+                "finishReason": "SUCCESS",
+            }],
+        })
+
+    predictions: Dict[str, Dict[str, Any]] = {}
+
+    def prediction_view(request: web.Request, prediction: Dict[str, Any]) -> Dict[str, Any]:
+        if prediction["status"] == "processing" and time.time() >= prediction["ready_at"]:
+            prediction["status"] = "succeeded"
+            prediction["output"] = [f"{request.scheme}://{request.host}/images/generated-{prediction['id']}.jpg"]
+        return {key: value for key, value in prediction.items() if key != "ready_at"}
+
+    async def replicate_create(request: web.Request) -> web.Response:
+        payload = await request.json()
+        # The latency spec is the job's run time; creating it is immediate
+        error = await behaviour.apply("replicate", sleep=False)
+        if error:
+            return error
+        prediction_id = f"mock{len(predictions):06d}"
+        predictions[prediction_id] = {
+            "id": prediction_id,
+            "version": payload.get("version"),
+            "status": "processing",
+            "output": None,
+            "error": None,
+            "ready_at": time.time() + behaviour.sample_latency("replicate"),
+        }
+        return web.json_response(prediction_view(request, predictions[prediction_id]), status=201)
+
+    async def replicate_get(request: web.Request) -> web.Response:
+        prediction = predictions.get(request.match_info["id"])
+        if prediction is None:
+            raise web.HTTPNotFound()
+        return web.json_response(prediction_view(request, prediction))
+
+    async def replicate_cancel(request: web.Request) -> web.Response:
+        prediction = predictions.get(request.match_info["id"])
+        if prediction is None:
+            raise web.HTTPNotFound()
+        if prediction["status"] == "processing":
+            prediction["status"] = "canceled"
+        return web.json_response(prediction_view(request, prediction))
+
+    async def product_page(request: web.Request) -> web.Response:
+        name = request.match_info["name"]
+        if name not in pages:
+            raise web.HTTPNotFound()
+        error = await behaviour.apply("products")
+        if error:
+            return error
+        local_image = f"{request.scheme}://{request.host}/images/{name}.jpg"
+        return web.Response(text=image_url_pattern.sub(local_image, pages[name]), content_type="text/html")
+
+    async def image(request: web.Request) -> web.Response:
+        error = await behaviour.apply("images")
+        if error:
+            return error
+        data = generated_image if request.match_info["name"].startswith("generated") else product_image
+        return web.Response(body=data, content_type="image/jpeg")
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(behaviour.counters)
+
+    app = web.Application(client_max_size=32 * 1024 * 1024)
+    app.router.add_post("/v1/chat/completions", openai_chat)
+    app.router.add_post("/v1/images/generations", openai_images)
+    app.router.add_post("/v1/messages", anthropic_messages)
+    app.router.add_post(r"/v1beta/models/{model}:generateContent", google_generate)
+    app.router.add_post(r"/v1beta/models/{model}:streamGenerateContent", google_stream_generate)
+    app.router.add_post("/v1/generation/{engine}/text-to-image", stability_text_to_image)
+    app.router.add_post("/v1/predictions", replicate_create)
+    app.router.add_post("/v1/models/{owner}/{name}/predictions", replicate_create)
+    app.router.add_get("/v1/predictions/{id}", replicate_get)
+    app.router.add_post("/v1/predictions/{id}/cancel", replicate_cancel)
+    app.router.add_get("/products/{name}", product_page)
+    app.router.add_get("/images/{name}", image)
+    app.router.add_get("/_mock/stats", stats)
+    return app
+
+
+def _parse_assignments(values, convert) -> Dict[str, Any]:
+    result = {}
+    for value in values or []:
+        name, _, spec = value.partition("=")
+        if not spec:
+            raise SystemExit(f"Expected NAME=VALUE, got {value!r}")
+        if name != "default" and name not in PROVIDERS:
+            raise SystemExit(f"Unknown provider {name!r}; expected one of {', '.join(PROVIDERS)} or 'default'")
+        result[name] = convert(spec)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", action="append", metavar="PROVIDER=DIST",
+                        help="Latency distribution, e.g. default=lognormal:600:0.4 or openai=fixed:250 (repeatable)")
+    parser.add_argument("--error-rate", action="append", metavar="PROVIDER=RATE",
+                        help="Fraction of requests that fail, e.g. google=0.05 (repeatable)")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status used for injected errors (e.g. 429)")
+    parser.add_argument("--chunk-delay", type=float, default=20.0, help="Milliseconds between chunks of streamed responses")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible latency/error sampling")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    latency = _parse_assignments(args.latency, str)
+    latency.setdefault("default", "fixed:0")
+    for spec in latency.values():
+        parse_distribution(spec)
+    behaviour = ProviderBehaviour(
+        latency=latency,
+        error_rate=_parse_assignments(args.error_rate, float),
+        error_status=args.error_status,
+        chunk_delay=args.chunk_delay / 1000.0,
+    )
+    print(f"Mock providers listening on http://{args.host}:{args.port}")
+    print(f"Product pages: {', '.join(f'/products/{p.stem}' for p in sorted(FIXTURES_DIR.glob('*.html')))}")
+    web.run_app(create_app(behaviour), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
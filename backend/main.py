@@ -1,24 +1,180 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+import asyncio
+import logging
+import time
+from typing import Literal, Optional
+from io import BytesIO
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse
 from pydantic import BaseModel, HttpUrl
 import os
 from dotenv import load_dotenv
+from PIL import Image
 
 from services.llm_service import LLMService
 from services.image_service import ImageService
 from services.motion_service import MotionService
 from services.product_scraper import ProductScraper
+from services.compression import CompressionMiddleware
+from services.category_classifier import (
+    CATEGORY_DESCRIPTIONS,
+    CategoryClassifier,
+    classification_source,
+)
+from services.admission import AdmissionController, AdmissionRejected
+from services.deadline import (
+    DeadlinePolicy,
+    degraded_stages,
+    mark_degraded,
+    stage_budget,
+    stage_timeout,
+    within_budget,
+)
+from services.http_client import http_client
+from services.image_index import PerceptualIndex
+from services.logging_config import (
+    configure_logging,
+    dropped_log_records,
+    get_logger,
+    new_request_id,
+    shutdown_logging,
+)
+from services.metrics import (
+    Gauge,
+    http_request_duration,
+    memory_profiler,
+    provider_health,
+    registry,
+    render_prometheus,
+    request_peak_memory,
+    start_request_timing,
+    timed_stage,
+)
+from services.memory_budget import pixel_budget
+from services.prediction_jobs import prediction_runner
+from services.product_state import ProductStateStore
+from services.render_cache import digest_bytes
+from services.warmup import Warmup
 
 load_dotenv()
+configure_logging()
+memory_profiler.configure()
+pixel_budget.configure()
+prediction_runner.configure()
+logger = get_logger("main")
 
 app = FastAPI(
     title="AI Ad Creative Generator API",
     description="Premium AI-powered ad creative generation platform",
-    version="1.0.0"
+    version="1.0.0",
+    # Creative responses carry megabytes of base64; orjson serialises them several times faster
+    default_response_class=ORJSONResponse,
 )
 
-# CORS Configuration
+@app.on_event("startup")
+async def start_http_client():
+    await http_client.start()
+
+
+@app.on_event("startup")
+async def resume_prediction_jobs():
+    await prediction_runner.resume()
+
+
+@app.on_event("startup")
+async def start_warmup():
+    warmup.start()
+
+
+# First shutdown handler: report unready so the load balancer stops routing here while we drain
+@app.on_event("shutdown")
+async def stop_accepting():
+    warmup.drain()
+
+
+@app.on_event("shutdown")
+async def stop_prediction_polling():
+    # Remote jobs keep running and are resumed on the next start
+    await prediction_runner.close()
+
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await http_client.close()
+
+
+@app.on_event("shutdown")
+async def save_selector_memory():
+    product_scraper.selector_memory.save()
+
+
+@app.on_event("shutdown")
+async def save_image_index():
+    image_index.save()
+
+
+@app.on_event("shutdown")
+async def save_product_state():
+    product_state.save()
+
+
+@app.on_event("shutdown")
+async def stop_motion_workers():
+    motion_service.close()
+
+
+@app.on_event("shutdown")
+async def flush_logs():
+    shutdown_logging()
+
+
+@app.middleware("http")
+async def admission_middleware(request: Request, call_next):
+    """Shed load on the expensive endpoints before any work (or body parsing) starts"""
+    limiter = admission.limiter_for(request.url.path)
+    if limiter is None:
+        return await call_next(request)
+    try:
+        async with limiter.admit():
+            return await call_next(request)
+    except AdmissionRejected as e:
+        logger.warning("Rejected %s: %s", request.url.path, e)
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Server is busy, please retry shortly"},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
+# Registered last so it wraps admission control and times rejected requests too
+@app.middleware("http")
+async def server_timing_middleware(request: Request, call_next):
+    """Collect per-stage timings and expose them as a Server-Timing header"""
+    request_id = new_request_id(request.headers.get("X-Request-ID"))
+    timings = start_request_timing()
+    deadline = deadline_policy.start(request.headers.get("X-Request-Timeout"))
+    response = await call_next(request)
+    peak_memory = timings.finish_memory()
+    response.headers["Server-Timing"] = timings.server_timing_header()
+    response.headers["X-Request-ID"] = request_id
+    if deadline.degraded:
+        response.headers["X-Degraded"] = ",".join(deadline.degraded)
+    route = request.scope.get("route")
+    if peak_memory is not None:
+        request_peak_memory.observe(peak_memory, path=getattr(route, "path", "unmatched"))
+    http_request_duration.observe(
+        time.perf_counter() - timings.started,
+        method=request.method,
+        path=getattr(route, "path", "unmatched"),
+        status=response.status_code
+    )
+    return response
+
+
+# Compress JSON responses for clients that accept gzip or brotli
+app.add_middleware(CompressionMiddleware)
+
+# CORS Configuration (added last so it is outermost and 429s carry CORS headers too)
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,http://localhost:5173").split(",")
 app.add_middleware(
     CORSMiddleware,
@@ -28,15 +184,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
 # Initialize Services
 llm_service = LLMService()
 image_service = ImageService()
 motion_service = MotionService()
 product_scraper = ProductScraper()
+category_classifier = CategoryClassifier()
+image_index = PerceptualIndex()
+product_state = ProductStateStore()
+deadline_policy = DeadlinePolicy()
+admission = AdmissionController({
+    "/api/generate-ad-from-url": "ad",
+    "/api/generate-motion-effect": "motion",
+})
+warmup = Warmup()
+
+
+def _warmup_image() -> bytes:
+    sample = BytesIO()
+    Image.new("RGB", (64, 64), (120, 160, 200)).save(sample, format="JPEG")
+    return sample.getvalue()
+
+
+async def warm_providers():
+    """Import and construct the primary LLM client and open connections to the image provider"""
+    if await llm_service.providers.aget(llm_service.provider) is None:
+        raise RuntimeError(f"{llm_service.provider} provider is not configured")
+    urls = [u.strip() for u in os.getenv("WARMUP_PRECONNECT_URLS", "").split(",") if u.strip()]
+    if not urls and image_service.api_key and image_service.provider == "stability":
+        urls = [image_service.stability_api_host]
+    await asyncio.gather(*(http_client.preconnect(url) for url in urls))
+
+
+async def warm_analysis():
+    """First-use costs of the local classifier and the perceptual index"""
+    sample = _warmup_image()
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, category_classifier.classify, sample)
+    await loop.run_in_executor(None, image_index.hash_image, sample)
+
+
+async def warm_rendering():
+    await asyncio.get_running_loop().run_in_executor(None, image_service.warm_up)
+
+
+warmup.add_step("providers", warm_providers)
+warmup.add_step("analysis", warm_analysis)
+warmup.add_step("ad_render", warm_rendering)
+warmup.add_step("motion_render", motion_service.warm_up)
+
+log_records_dropped = registry.register(Gauge(
+    "adgen_log_records_dropped",
+    "Log records discarded because the log queue was full (since start).",
+))
+
+
+async def analyze_copy(product_info: dict, ready: asyncio.Future, mode: str) -> dict:
+    with timed_stage("copy_analysis"):
+        return await llm_service.analyze_product(product_info, ready=ready, mode=mode)
 
 
 class ProductURLRequest(BaseModel):
     product_url: HttpUrl
+    # "fast" writes the copy locally instead of with the LLM; defaults to COPY_MODE
+    copy_mode: Optional[Literal["llm", "fast"]] = None
 
 
 @app.get("/")
@@ -53,6 +265,56 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness for the load balancer: 503 while warming up, draining, or when
+    every heavy endpoint is already full, with live provider and pool state.
+    """
+    report = warmup.snapshot()
+    if report["status"] == "ready" and admission.saturated():
+        report["status"] = "saturated"
+    report["providers"] = {
+        "primary": llm_service.provider,
+        "loaded": llm_service.providers.is_loaded(llm_service.provider),
+        "load_ms": round(llm_service.providers.load_times.get(llm_service.provider, 0.0) * 1000, 1),
+        "recent": provider_health.snapshot(),
+    }
+    report["http_pool"] = http_client.stats()
+    report["admission"] = admission.snapshot()
+    if pixel_budget.enabled:
+        report["pixel_budget"] = {"in_use": pixel_budget.in_use, "capacity": pixel_budget.capacity}
+    return ORJSONResponse(report, status_code=200 if report["status"] == "ready" else 503)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus-format stage, provider and request latency metrics."""
+    log_records_dropped.set(dropped_log_records())
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/api/jobs")
+async def list_prediction_jobs():
+    """Recent provider generation jobs, newest first"""
+    return {"jobs": prediction_runner.recent()}
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_prediction_job(job_id: str):
+    job = prediction_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_prediction_job(job_id: str):
+    if not await prediction_runner.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job is unknown or already finished")
+    return prediction_runner.get(job_id)
+
+
 @app.post("/api/generate-motion-effect")
 async def generate_motion_effect(image: UploadFile = File(...)):
     """
@@ -64,15 +326,54 @@ async def generate_motion_effect(image: UploadFile = File(...)):
             raise HTTPException(status_code=400, detail="File must be an image")
         
         # Read image data
-        image_data = await image.read()
+        with timed_stage("upload_read"):
+            image_data = await image.read()
+        
+        # Reuse results from an earlier upload of the same or a near-identical image
+        with timed_stage("image_lookup"):
+            image_hash = await asyncio.get_running_loop().run_in_executor(None, image_index.hash_image, image_data)
+            previous = image_index.lookup(image_hash)
+        
+        analysis = None
+        motion_result = None
+        if previous:
+            if previous.get("description"):
+                analysis = {key: previous.get(key) for key in ("description", "category", "category_description", "keywords")}
+            if previous.get("motion_url"):
+                motion_result = {"url": previous["motion_url"], "download_url": previous["motion_url"]}
+            elif previous.get("image_digest"):
+                motion_result = await motion_service.cached_effect(previous["image_digest"], previous)
         
         # Analyze image with LLM
-        analysis = await llm_service.analyze_image(image_data)
+        if analysis is None:
+            with timed_stage("classify"):
+                analysis = await within_budget(
+                    "classify", llm_service.analyze_image(image_data), llm_service._default_image_analysis
+                )
         
-        # Generate motion effect
-        motion_result = await motion_service.generate_motion_effect(
-            image_data=image_data,
-            analysis=analysis
+        # Generate motion effect; out of time, the upload is returned unanimated
+        if motion_result is None:
+            with timed_stage("motion_effect"):
+                motion_result = await within_budget(
+                    "motion_effect",
+                    motion_service.generate_motion_effect(image_data=image_data, analysis=analysis),
+                    lambda: {
+                        "url": motion_service._image_to_data_url(image_data),
+                        "download_url": motion_service._image_to_data_url(image_data),
+                    },
+                )
+        
+        motion_url = motion_result.get("url") or ""
+        analysis_is_default = analysis == llm_service._default_image_analysis()
+        image_index.add(
+            image_hash,
+            # Index hits from the ad flow carry only a category, so fill the digest in
+            image_digest=(previous or {}).get("image_digest") or digest_bytes(image_data),
+            description=None if analysis_is_default else analysis.get("description"),
+            category=None if analysis_is_default else analysis.get("category"),
+            category_description=None if analysis_is_default else analysis.get("category_description"),
+            keywords=None if analysis_is_default else analysis.get("keywords"),
+            motion_url=motion_url if motion_url.startswith("http") else None,
         )
         
         return {
@@ -84,6 +385,8 @@ async def generate_motion_effect(image: UploadFile = File(...)):
             "download_url": motion_result.get("download_url")
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating motion effect: {str(e)}")
 
@@ -95,44 +398,177 @@ async def generate_ad_from_url(request: ProductURLRequest):
     """
     try:
         # Scrape product information
-        product_info = await product_scraper.scrape_product(request.product_url)
+        with timed_stage("scrape"):
+            product_info = await within_budget(
+                "scrape", product_scraper.scrape_product(request.product_url), lambda: None
+            )
         
+        if not product_info and "scrape" in degraded_stages():
+            raise HTTPException(status_code=504, detail="Timed out extracting product information from URL")
         if not product_info:
             raise HTTPException(status_code=400, detail="Could not extract product information from URL")
         
+        # Regenerating a known product only re-runs the stages whose inputs changed
+        copy_mode = request.copy_mode or llm_service.copy_mode
+        stage_inputs = dict(product_info, copy_mode=copy_mode)
+        product_url = str(request.product_url)
+        previous = product_state.get(product_url)
+        rerun = product_state.plan(previous, stage_inputs)
+        reused = previous["outputs"] if previous is not None else {}
+        
+        # Start the ad copy now so it streams in while the image is fetched and
+        # classified. Combined mode instead gets the copy with the image analysis.
+        analysis = None if "copy_analysis" in rerun else reused.get("analysis")
+        if analysis is None and copy_mode == "fast":
+            analysis = llm_service.local_copy(product_info)
+        copy_ready = asyncio.get_running_loop().create_future()
+        analysis_task = None
+        
+        def start_copy():
+            nonlocal analysis_task
+            if analysis is None and analysis_task is None:
+                analysis_task = asyncio.create_task(analyze_copy(product_info, copy_ready, copy_mode))
+        
+        # Combined mode only applies when the image goes to the vision LLM
+        if not llm_service.combined_analysis or "classify" not in rerun or not product_info.get("image_url"):
+            start_copy()
+        
         # Fetch and analyze product image for category classification
         category = "Realistic Image Store"
         category_description = "Standard product image"
+        if "classify" not in rerun and reused.get("category"):
+            category = reused["category"]
+            category_description = reused.get("category_description", category_description)
         
-        if product_info.get("image_url"):
+        # Without a product image the ads need a generated background. Start it
+        # now, from the keywords copy analysis falls back to, so the provider
+        # call overlaps the copy analysis instead of following it
+        background_task = None
+        if not product_info.get("image_url"):
+            background_task = image_service.start_background(
+                llm_service._default_product_analysis(product_info)["keywords"], category
+            )
+        
+        if product_info.get("image_url") and "classify" in rerun:
             try:
-                import aiohttp
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(product_info["image_url"]) as img_response:
-                        if img_response.status == 200:
-                            image_data = await img_response.read()
-                            image_analysis = await llm_service.analyze_image(image_data)
-                            category = image_analysis.get("category", "Realistic Image Store")
-                            category_description = image_analysis.get("category_description", "AI-analyzed visual style")
+                image_data = None
+                with timed_stage("image_fetch"):
+                    try:
+                        # Cached across requests; the renders below reuse this fetch
+                        product_image = await image_service.product_images.fetch(
+                            product_info["image_url"], timeout=stage_timeout("image_fetch", 30)
+                        )
+                        if product_image is not None:
+                            image_data = product_image.data
+                    except asyncio.TimeoutError:
+                        mark_degraded("image_fetch")
+                if image_data:
+                    with timed_stage("image_lookup"):
+                        image_hash = await asyncio.get_running_loop().run_in_executor(None, image_index.hash_image, image_data)
+                        indexed = image_index.lookup(image_hash)
+                    with timed_stage("classify"):
+                        if indexed and indexed.get("category"):
+                            # Same or near-identical image seen before: reuse its category
+                            classification_source.inc(source="index")
+                            start_copy()
+                            category = indexed["category"]
+                            category_description = indexed.get("category_description", category_description)
+                        else:
+                            # Only ask the vision LLM when the local classifier isn't sure
+                            local = await asyncio.get_running_loop().run_in_executor(
+                                None, category_classifier.classify, image_data
+                            )
+                            if category_classifier.is_confident(local):
+                                classification_source.inc(source="local")
+                                start_copy()
+                                category = local["category"]
+                                category_description = CATEGORY_DESCRIPTIONS[category]
+                            else:
+                                classification_source.inc(source="llm")
+                                combined = None
+                                if llm_service.combined_analysis and analysis is None:
+                                    # One multimodal request for both the category and the ad copy
+                                    combined = analysis = await within_budget(
+                                        "classify",
+                                        llm_service.analyze_product_with_image(product_info, image_data),
+                                        lambda: None,
+                                    )
+                                image_analysis = combined or await within_budget(
+                                    "classify", llm_service.analyze_image(image_data), llm_service._default_image_analysis
+                                )
+                                if image_analysis == llm_service._default_image_analysis():
+                                    # analyze_image swallowed a provider error
+                                    mark_degraded("classify", reason="error")
+                                category = image_analysis.get("category", "Realistic Image Store")
+                                category_description = image_analysis.get("category_description", "AI-analyzed visual style")
+                    # A fallback category would stick to every near-duplicate of this image
+                    if not {"classify", "image_fetch"}.intersection(degraded_stages()):
+                        image_index.add(image_hash, category=category, category_description=category_description)
+                else:
+                    # Nothing to classify: the default category must not be stored as a result
+                    mark_degraded("classify", reason="fallback")
+                # Renders take the image from the shared product-image cache;
+                # don't hold this reference for the rest of the request
+                image_data = None
             except Exception as e:
-                print(f"Error analyzing product image: {str(e)}")
+                logger.error("Error analyzing product image: %s", e)
+                mark_degraded("classify", reason="error")
+        
+        # Rendering only needs the CTA and first keyword, so start as soon as
+        # they have streamed in rather than waiting for the full analysis
+        render_analysis = analysis
+        if analysis is None:
+            start_copy()
+            await asyncio.wait(
+                {analysis_task, copy_ready},
+                timeout=stage_budget("copy_analysis"),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if copy_ready.done():
+                render_analysis = copy_ready.result()
+            elif analysis_task.done():
+                render_analysis = analysis_task.result()
+            else:
+                # Out of time before even the CTA arrived: render with default copy
+                mark_degraded("copy_analysis")
+                render_analysis = llm_service._default_product_analysis(product_info)
         
-        # Analyze product with LLM for keywords and captions
-        analysis = await llm_service.analyze_product(product_info)
+        background = None
+        if background_task is not None:
+            # Shielded: on timeout the generation finishes in the background and
+            # is cached for the next request with the same prompt
+            with timed_stage("background_wait"):
+                background = await within_budget("generation", asyncio.shield(background_task), lambda: None)
         
         # Generate ad creatives in multiple sizes
         ad_creatives = await image_service.generate_ad_creatives(
             product_info=product_info,
-            analysis=analysis,
-            category=category
+            analysis=render_analysis,
+            category=category,
+            background=background
         )
         
-        # Debug: Log ad_sizes structure
-        print(f"Generated ad_sizes: {list(ad_creatives.get('ad_sizes', {}).keys())}")
-        for platform, ad_data in ad_creatives.get('ad_sizes', {}).items():
-            if ad_data and 'url' in ad_data:
-                url_preview = ad_data['url'][:100] if len(ad_data['url']) > 100 else ad_data['url']
-                print(f"  {platform}: URL length={len(ad_data['url'])}, preview={url_preview}...")
+        if analysis is None:
+            analysis = await within_budget(
+                "copy_analysis", analysis_task, lambda: llm_service._default_product_analysis(product_info)
+            )
+        
+        # Degraded output (including copy the LLM failed to write) would otherwise
+        # be reused until the product changes
+        if not degraded_stages():
+            product_state.record(
+                product_url, stage_inputs,
+                analysis=analysis, category=category, category_description=category_description,
+            )
+        
+        # Debug: Log ad_sizes structure (skipped entirely unless DEBUG logging is on)
+        if logger.isEnabledFor(logging.DEBUG):
+            for platform, ad_data in ad_creatives.get('ad_sizes', {}).items():
+                if ad_data and 'url' in ad_data:
+                    logger.debug(
+                        "Generated %s ad: url_length=%d preview=%s",
+                        platform, len(ad_data['url']), ad_data['url'][:100]
+                    )
         
         return {
             "status": "success",
@@ -151,6 +587,8 @@ async def generate_ad_from_url(request: ProductURLRequest):
             "primary_cta": analysis.get("primary_cta", "Shop Now")
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating ad creative: {str(e)}")
 
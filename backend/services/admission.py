@@ -0,0 +1,196 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+from services.deadline import current_deadline
+from services.metrics import Counter, Gauge, Histogram, registry
+
+admission_in_flight = registry.register(Gauge(
+    "adgen_admission_in_flight",
+    "Requests currently admitted and running, per endpoint.",
+    ("endpoint",),
+))
+admission_queue_depth = registry.register(Gauge(
+    "adgen_admission_queue_depth",
+    "Requests waiting for an admission slot, per endpoint.",
+    ("endpoint",),
+))
+admission_rejections = registry.register(Counter(
+    "adgen_admission_rejections_total",
+    "Requests shed with 429 by endpoint and reason (queue_full, queue_timeout).",
+    ("endpoint", "reason"),
+))
+admission_queue_wait = registry.register(Histogram(
+    "adgen_admission_queue_wait_seconds",
+    "Time queued requests waited before being admitted.",
+    ("endpoint",),
+))
+
+# Defaults per endpoint: motion effects are CPU-bound locally, ad generation
+# mostly waits on providers, so it can run more requests at once
+DEFAULT_MAX_IN_FLIGHT = {"ad": 16, "motion": 4}
+DEFAULT_MAX_QUEUE = {"ad": 16, "motion": 8}
+
+
+def _parse_limits(spec: str, defaults: Dict[str, int]) -> Dict[str, int]:
+    limits = dict(defaults)
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            limits[name.strip()] = int(value)
+    return limits
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; retry_after is a hint in whole seconds"""
+
+    def __init__(self, endpoint: str, reason: str, retry_after: int):
+        super().__init__(f"{endpoint} overloaded ({reason})")
+        self.endpoint = endpoint
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """
+    Caps concurrent work for one endpoint.
+
+    Up to max_in_flight requests run at once; the next max_queue wait in
+    FIFO order for at most queue_timeout seconds (or what is left of their
+    deadline). Anything beyond that is rejected immediately, so overload
+    turns into fast 429s instead of every request slowing down together.
+    """
+
+    def __init__(self, name: str, max_in_flight: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Moving average of how long admitted requests hold their slot
+        self._service_time = 1.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until the backlog ahead of a new request would have drained"""
+        backlog = self.in_flight + len(self._waiters)
+        return max(1, math.ceil(self._service_time * backlog / self.max_in_flight))
+
+    def _reject(self, reason: str):
+        admission_rejections.inc(endpoint=self.name, reason=reason)
+        raise AdmissionRejected(self.name, reason, self.retry_after())
+
+    def _update_gauges(self):
+        admission_in_flight.set(self.in_flight, endpoint=self.name)
+        admission_queue_depth.set(len(self._waiters), endpoint=self.name)
+
+    async def acquire(self):
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self._update_gauges()
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue_full")
+
+        timeout = self.queue_timeout
+        deadline = current_deadline()
+        if deadline is not None:
+            timeout = min(timeout, deadline.remaining())
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._update_gauges()
+        started = time.monotonic()
+        try:
+            await asyncio.wait({waiter}, timeout=timeout)
+        except asyncio.CancelledError:
+            # Client went away while queued; pass on a slot we were just handed
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._remove(waiter)
+            raise
+        if not waiter.done():
+            self._remove(waiter)
+            self._reject("queue_timeout")
+        admission_queue_wait.observe(time.monotonic() - started, endpoint=self.name)
+
+    def _remove(self, waiter: asyncio.Future):
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        self._update_gauges()
+
+    def release(self):
+        # Hand the slot straight to the oldest waiter so in_flight never dips
+        # below the cap while others are queued
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._update_gauges()
+                return
+        self.in_flight -= 1
+        self._update_gauges()
+
+    @asynccontextmanager
+    async def admit(self):
+        await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - started)
+            self.release()
+
+
+class AdmissionController:
+    """Admission limiters for the expensive endpoints, configured from the environment"""
+
+    def __init__(self, endpoints: Dict[str, str]):
+        self.enabled = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+        max_in_flight = _parse_limits(os.getenv("ADMISSION_MAX_IN_FLIGHT", ""), DEFAULT_MAX_IN_FLIGHT)
+        max_queue = _parse_limits(os.getenv("ADMISSION_MAX_QUEUE", ""), DEFAULT_MAX_QUEUE)
+        queue_timeout = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+        # endpoints maps request path -> short name used in config and metrics
+        self._limiters = {
+            path: AdmissionLimiter(name, max_in_flight.get(name, 16), max_queue.get(name, 16), queue_timeout)
+            for path, name in endpoints.items()
+        }
+        for limiter in self._limiters.values():
+            limiter._update_gauges()
+
+    def limiter_for(self, path: str) -> Optional[AdmissionLimiter]:
+        if not self.enabled:
+            return None
+        return self._limiters.get(path)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Current load of each endpoint, for readiness reporting"""
+        return {
+            limiter.name: {
+                "in_flight": limiter.in_flight,
+                "max_in_flight": limiter.max_in_flight,
+                "queue_depth": limiter.queue_depth,
+                "max_queue": limiter.max_queue,
+            }
+            for limiter in self._limiters.values()
+        }
+
+    def saturated(self) -> bool:
+        """True when every endpoint would reject a new request outright"""
+        if not self.enabled or not self._limiters:
+            return False
+        return all(
+            limiter.in_flight >= limiter.max_in_flight and limiter.queue_depth >= limiter.max_queue
+            for limiter in self._limiters.values()
+        )
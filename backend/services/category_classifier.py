@@ -0,0 +1,196 @@
+import json
+import os
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from services.llm_service import CATEGORIES
+from services.logging_config import get_logger
+from services.metrics import Counter, registry
+
+logger = get_logger(__name__)
+
+classification_source = registry.register(Counter(
+    "adgen_category_classifications_total",
+    "Image category decisions by where they were made (local classifier or LLM).",
+    ("source",),
+))
+
+CATEGORY_DESCRIPTIONS = {
+    "Artist": "Hand-drawn, artistic illustration",
+    "Cartoonist": "Cartoon-style, playful illustration",
+    "Sticker": "Bold sticker-style graphic",
+    "Realistic Image Store": "Photorealistic product photography",
+}
+
+FEATURES = ["colour_count", "entropy", "edge_density", "flat_ratio", "alpha_usage", "saturation"]
+
+# Per-category feature means and spreads. These are hand-set, uncalibrated
+# priors; running benchmarks/calibrate_classifier.py --fit over labelled images
+# writes a fitted model to load through CATEGORY_MODEL_PATH.
+DEFAULT_MODEL = {
+    "features": FEATURES,
+    "classes": {
+        "Artist": {
+            "mean": [0.72, 0.88, 0.22, 0.22, 0.0, 0.35],
+            "std": [0.12, 0.08, 0.10, 0.12, 0.05, 0.15],
+        },
+        "Cartoonist": {
+            "mean": [0.45, 0.35, 0.06, 0.80, 0.02, 0.55],
+            "std": [0.15, 0.15, 0.04, 0.12, 0.05, 0.20],
+        },
+        "Sticker": {
+            "mean": [0.35, 0.35, 0.04, 0.85, 0.40, 0.55],
+            "std": [0.15, 0.18, 0.04, 0.10, 0.25, 0.25],
+        },
+        "Realistic Image Store": {
+            "mean": [0.80, 0.85, 0.10, 0.20, 0.0, 0.25],
+            "std": [0.12, 0.10, 0.08, 0.15, 0.05, 0.15],
+        },
+    },
+}
+
+THUMBNAIL_SIZE = 128
+
+# Mean squared z-score above which an image is treated as unlike every
+# category, shrinking confidence so it goes to the LLM
+OUTLIER_Z2 = 4.0
+
+
+def extract_features(image_data: bytes) -> np.ndarray:
+    """
+    Summarise an image's visual style as a small vector of statistics in [0, 1].
+
+    Works on a thumbnail (JPEGs are decoded at reduced scale), so cost is a
+    few milliseconds regardless of the source resolution.
+    """
+    img = Image.open(BytesIO(image_data))
+    img.draft("RGB", (THUMBNAIL_SIZE * 2, THUMBNAIL_SIZE * 2))
+    img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), reducing_gap=2.0)
+
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    rgba = np.asarray(img.convert("RGBA"), dtype=np.uint8)
+    alpha = rgba[..., 3]
+    opaque = alpha >= 250 if has_alpha else np.ones(alpha.shape, dtype=bool)
+    alpha_usage = 1.0 - opaque.mean() if has_alpha else 0.0
+
+    rgb = rgba[..., :3]
+    pixels = rgb[opaque] if opaque.any() else rgb.reshape(-1, 3)
+
+    # Distinct colours after quantising to 4 bits per channel, on a log scale
+    quantised = (pixels >> 4).astype(np.int32)
+    codes = (quantised[:, 0] << 8) | (quantised[:, 1] << 4) | quantised[:, 2]
+    colour_count = np.log1p(np.unique(codes).size) / np.log1p(min(4096, codes.size))
+
+    # Luminance histogram entropy, normalised by the 8-bit maximum
+    luma = rgb.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    hist = np.bincount(luma[opaque].astype(np.uint8), minlength=256).astype(np.float64)
+    p = hist[hist > 0] / max(hist.sum(), 1.0)
+    entropy = float(-(p * np.log2(p)).sum() / 8.0)
+
+    # Gradient magnitude separates hard edges, flat fills (exactly uniform
+    # neighbours) and textured or photographic regions
+    gy = np.abs(np.diff(luma, axis=0))[:, :-1]
+    gx = np.abs(np.diff(luma, axis=1))[:-1, :]
+    gradient = (gx + gy) / 255.0
+    mask = opaque[:-1, :-1]
+    gradient = gradient[mask] if mask.any() else gradient.ravel()
+    edge_density = float((gradient > 0.15).mean()) if gradient.size else 0.0
+    flat_ratio = float((gradient < 0.002).mean()) if gradient.size else 1.0
+
+    channels = pixels.astype(np.float32)
+    high = channels.max(axis=1)
+    low = channels.min(axis=1)
+    saturation = float(np.mean(np.where(high > 0, (high - low) / np.maximum(high, 1.0), 0.0)))
+
+    return np.array([colour_count, entropy, edge_density, flat_ratio, alpha_usage, saturation], dtype=np.float64)
+
+
+class CategoryClassifier:
+    """
+    Local visual-style classifier used before falling back to the vision LLM.
+
+    Each category is modelled as an independent Gaussian per feature; the
+    softmax of the log-likelihoods gives a confidence, and only images below
+    the confidence threshold need to be sent to the LLM. Off by default
+    unless a fitted model loads from CATEGORY_MODEL_PATH: the built-in
+    priors were never fitted to data, so they shouldn't stand in for the LLM
+    on real traffic unless CATEGORY_CLASSIFIER_ENABLED says so.
+    """
+
+    def __init__(self, model_path: Optional[str] = None):
+        self.threshold = float(os.getenv("CATEGORY_CONFIDENCE_THRESHOLD", "0.8"))
+        self.model_path = model_path or os.getenv("CATEGORY_MODEL_PATH")
+        model = self._read_model()
+        fitted = model is not DEFAULT_MODEL
+        self.enabled = os.getenv("CATEGORY_CLASSIFIER_ENABLED", str(fitted)).lower() == "true"
+        self.load_model(model)
+
+    def _read_model(self) -> Dict[str, Any]:
+        if not self.model_path:
+            return DEFAULT_MODEL
+        try:
+            with open(self.model_path, encoding="utf-8") as f:
+                model = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Using default category model; could not read %s: %s", self.model_path, e)
+            return DEFAULT_MODEL
+        if model.get("features") != FEATURES:
+            logger.warning("Using default category model; %s was fitted on different features", self.model_path)
+            return DEFAULT_MODEL
+        return model
+
+    def load_model(self, model: Dict[str, Any]):
+        self.categories: List[str] = [c for c in CATEGORIES if c in model["classes"]]
+        self._means = np.array([model["classes"][c]["mean"] for c in self.categories], dtype=np.float64)
+        self._stds = np.maximum(np.array([model["classes"][c]["std"] for c in self.categories], dtype=np.float64), 1e-3)
+        self._log_norm = np.log(self._stds).sum(axis=1)
+
+    def predict_features(self, features: np.ndarray) -> Dict[str, Any]:
+        z2 = ((features[None, :] - self._means) / self._stds) ** 2
+        log_likelihood = -0.5 * z2.sum(axis=1) - self._log_norm
+        scores = np.exp(log_likelihood - log_likelihood.max())
+        scores /= scores.sum()
+        best = int(scores.argmax())
+        # The softmax is overconfident far from every class; scale it back
+        typicality = min(1.0, OUTLIER_Z2 / max(float(z2[best].mean()), 1e-9))
+        return {
+            "category": self.categories[best],
+            "confidence": float(scores[best]) * typicality,
+            "scores": {c: round(float(s), 4) for c, s in zip(self.categories, scores)},
+        }
+
+    def classify(self, image_data: bytes) -> Optional[Dict[str, Any]]:
+        """Return the predicted category and confidence, or None if the image can't be read"""
+        if not self.enabled:
+            return None
+        try:
+            features = extract_features(image_data)
+        except Exception as e:
+            logger.warning("Local category classification failed: %s", e)
+            return None
+        result = self.predict_features(features)
+        result["features"] = {name: round(float(v), 4) for name, v in zip(FEATURES, features)}
+        return result
+
+    def is_confident(self, result: Optional[Dict[str, Any]]) -> bool:
+        return result is not None and result["confidence"] >= self.threshold
+
+
+def fit_model(samples: List[np.ndarray], labels: List[str], min_std: float = 0.03) -> Dict[str, Any]:
+    """Fit per-category feature means and spreads from labelled feature vectors"""
+    model = json.loads(json.dumps(DEFAULT_MODEL))
+    data = np.array(samples, dtype=np.float64)
+    labels_array = np.array(labels)
+    for category in CATEGORIES:
+        rows = data[labels_array == category]
+        if len(rows) < 2:
+            # Too few examples to estimate a spread; keep the prior for this class
+            continue
+        model["classes"][category] = {
+            "mean": [round(float(v), 4) for v in rows.mean(axis=0)],
+            "std": [round(float(v), 4) for v in np.maximum(rows.std(axis=0), min_std)],
+        }
+    return model
@@ -0,0 +1,183 @@
+import asyncio
+import os
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from services.metrics import Counter, Histogram, registry
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+compression_duration = registry.register(Histogram(
+    "adgen_response_compression_seconds",
+    "Time spent compressing response bodies, by encoding.",
+    ("encoding",),
+))
+response_bytes = registry.register(Counter(
+    "adgen_response_bytes_total",
+    "Response body bytes before (raw) and after (sent) compression, by encoding.",
+    ("encoding", "kind"),
+))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "image/svg+xml", "application/javascript")
+
+# Bodies above this are compressed in a worker thread to keep the event loop free
+THREAD_THRESHOLD = 64 * 1024
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Map each coding in an Accept-Encoding header to its q-value"""
+    codings: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[name] = q
+    return codings
+
+
+class CompressionMiddleware:
+    """
+    Negotiated gzip/brotli compression for buffered responses.
+
+    Picks brotli when the client accepts it and the brotli package is
+    installed, gzip otherwise, honouring q-values. Bodies under minimum_size,
+    non-text content types, already-encoded responses, streams without a
+    Content-Length and HEAD responses pass through uncompressed. Large bodies
+    are compressed off the event loop. Every compressible content type gets
+    Vary: Accept-Encoding, compressed or not, so shared caches keep the
+    encodings apart.
+    """
+
+    def __init__(self, app, minimum_size: Optional[int] = None, gzip_level: Optional[int] = None,
+                 brotli_quality: Optional[int] = None):
+        self.app = app
+        self.enabled = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+        self.minimum_size = minimum_size if minimum_size is not None else int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+        # Creative payloads are mostly base64, where higher levels cost CPU for
+        # almost no extra saving, so defaults favour speed
+        self.gzip_level = gzip_level if gzip_level is not None else int(os.getenv("COMPRESSION_GZIP_LEVEL", "1"))
+        self.brotli_quality = brotli_quality if brotli_quality is not None else int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+    def _accepted(self, accept_encoding: str) -> List[str]:
+        """Supported codings the client accepts, most preferred first"""
+        codings = parse_accept_encoding(accept_encoding)
+        wildcard = codings.get("*", 0.0)
+        candidates: List[Tuple[float, int, str]] = []
+        if brotli is not None:
+            candidates.append((codings.get("br", wildcard), 1, "br"))
+        candidates.append((codings.get("gzip", wildcard), 0, "gzip"))
+        return [coding for q, _, coding in sorted(candidates, reverse=True) if q > 0]
+
+    def _compress(self, body: bytes, coding: str, huffman_only: bool = False) -> bytes:
+        if coding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        # wbits 31 selects the gzip container
+        strategy = zlib.Z_HUFFMAN_ONLY if huffman_only else zlib.Z_DEFAULT_STRATEGY
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31, 8, strategy)
+        return compressor.compress(body) + compressor.flush()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        accepted = self._accepted(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if scope.get("method") == "HEAD":
+            # No body to compress, so no Content-Encoding to announce
+            accepted = []
+
+        start_message = None
+        body_parts: List[bytes] = []
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                if not accepted or not self._should_buffer(message):
+                    passthrough = True
+                    await send(self._add_vary(message))
+                    return
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            # Responses arrive in chunks when they pass through
+            # BaseHTTPMiddleware, so buffer until the last one
+            body_parts.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                await self._send_buffered(start_message, b"".join(body_parts), accepted, send)
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _vary(headers) -> bytes:
+        """The response's Vary value with Accept-Encoding added"""
+        vary = [v for k, v in headers if k.lower() == b"vary"]
+        if any(b"accept-encoding" in v.lower() or v.strip() == b"*" for v in vary):
+            return b", ".join(vary)
+        return b", ".join(vary + [b"Accept-Encoding"])
+
+    def _add_vary(self, start_message):
+        """An uncompressed response still varies on Accept-Encoding if its type is compressible"""
+        headers = start_message.get("headers", [])
+        names = {k.lower(): v for k, v in headers}
+        content_type = names.get(b"content-type", b"").decode("latin-1")
+        if b"content-encoding" in names or not content_type.startswith(COMPRESSIBLE_TYPES):
+            return start_message
+        headers = [(k, v) for k, v in headers if k.lower() != b"vary"] + [(b"vary", self._vary(headers))]
+        return dict(start_message, headers=headers)
+
+    def _should_buffer(self, start_message) -> bool:
+        """Only responses of known size and a compressible type are worth buffering"""
+        names = {k.lower(): v for k, v in start_message.get("headers", [])}
+        length = names.get(b"content-length")
+        if length is None or b"content-encoding" in names:
+            # Unknown length means a genuinely streamed body; leave it alone
+            return False
+        content_type = names.get(b"content-type", b"").decode("latin-1")
+        return content_type.startswith(COMPRESSIBLE_TYPES) and int(length) >= self.minimum_size
+
+    async def _send_buffered(self, start_message, body: bytes, accepted: List[str], send):
+        coding = accepted[0]
+        huffman_only = False
+        if len(body) > THREAD_THRESHOLD and b";base64," in body and "gzip" in accepted:
+            # Mostly base64 data URLs: the whole saving is entropy coding the
+            # 64-symbol alphabet, which Huffman-only deflate gets at several
+            # times the speed of LZ matching (and of brotli)
+            coding = "gzip"
+            huffman_only = True
+        started = time.perf_counter()
+        if len(body) > THREAD_THRESHOLD:
+            compressed = await asyncio.get_running_loop().run_in_executor(
+                None, self._compress, body, coding, huffman_only
+            )
+        else:
+            compressed = self._compress(body, coding)
+        compression_duration.observe(time.perf_counter() - started, encoding=coding)
+        response_bytes.inc(len(body), encoding=coding, kind="raw")
+        response_bytes.inc(len(compressed), encoding=coding, kind="sent")
+
+        headers = [(k, v) for k, v in start_message.get("headers", []) if k.lower() not in (b"content-length", b"vary")]
+        headers += [
+            (b"content-encoding", coding.encode("latin-1")),
+            (b"content-length", str(len(compressed)).encode("latin-1")),
+            (b"vary", self._vary(start_message.get("headers", []))),
+        ]
+        await send(dict(start_message, headers=headers))
+        await send({"type": "http.response.body", "body": compressed, "more_body": False})
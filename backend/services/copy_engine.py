@@ -0,0 +1,173 @@
+import math
+import os
+import re
+import zlib
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from services.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "copy_corpus.txt")
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z0-9]*(?:['-][a-z0-9]+)*")
+
+STOP_WORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having her here hers him his how if
+in into is it its itself just me more most my no nor not now of off on once only or other our ours out over own same
+she should so some such than that the their theirs them then there these they this those through to too under until
+up very was we were what when where which while who whom why will with would you your yours per via one two three
+yet pcs qty inch inches
+""".split())
+
+# Listing boilerplate that says nothing about the product itself
+COMMERCE_WORDS = frozenset({
+    "shipping", "returns", "return", "order", "orders", "checkout", "stock", "available", "sale", "price", "free",
+    "buy", "shop", "item", "items", "product", "products", "new", "size", "sizes", "color", "colour", "colors",
+    "colours", "guaranteed", "secure", "arrival", "seller", "supplies", "last", "today",
+})
+
+# A word in the title says more about the product than one in its description
+FIELD_WEIGHTS = (("title", 3.0), ("category", 2.0), ("description", 1.0))
+
+# First matching rule wins; checked against every word of the listing
+CTA_RULES = (
+    ({"print", "poster", "painting", "canvas", "illustration", "giclee", "artwork"}, "GET THE PRINT"),
+    ({"sticker", "stickers", "decal", "decals", "pin", "pins"}, "GRAB YOURS"),
+    ({"coffee", "tea", "chocolate", "treats", "snack", "snacks"}, "ORDER NOW"),
+    ({"custom", "personalized", "personalised", "portrait"}, "MAKE IT YOURS"),
+)
+DEFAULT_CTA = "SHOP NOW"
+
+AUDIENCE_RULES = (
+    ({"kids", "kid", "toddler", "toddlers", "children", "baby"}, "Parents shopping for their kids"),
+    ({"sticker", "stickers", "decal", "kawaii", "pin"}, "Fans personalising laptops, bottles and journals"),
+    ({"print", "poster", "painting", "canvas", "illustration", "art", "artwork"}, "Art lovers decorating their space"),
+    ({"dog", "dogs", "cat", "cats", "pet", "pets", "puppy"}, "Pet owners who spoil their companions"),
+    ({"gaming", "gamer", "gamers", "rgb"}, "Gamers upgrading their setup"),
+    ({"yoga", "running", "fitness", "hiking", "camping", "workout", "bike"}, "Active, outdoor-minded shoppers"),
+    ({"skin", "serum", "hair", "lipstick", "parfum", "beard"}, "Self-care and beauty enthusiasts"),
+    ({"kitchen", "cookware", "coffee", "knife", "skillet", "baking"}, "Home cooks and coffee lovers"),
+)
+
+# {title} and up to three keywords ({k1}-{k3}); each product gets three in a row, picked by its title
+CAPTION_TEMPLATES = (
+    "Meet {title}: {k1} and {k2} in one.",
+    "{K1}, {k2} and {k3}. That's {title}.",
+    "Upgrade to {title} and feel the {k1} difference.",
+    "{title}, made for {k1} lovers.",
+    "Your next favourite: {title}.",
+    "Why settle? {title} brings {k1} and {k2}.",
+    "{K1} never looked this good. Discover {title}.",
+)
+
+# Stand-ins when a listing yields fewer than three keywords
+FILLER_KEYWORDS = ("style", "quality", "value")
+
+# Where marketplace titles append variants, specs and store names to the product name
+TITLE_BREAKS = re.compile(r"\s[|\u2013\u2014-]\s|[,(|]")
+
+
+def short_title(title: str) -> str:
+    """The product name from a long listing title: "Brand: Name, variant (spec)" gives "Name\""""
+    name = TITLE_BREAKS.split(title, maxsplit=1)[0].strip()
+    prefix, separator, rest = name.partition(": ")
+    if separator and " " not in prefix and rest.strip():
+        name = rest.strip()
+    return name or title
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased content words of text, in order"""
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if len(token) >= 3 and token not in STOP_WORDS and token not in COMMERCE_WORDS
+    ]
+
+
+class CopyEngine:
+    """
+    Local, deterministic ad copy: no network, no randomness.
+
+    Keywords are the listing's words ranked by TF-IDF, with term frequencies
+    weighted by field (title over category over description) and document
+    frequencies from the bundled corpus of product copy, so words common to
+    every listing ("quality", "perfect") rank below the ones specific to this
+    product. Ties keep the order the words first appear in. Captions, CTA and
+    audience come from templates and rules keyed on those words. A call
+    takes well under a millisecond, which makes it both the fallback when a
+    provider fails and the "fast" copy mode.
+    """
+
+    def __init__(self, corpus_path: Optional[str] = None):
+        self.corpus_path = corpus_path or os.getenv("COPY_ENGINE_CORPUS", CORPUS_PATH)
+        documents = self._read_corpus(self.corpus_path)
+        self.vocabulary: Dict[str, int] = {}
+        doc_terms = []
+        for document in documents:
+            doc_terms.extend({self.vocabulary.setdefault(term, len(self.vocabulary)) for term in tokenize(document)})
+        document_frequency = np.bincount(np.array(doc_terms, dtype=np.int64), minlength=len(self.vocabulary))
+        # Smoothed IDF, as if one extra document contained every term. The last
+        # slot is for words the corpus has never seen, looked up as index -1
+        self.idf = np.append(
+            np.log((1 + len(documents)) / (1 + document_frequency)) + 1.0,
+            math.log(1 + len(documents)) + 1.0,
+        )
+
+    @staticmethod
+    def _read_corpus(path: str) -> List[str]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        except OSError as e:
+            logger.warning("Copy engine corpus %s unreadable, ranking by term frequency only: %s", path, e)
+            return []
+
+    def rank_keywords(self, fields: Dict[str, Any], limit: int = 12) -> List[str]:
+        """The listing's most distinctive words, best first"""
+        terms: List[str] = []
+        weights: List[float] = []
+        for field, weight in FIELD_WEIGHTS:
+            tokens = tokenize(str(fields.get(field) or ""))
+            terms.extend(tokens)
+            weights.extend([weight] * len(tokens))
+        if not terms:
+            return []
+        unique, first_seen, inverse = np.unique(np.array(terms), return_index=True, return_inverse=True)
+        term_frequency = np.bincount(inverse, weights=np.array(weights))
+        ids = np.array([self.vocabulary.get(term, -1) for term in unique.tolist()], dtype=np.int64)
+        scores = (1.0 + np.log(term_frequency)) * self.idf[ids]
+        order = np.lexsort((first_seen, -scores))
+        return [str(unique[i]) for i in order[:limit].tolist()]
+
+    def analyze(self, product_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Ad copy in the same shape as LLMService.analyze_product"""
+        title = str(product_info.get("title") or "").strip() or "This product"
+        ranked = self.rank_keywords(product_info)
+        words = set(tokenize(" ".join(str(product_info.get(field) or "") for field, _ in FIELD_WEIGHTS)))
+
+        k1, k2, k3 = (ranked + [w for w in FILLER_KEYWORDS if w not in ranked])[:3]
+        values = {"title": short_title(title), "k1": k1, "k2": k2, "k3": k3, "K1": k1.capitalize()}
+        start = zlib.crc32(title.lower().encode("utf-8")) % len(CAPTION_TEMPLATES)
+        captions = [
+            CAPTION_TEMPLATES[(start + i) % len(CAPTION_TEMPLATES)].format(**values)
+            for i in range(3)
+        ]
+
+        primary_cta = next((cta for triggers, cta in CTA_RULES if words & triggers), DEFAULT_CTA)
+        audience = next(
+            (audience for triggers, audience in AUDIENCE_RULES if words & triggers),
+            f"Shoppers looking for {k1} and {k2}",
+        )
+        return {
+            "primary_cta": primary_cta,
+            "keywords": [keyword.upper() for keyword in ranked] or [w.upper() for w in FILLER_KEYWORDS],
+            "captions": captions,
+            "target_audience": audience,
+        }
+
+
+copy_engine = CopyEngine()
@@ -0,0 +1,147 @@
+import asyncio
+import os
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+import aiohttp
+
+from services.logging_config import get_logger
+from services.metrics import Counter, registry
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+deadline_exceeded = registry.register(Counter(
+    "adgen_stage_deadline_exceeded_total",
+    "Pipeline stages that ran out of their deadline budget and degraded.",
+    ("stage",),
+))
+stage_degraded = registry.register(Counter(
+    "adgen_stage_degraded_total",
+    "Pipeline stages that fell back to degraded output, by reason (deadline, error, fallback).",
+    ("stage", "reason"),
+))
+
+# Share of the whole request deadline each stage may use at most. Stages
+# run partly in parallel, so shares are caps rather than a partition.
+DEFAULT_STAGE_SHARES = {
+    "scrape": 0.3,
+    "image_fetch": 0.15,
+    "classify": 0.3,
+    "copy_analysis": 0.4,
+    "motion_effect": 0.5,
+    "generation": 0.5,
+}
+
+
+def _parse_shares(spec: str) -> Dict[str, float]:
+    shares = dict(DEFAULT_STAGE_SHARES)
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            shares[name.strip()] = float(value)
+    return shares
+
+
+class DeadlinePolicy:
+    """Request deadline configuration: default, ceiling and per-stage shares"""
+
+    def __init__(self):
+        self.default = float(os.getenv("REQUEST_DEADLINE", "25"))
+        self.maximum = float(os.getenv("REQUEST_DEADLINE_MAX", "60"))
+        self.minimum = float(os.getenv("REQUEST_DEADLINE_MIN", "1"))
+        # Part of the deadline held back for local rendering and encoding
+        self.reserve_share = float(os.getenv("DEADLINE_RENDER_RESERVE", "0.15"))
+        self.shares = _parse_shares(os.getenv("DEADLINE_STAGE_SHARES", ""))
+
+    def start(self, header_value: Optional[str] = None) -> "Deadline":
+        """Begin a request's deadline from its X-Request-Timeout header (seconds) or the default"""
+        seconds = self.default
+        if header_value:
+            try:
+                seconds = float(header_value)
+            except ValueError:
+                pass
+        seconds = min(max(seconds, self.minimum), self.maximum)
+        deadline = Deadline(seconds, self)
+        _current_deadline.set(deadline)
+        return deadline
+
+
+class Deadline:
+    def __init__(self, seconds: float, policy: DeadlinePolicy):
+        self.seconds = seconds
+        self.policy = policy
+        self.expires_at = time.monotonic() + seconds
+        self.degraded: List[str] = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def budget(self, stage: str) -> float:
+        """Seconds the stage may take: its share, but never eating into the render reserve"""
+        share = self.policy.shares.get(stage, 1.0)
+        reserve = self.seconds * self.policy.reserve_share
+        return max(0.0, min(self.seconds * share, self.remaining() - reserve))
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def stage_budget(stage: str, default: Optional[float] = None) -> Optional[float]:
+    """The stage's budget under the current request deadline, capped by `default`"""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return default
+    budget = deadline.budget(stage)
+    return budget if default is None else min(default, budget)
+
+
+def stage_timeout(stage: str, default: float) -> aiohttp.ClientTimeout:
+    """aiohttp timeout for an outbound call made within a stage"""
+    return aiohttp.ClientTimeout(total=stage_budget(stage, default))
+
+
+def mark_degraded(stage: str, reason: str = "deadline"):
+    """
+    Record that a stage fell back to degraded output (counted once per
+    request). reason is "deadline" when its budget ran out, "error" when a
+    provider or input failed, or "fallback" when the stage had nothing to
+    work with; only deadline expiry counts as exceeding the deadline.
+    """
+    deadline = _current_deadline.get()
+    if deadline is not None:
+        if stage in deadline.degraded:
+            return
+        deadline.degraded.append(stage)
+    stage_degraded.inc(stage=stage, reason=reason)
+    if reason == "deadline":
+        deadline_exceeded.inc(stage=stage)
+
+
+async def within_budget(stage: str, awaitable: Awaitable[T], fallback: Callable[[], T]) -> T:
+    """
+    Await `awaitable` for at most the stage's budget. On timeout the work is
+    cancelled and `fallback()` is returned instead, so the request degrades
+    rather than overrunning its deadline.
+    """
+    budget = stage_budget(stage)
+    if budget is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout=budget)
+    except asyncio.TimeoutError:
+        logger.warning("Stage %s exceeded its %.2fs budget, degrading", stage, budget)
+        mark_degraded(stage)
+        return fallback()
+
+
+def degraded_stages() -> List[str]:
+    deadline = _current_deadline.get()
+    return list(deadline.degraded) if deadline is not None else []
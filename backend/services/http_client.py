@@ -0,0 +1,92 @@
+import asyncio
+import os
+from typing import Optional
+
+import aiohttp
+
+from services.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class HTTPClient:
+    """
+    Application-wide aiohttp session shared by every service.
+
+    Reusing one connector keeps TCP/TLS connections alive between requests,
+    caps concurrent connections per host and caches DNS lookups. The session
+    is opened at startup and closed at shutdown; code running outside the
+    app (scripts, benchmarks) gets one created lazily on first use.
+    """
+
+    def __init__(self):
+        self.limit = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+        self.limit_per_host = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "10"))
+        self.dns_cache_ttl = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+        self.keepalive_timeout = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+        self.timeout = aiohttp.ClientTimeout(
+            total=float(os.getenv("HTTP_TOTAL_TIMEOUT", "30")),
+            connect=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True,
+            keepalive_timeout=self.keepalive_timeout,
+            enable_cleanup_closed=True,
+        )
+        self._loop = asyncio.get_running_loop()
+        return aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The shared session; must be used from inside the event loop"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._session = self._create_session()
+        return self._session
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+            logger.info(
+                "HTTP client started: limit=%d per_host=%d dns_ttl=%ds",
+                self.limit, self.limit_per_host, self.dns_cache_ttl
+            )
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+    async def preconnect(self, url: str, timeout: float = 5.0) -> bool:
+        """Open a pooled connection to url's host (DNS, TCP, TLS) ahead of the first real request"""
+        try:
+            async with self.session.head(url, timeout=aiohttp.ClientTimeout(total=timeout), allow_redirects=False):
+                pass
+            return True
+        except Exception as e:
+            logger.warning("Preconnect to %s failed: %s", url, e)
+            return False
+
+    def stats(self) -> dict:
+        """Connection pool usage for diagnostics"""
+        if self._session is None or self._session.closed:
+            return {"open": False}
+        connector = self._session.connector
+        acquired = len(getattr(connector, "_acquired", ()))
+        return {
+            "open": True,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "acquired": acquired,
+        }
+
+
+http_client = HTTPClient()
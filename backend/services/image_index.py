@@ -0,0 +1,237 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from services.logging_config import get_logger
+from services.metrics import Counter, registry
+from services.storage import cache_path
+
+logger = get_logger(__name__)
+
+index_lookups = registry.register(Counter(
+    "adgen_image_index_lookups_total",
+    "Near-duplicate image lookups by result.",
+    ("result",),
+))
+
+INDEX_VERSION = 1
+HASH_BITS = 64
+
+# Byte -> number of set bits, for popcounts on uint64 arrays viewed as bytes
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def _grayscale(image_data: bytes, size: Tuple[int, int]) -> np.ndarray:
+    img = Image.open(BytesIO(image_data))
+    img.draft("L", (size[0] * 4, size[1] * 4))
+    if img.mode in ("RGBA", "LA", "P"):
+        # Flatten transparency onto white so re-saved cut-outs hash the same
+        rgba = img.convert("RGBA")
+        background = Image.new("RGBA", rgba.size, (255, 255, 255, 255))
+        img = Image.alpha_composite(background, rgba)
+    return np.asarray(img.convert("L").resize(size, Image.Resampling.BOX), dtype=np.float32)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel().astype(np.uint8)).tobytes(), "big")
+
+
+def dhash(image_data: bytes) -> int:
+    """64-bit difference hash: whether each pixel is brighter than its right neighbour"""
+    pixels = _grayscale(image_data, (9, 8))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(image_data: bytes) -> int:
+    """64-bit DCT hash: low-frequency coefficients compared with their median"""
+    pixels = _grayscale(image_data, (32, 32))
+    coefficients = (_DCT_32 @ pixels @ _DCT_32.T)[:8, :8]
+    return _bits_to_int(coefficients > np.median(coefficients.ravel()[1:]))
+
+
+HASH_FUNCTIONS = {"dhash": dhash, "phash": phash}
+
+
+def hamming_distances(target: int, hashes: np.ndarray) -> np.ndarray:
+    """Hamming distance from target to each uint64 in hashes"""
+    xor = np.bitwise_xor(hashes, np.uint64(target))
+    return _POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class PerceptualIndex:
+    """
+    Finds previously processed images that look the same as a new one.
+
+    Images are keyed by a 64-bit perceptual hash and match when they differ
+    in at most `max_distance` bits, which catches re-encodes, resized copies
+    and small edits that byte digests miss. The hash is split into
+    max_distance + 1 bands; any match within the distance must agree exactly
+    on at least one band, so lookups only compare against the few entries
+    sharing a band value instead of scanning the whole index.
+
+    Each entry holds a payload of reusable results (category, keywords,
+    motion output reference). Entries are evicted oldest first and persisted
+    as JSON so they survive restarts.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_distance: Optional[int] = None):
+        self.enabled = os.getenv("IMAGE_INDEX_ENABLED", "true").lower() == "true"
+        self.path = path or os.getenv("IMAGE_INDEX_PATH", cache_path("image_index.json"))
+        self.max_distance = max_distance if max_distance is not None else int(os.getenv("IMAGE_INDEX_MAX_DISTANCE", "5"))
+        self.max_entries = int(os.getenv("IMAGE_INDEX_MAX_ENTRIES", "500000"))
+        self.save_interval = float(os.getenv("IMAGE_INDEX_SAVE_INTERVAL", "60"))
+        self.hash_name = os.getenv("IMAGE_INDEX_HASH", "dhash").lower()
+        if self.hash_name not in HASH_FUNCTIONS:
+            logger.warning("Unknown IMAGE_INDEX_HASH %r, using dhash", self.hash_name)
+            self.hash_name = "dhash"
+
+        band_count = min(HASH_BITS, self.max_distance + 1)
+        edges = [round(i * HASH_BITS / band_count) for i in range(band_count + 1)]
+        # (shift, mask) for each band, most significant bits first
+        self._bands = [
+            (HASH_BITS - end, (1 << (end - start)) - 1)
+            for start, end in zip(edges[:-1], edges[1:])
+        ]
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._tables: List[Dict[int, set]] = [{} for _ in self._bands]
+        self._dirty = False
+        self._saving = False
+        self._last_save = time.monotonic()
+        self._lock = threading.Lock()
+        if self.enabled:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def hash_image(self, image_data: bytes) -> Optional[int]:
+        if not self.enabled:
+            return None
+        try:
+            return HASH_FUNCTIONS[self.hash_name](image_data)
+        except Exception as e:
+            logger.warning("Could not hash image for near-duplicate lookup: %s", e)
+            return None
+
+    def _band_keys(self, image_hash: int):
+        for i, (shift, mask) in enumerate(self._bands):
+            yield i, (image_hash >> shift) & mask
+
+    def lookup(self, image_hash: Optional[int]) -> Optional[Dict[str, Any]]:
+        """Return the payload of the closest indexed image within max_distance, if any"""
+        if image_hash is None:
+            return None
+        with self._lock:
+            payload = self._entries.get(image_hash)
+            if payload is not None:
+                index_lookups.inc(result="exact")
+                return dict(payload, distance=0)
+            candidates = set()
+            for i, key in self._band_keys(image_hash):
+                candidates.update(self._tables[i].get(key, ()))
+            if not candidates:
+                index_lookups.inc(result="miss")
+                return None
+            ordered = list(candidates)
+            distances = hamming_distances(image_hash, np.array(ordered, dtype=np.uint64))
+            best = int(distances.argmin())
+            if distances[best] > self.max_distance:
+                index_lookups.inc(result="miss")
+                return None
+            index_lookups.inc(result="near")
+            return dict(self._entries[ordered[best]], distance=int(distances[best]))
+
+    def add(self, image_hash: Optional[int], **payload: Any):
+        """Store results for an image, merging with anything already stored for the same hash"""
+        if image_hash is None:
+            return
+        with self._lock:
+            existing = self._entries.get(image_hash)
+            if existing is None:
+                self._entries[image_hash] = {k: v for k, v in payload.items() if v is not None}
+                for i, key in self._band_keys(image_hash):
+                    self._tables[i].setdefault(key, set()).add(image_hash)
+                self._evict()
+            else:
+                existing.update({k: v for k, v in payload.items() if v is not None})
+                self._entries.move_to_end(image_hash)
+            self._dirty = True
+        self._maybe_save()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            image_hash, _ = self._entries.popitem(last=False)
+            for i, key in self._band_keys(image_hash):
+                bucket = self._tables[i].get(key)
+                if bucket is not None:
+                    bucket.discard(image_hash)
+                    if not bucket:
+                        del self._tables[i][key]
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable image index %s: %s", self.path, e)
+            return
+        if data.get("version") != INDEX_VERSION or data.get("hash") != self.hash_name:
+            logger.info("Discarding image index built with %s v%s", data.get("hash"), data.get("version"))
+            return
+        for image_hash, payload in data.get("entries", []):
+            self.add(int(image_hash, 16), **payload)
+        self._dirty = False
+
+    def save(self):
+        """Atomically write the index to disk if it changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = {
+                "version": INDEX_VERSION,
+                "hash": self.hash_name,
+                # Copied under the lock: add() updates stored payloads in place
+                "entries": [[f"{h:016x}", dict(p)] for h, p in self._entries.items()],
+            }
+            self._dirty = False
+            self._last_save = time.monotonic()
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not persist image index to %s: %s", self.path, e)
+
+    def _maybe_save(self):
+        # Serialising a large index takes a while, so periodic saves run off the request path
+        if self._dirty and not self._saving and time.monotonic() - self._last_save >= self.save_interval:
+            self._saving = True
+            threading.Thread(target=self._background_save, name="image-index-save", daemon=True).start()
+
+    def _background_save(self):
+        try:
+            self.save()
+        finally:
+            self._saving = False
@@ -1,23 +1,149 @@
+import asyncio
 import os
-from typing import Dict, Any, List
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
 import base64
 from io import BytesIO
-from PIL import Image
+from PIL import Image, ImageOps
+
+from services.deadline import mark_degraded, stage_timeout
+from services.http_client import http_client
+from services.logging_config import get_logger
+from services.memory_budget import pixel_budget
+from services.metrics import Counter, registry, timed_stage, track_provider_call
+from services.prediction_jobs import prediction_runner
+from services.product_images import ProductImage, ProductImageCache
+from services.provider_registry import configured_api_key
+from services.render_cache import RenderCache, render_key
+from services.text_layout import FONT_PATH, TextBlock, fit_text, load_font
+
+logger = get_logger(__name__)
+
+background_requests = registry.register(Counter(
+    "adgen_ai_background_requests_total",
+    "Generated background lookups by result (hit, generated, error).",
+    ("result",),
+))
+
+# Bump whenever a change to the drawing code alters rendered pixels
+RENDERER_VERSION = "3"
+
+# Platform sizes every product is rendered at
+AD_SIZES = ((1080, 1080), (1200, 675), (1080, 1920))
+
+# Top and bottom colours of the background used when there is no product image
+GRADIENT_COLORS = {
+    "Artist": [(100, 50, 150), (200, 100, 200)],
+    "Cartoonist": [(255, 200, 100), (255, 150, 50)],
+    "Sticker": [(100, 200, 255), (50, 150, 255)],
+    "Realistic Image Store": [(240, 240, 250), (220, 220, 240)]
+}
+
+# Largest title, keyword and CTA font sizes as fractions of the ad height;
+# text is shrunk from there until it fits its box, down to a fraction of the
+# shorter side so narrow formats can still fit long labels
+FONT_SCALES = (0.08, 0.05, 0.05)
+MIN_FONT_SCALE = 0.025
+MIN_FONT_SIZE = 12
+
+# Vertical extent (top, bottom) of each text box as fractions of the ad height,
+# all inside the dark band over the bottom 30%
+TITLE_BOX = (0.715, 0.82)
+KEYWORD_BOX = (0.825, 0.87)
+CTA_BOX = (0.875, 0.965)
+TITLE_MAX_LINES = 2
+# Side margin of the title and keyword boxes, and width of the CTA button, as fractions of the ad width
+TEXT_MARGIN = 0.04
+CTA_WIDTH = 0.4
+
+# Bump whenever the background prompt wording changes, so cached backgrounds are regenerated
+BACKGROUND_VERSION = "1"
+
+# Look asked of generated backgrounds, by category
+BACKGROUND_STYLES = {
+    "Artist": "painterly abstract texture, soft brush strokes",
+    "Cartoonist": "playful flat cartoon scenery, bright colours",
+    "Sticker": "bold flat graphic pattern, clean vector shapes",
+    "Realistic Image Store": "photographic studio backdrop, soft natural light"
+}
+
+# Selling words that say nothing about how a background should look
+PROMPT_STOP_WORDS = {"premium", "quality", "exclusive", "limited", "now", "new", "sale", "best", "shop", "buy"}
+
+
+def background_prompt(keywords: List[str], category: str) -> str:
+    """Text-to-image prompt for an ad background from the copy keywords and the product category"""
+    themes: List[str] = []
+    for keyword in keywords:
+        word = str(keyword).strip().lower()
+        if word and word not in PROMPT_STOP_WORDS and word not in themes:
+            themes.append(word)
+    style = BACKGROUND_STYLES.get(category, BACKGROUND_STYLES["Realistic Image Store"])
+    theme = f" evoking {', '.join(themes[:5])}" if themes else ""
+    return (
+        f"Advertising background{theme}, {style}, uncluttered, "
+        "plain lower third, no text, no logos, no people"
+    )
+
+
+@lru_cache(maxsize=64)
+def _gradient_strip(height: int, category: str) -> Image.Image:
+    """One-pixel-wide column of the category gradient; rows are uniform, so it stretches to any width"""
+    colors = GRADIENT_COLORS.get(category, [(240, 240, 250), (220, 220, 240)])
+    strip = Image.new('RGB', (1, height), colors[0])
+    for y in range(height):
+        ratio = y / height
+        r = int(colors[0][0] * (1 - ratio) + colors[1][0] * ratio)
+        g = int(colors[0][1] * (1 - ratio) + colors[1][1] * ratio)
+        b = int(colors[0][2] * (1 - ratio) + colors[1][2] * ratio)
+        strip.putpixel((0, y), (r, g, b))
+    return strip
 
 
 class ImageService:
     def __init__(self):
-        self.api_key = os.getenv("IMAGE_GENERATION_API_KEY")
+        self.api_key = configured_api_key("IMAGE_GENERATION_API_KEY", "your_image_generation_api_key_here")
         self.provider = os.getenv("IMAGE_GENERATION_PROVIDER", "stability").lower()
+        self.stability_api_host = os.getenv("STABILITY_API_HOST", "https://api.stability.ai").rstrip("/")
+        self.render_cache = RenderCache("ad_creatives")
+        # Shared with the request flow in main, so each product image is fetched and decoded once
+        self.product_images = ProductImageCache()
+        self.backgrounds_enabled = os.getenv("AI_BACKGROUNDS_ENABLED", "true").lower() == "true"
+        self.background_cache = RenderCache("ai_backgrounds")
+        self._background_inflight: Dict[str, asyncio.Future] = {}
+        self._placeholder_url: Optional[str] = None
+    
+    def warm_up(self):
+        """
+        Load fonts, gradients and the placeholder for every ad size, then run
+        one tiny render so the JPEG decoder and PNG encoder are initialised
+        before the first real request. Blocking; call from a thread.
+        """
+        for width, height in AD_SIZES:
+            for scale in FONT_SCALES:
+                load_font(int(height * scale))
+            for category in GRADIENT_COLORS:
+                _gradient_strip(height, category)
+        self._create_placeholder_image({}, 0)
+        
+        sample = BytesIO()
+        Image.new('RGB', (64, 64), (200, 120, 60)).save(sample, format='JPEG')
+        source = Image.open(sample)
+        source.load()
+        if self._render_ad_image(source, "Warm-up", ["ready"], "Shop Now", (160, 160), "Artist") is None:
+            raise RuntimeError("warm-up render failed")
     
     async def generate_ad_creatives(
         self,
         product_info: Dict[str, Any],
         analysis: Dict[str, Any],
-        category: str = "Realistic Image Store"
+        category: str = "Realistic Image Store",
+        background: Optional[ProductImage] = None
     ) -> Dict[str, Any]:
         """
         Generate ad creative images from product information in multiple platform sizes.
+        A generated background (see start_background) replaces the gradient
+        when the product has no image of its own.
         """
         try:
             # Get keywords and primary CTA
@@ -30,56 +156,62 @@ class ImageService:
             
             # Facebook Feed - 1:1 (1080x1080)
             try:
-                facebook_ad = await self._generate_ad_with_text(
-                    product_info=product_info,
-                    keywords=keywords,
-                    primary_cta=primary_cta,
-                    size=(1080, 1080),
-                    category=category
-                )
+                with timed_stage("render_1080x1080"):
+                    facebook_ad = await self._generate_ad_with_text(
+                        product_info=product_info,
+                        keywords=keywords,
+                        primary_cta=primary_cta,
+                        size=(1080, 1080),
+                        category=category,
+                        background=background
+                    )
                 if facebook_ad and facebook_ad.startswith('data:image'):
                     ad_sizes["facebook"] = {"url": facebook_ad, "size": "1080×1080", "ratio": "1:1"}
                 else:
-                    print(f"Warning: Facebook ad generation failed, using placeholder")
+                    logger.warning("Facebook ad generation failed, using placeholder")
                     ad_sizes["facebook"] = {"url": self._create_placeholder_image(product_info, 0), "size": "1080×1080", "ratio": "1:1"}
             except Exception as e:
-                print(f"Error generating Facebook ad: {str(e)}")
+                logger.error("Error generating Facebook ad: %s", e)
                 ad_sizes["facebook"] = {"url": self._create_placeholder_image(product_info, 0), "size": "1080×1080", "ratio": "1:1"}
             
             # X/Twitter - 16:9 (1200x675)
             try:
-                twitter_ad = await self._generate_ad_with_text(
-                    product_info=product_info,
-                    keywords=keywords,
-                    primary_cta=primary_cta,
-                    size=(1200, 675),
-                    category=category
-                )
+                with timed_stage("render_1200x675"):
+                    twitter_ad = await self._generate_ad_with_text(
+                        product_info=product_info,
+                        keywords=keywords,
+                        primary_cta=primary_cta,
+                        size=(1200, 675),
+                        category=category,
+                        background=background
+                    )
                 if twitter_ad and twitter_ad.startswith('data:image'):
                     ad_sizes["twitter"] = {"url": twitter_ad, "size": "1200×675", "ratio": "16:9"}
                 else:
-                    print(f"Warning: Twitter ad generation failed, using placeholder")
+                    logger.warning("Twitter ad generation failed, using placeholder")
                     ad_sizes["twitter"] = {"url": self._create_placeholder_image(product_info, 0), "size": "1200×675", "ratio": "16:9"}
             except Exception as e:
-                print(f"Error generating Twitter ad: {str(e)}")
+                logger.error("Error generating Twitter ad: %s", e)
                 ad_sizes["twitter"] = {"url": self._create_placeholder_image(product_info, 0), "size": "1200×675", "ratio": "16:9"}
             
             # TikTok/Reels - 9:16 (1080x1920)
             try:
-                tiktok_ad = await self._generate_ad_with_text(
-                    product_info=product_info,
-                    keywords=keywords,
-                    primary_cta=primary_cta,
-                    size=(1080, 1920),
-                    category=category
-                )
+                with timed_stage("render_1080x1920"):
+                    tiktok_ad = await self._generate_ad_with_text(
+                        product_info=product_info,
+                        keywords=keywords,
+                        primary_cta=primary_cta,
+                        size=(1080, 1920),
+                        category=category,
+                        background=background
+                    )
                 if tiktok_ad and tiktok_ad.startswith('data:image'):
                     ad_sizes["tiktok"] = {"url": tiktok_ad, "size": "1080×1920", "ratio": "9:16"}
                 else:
-                    print(f"Warning: TikTok ad generation failed, using placeholder")
+                    logger.warning("TikTok ad generation failed, using placeholder")
                     ad_sizes["tiktok"] = {"url": self._create_placeholder_image(product_info, 0), "size": "1080×1920", "ratio": "9:16"}
             except Exception as e:
-                print(f"Error generating TikTok ad: {str(e)}")
+                logger.error("Error generating TikTok ad: %s", e)
                 ad_sizes["tiktok"] = {"url": self._create_placeholder_image(product_info, 0), "size": "1080×1920", "ratio": "9:16"}
             
             return {
@@ -89,7 +221,7 @@ class ImageService:
             }
         
         except Exception as e:
-            print(f"Error generating ad creatives: {str(e)}")
+            logger.error("Error generating ad creatives: %s", e)
             # Return placeholder images
             placeholder = self._create_placeholder_image(product_info, 0)
             return {
@@ -108,7 +240,8 @@ class ImageService:
         keywords: List[str],
         primary_cta: str,
         size: tuple,
-        category: str
+        category: str,
+        background: Optional[ProductImage] = None
     ) -> str:
         """Generate ad image with text overlays for specific size"""
         try:
@@ -123,13 +256,14 @@ class ImageService:
                 keywords=keywords,
                 primary_cta=primary_cta,
                 size=size,
-                category=category
+                category=category,
+                background=background
             )
             
             return ad_image
         
         except Exception as e:
-            print(f"Error generating ad with text: {str(e)}")
+            logger.error("Error generating ad with text: %s", e)
             return self._create_placeholder_image(product_info, 0)
     
     async def _create_ad_image_with_overlay(
@@ -139,27 +273,83 @@ class ImageService:
         keywords: List[str],
         primary_cta: str,
         size: tuple,
-        category: str
+        category: str,
+        background: Optional[ProductImage] = None
     ) -> str:
         """Create ad image with text overlays using PIL"""
         try:
-            from PIL import Image, ImageDraw, ImageFont
-            import aiohttp
+            width, height = size
+            
+            product_image = None
+            if product_image_url:
+                try:
+                    # Usually a memory hit: main fetched it for classification
+                    with timed_stage("image_fetch"):
+                        product_image = await self.product_images.fetch(
+                            product_image_url, timeout=stage_timeout("image_fetch", 30)
+                        )
+                except asyncio.TimeoutError:
+                    # Out of budget: render on the category gradient instead
+                    mark_degraded("image_fetch")
+                except Exception as e:
+                    logger.warning("Could not fetch product image: %s", e)
+            # A generated background only stands in for a missing product image,
+            # and is scaled to cover the frame rather than fitted like a product shot
+            cover = product_image is None and background is not None
+            if cover:
+                product_image = background
+            source = product_image.image if product_image is not None else None
+            
+            # Identical inputs render identical pixels, so reuse an earlier encode
+            cache_key = render_key(
+                "ad_creative", RENDERER_VERSION,
+                image=product_image.digest if product_image is not None else None, title=str(title), keywords=[str(k) for k in keywords[:1]],
+                primary_cta=str(primary_cta), size=[width, height], category=category, cover=cover, font=FONT_PATH,
+            )
+            cached = await self.render_cache.aget(cache_key)
+            if cached is not None:
+                return f"data:image/png;base64,{base64.b64encode(cached).decode('utf-8')}"
+            
+            # Reserve decoded-pixel budget for the resized source and the
+            # full-frame canvases (bounded-memory mode only); the decoded
+            # source itself is held, and bounded, by the product image cache
+            async with pixel_budget.reserve(self._render_memory_estimate(source, size, cover), kind="ad_creative"):
+                png_bytes = self._render_ad_image(source, title, keywords, primary_cta, size, category, cover)
+            if not png_bytes:
+                return self._create_placeholder_image({"title": title}, 0)
+            
+            await self.render_cache.aput(cache_key, png_bytes)
+            logger.debug("Generated %sx%s ad image: %d PNG bytes", width, height, len(png_bytes))
+            return f"data:image/png;base64,{base64.b64encode(png_bytes).decode('utf-8')}"
+        
+        except Exception as e:
+            logger.error("Error creating ad image with overlay: %s", e)
+            return self._create_placeholder_image({"title": title}, 0)
+    
+    def _render_ad_image(
+        self,
+        source: Optional[Image.Image],
+        title: str,
+        keywords: List[str],
+        primary_cta: str,
+        size: tuple,
+        category: str,
+        cover: bool = False
+    ) -> Optional[bytes]:
+        """Draw the ad with its text overlays and return PNG bytes, or None on failure"""
+        try:
+            from PIL import ImageDraw
             
             width, height = size
             
             # Create base image
-            if product_image_url:
+            if source is not None:
                 try:
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(product_image_url) as response:
-                            if response.status == 200:
-                                image_data = await response.read()
-                                base_img = Image.open(BytesIO(image_data))
-                                # Resize and crop to fit
-                                base_img = self._resize_and_crop(base_img, (width, height))
-                            else:
-                                base_img = self._create_gradient_background(width, height, category)
+                    # Resize and crop to fit; the source is shared, so it is left untouched
+                    if cover:
+                        base_img = ImageOps.fit(source.convert('RGB'), (width, height), Image.Resampling.LANCZOS)
+                    else:
+                        base_img = self._resize_and_crop(source, (width, height))
                 except:
                     base_img = self._create_gradient_background(width, height, category)
             else:
@@ -169,113 +359,102 @@ class ImageService:
             overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
             draw = ImageDraw.Draw(overlay)
             
-            # Try to load a font, fallback to default
-            try:
-                # Try to use a bold font
-                font_large = ImageFont.truetype("arial.ttf", size=int(height * 0.08))
-                font_medium = ImageFont.truetype("arial.ttf", size=int(height * 0.05))
-                font_small = ImageFont.truetype("arial.ttf", size=int(height * 0.04))
-            except:
-                font_large = ImageFont.load_default()
-                font_medium = ImageFont.load_default()
-                font_small = ImageFont.load_default()
-            
             # Add semi-transparent background for text readability
             text_bg_height = int(height * 0.3)
             text_bg = Image.new('RGBA', (width, text_bg_height), (0, 0, 0, 180))
             overlay.paste(text_bg, (0, height - text_bg_height), text_bg)
             
-            # Add title (truncate if too long)
-            title_display = str(title)[:50] if len(str(title)) > 50 else str(title)
-            title_y = height - text_bg_height + int(height * 0.05)
+            # Each element is wrapped and shrunk until it fits its box; layouts
+            # and glyph measurements are memoized, so repeats cost nothing
+            margin = int(width * TEXT_MARGIN)
+            min_size = max(MIN_FONT_SIZE, int(min(width, height) * MIN_FONT_SCALE))
+            title_scale, keyword_scale, cta_scale = FONT_SCALES
+            
+            # Add title, wrapped onto up to two lines
+            title_box = (margin, int(height * TITLE_BOX[0]), width - margin, int(height * TITLE_BOX[1]))
             try:
-                # Get text bounding box for centering
-                bbox = draw.textbbox((0, 0), title_display, font=font_large)
-                text_width = bbox[2] - bbox[0]
-                text_x = (width - text_width) // 2
-                draw.text((text_x, title_y), title_display, fill=(255, 255, 255, 255), font=font_large)
+                title_block = self._fit(str(title), title_box, int(height * title_scale), min_size, TITLE_MAX_LINES)
+                self._draw_block(draw, title_block, title_box, (255, 255, 255, 255))
             except Exception as e:
-                print(f"Error drawing title: {str(e)}")
-                # Fallback without font
-                try:
-                    draw.text((width // 2, title_y), title_display, fill=(255, 255, 255, 255))
-                except:
-                    pass
+                logger.error("Error drawing title: %s", e)
             
-            # Add primary keyword/CTA
+            # Add primary keyword
             if keywords and len(keywords) > 0:
-                keyword_text = str(keywords[0]).upper()[:20]  # Limit length
-                keyword_y = title_y + int(height * 0.08)
+                keyword_box = (margin, int(height * KEYWORD_BOX[0]), width - margin, int(height * KEYWORD_BOX[1]))
                 try:
-                    bbox = draw.textbbox((0, 0), keyword_text, font=font_medium)
-                    text_width = bbox[2] - bbox[0]
-                    text_x = (width - text_width) // 2
-                    draw.text((text_x, keyword_y), keyword_text, fill=(255, 255, 0, 255), font=font_medium)
+                    keyword_block = self._fit(str(keywords[0]).upper(), keyword_box, int(height * keyword_scale), min_size)
+                    self._draw_block(draw, keyword_block, keyword_box, (255, 255, 0, 255))
                 except Exception as e:
-                    print(f"Error drawing keyword: {str(e)}")
-                    try:
-                        draw.text((width // 2, keyword_y), keyword_text, fill=(255, 255, 0, 255))
-                    except:
-                        pass
-            
-            # Add CTA button
-            cta_text = str(primary_cta).upper()[:15]  # Limit length
-            cta_y = height - int(height * 0.08)
-            cta_width = int(width * 0.4)
-            cta_x = width // 2
+                    logger.error("Error drawing keyword: %s", e)
             
-            # Draw CTA background
+            # Add CTA button, with its label fitted inside the button's padding
+            cta_width = int(width * CTA_WIDTH)
+            cta_top, cta_bottom = int(height * CTA_BOX[0]), int(height * CTA_BOX[1])
+            cta_left = width // 2 - cta_width // 2
             try:
-                cta_bg = Image.new('RGBA', (cta_width, int(height * 0.1)), (255, 100, 0, 255))
-                overlay.paste(cta_bg, (cta_x - cta_width // 2, cta_y - int(height * 0.05)), cta_bg)
-                bbox = draw.textbbox((0, 0), cta_text, font=font_medium)
-                text_width = bbox[2] - bbox[0]
-                text_x = cta_x - text_width // 2
-                draw.text((text_x, cta_y), cta_text, fill=(255, 255, 255, 255), font=font_medium)
+                cta_bg = Image.new('RGBA', (cta_width, cta_bottom - cta_top), (255, 100, 0, 255))
+                overlay.paste(cta_bg, (cta_left, cta_top), cta_bg)
+                inset_x, inset_y = cta_width // 10, (cta_bottom - cta_top) // 6
+                label_box = (cta_left + inset_x, cta_top + inset_y, cta_left + cta_width - inset_x, cta_bottom - inset_y)
+                cta_block = self._fit(str(primary_cta).upper(), label_box, int(height * cta_scale), min_size)
+                self._draw_block(draw, cta_block, label_box, (255, 255, 255, 255))
             except Exception as e:
-                print(f"Error drawing CTA: {str(e)}")
-                try:
-                    cta_bg = Image.new('RGBA', (cta_width, int(height * 0.1)), (255, 100, 0, 255))
-                    overlay.paste(cta_bg, (cta_x - cta_width // 2, cta_y - int(height * 0.05)), cta_bg)
-                    draw.text((cta_x, cta_y), cta_text, fill=(255, 255, 255, 255))
-                except:
-                    pass
+                logger.error("Error drawing CTA: %s", e)
             
-            # Composite overlay on base image
-            final_img = Image.alpha_composite(base_img.convert('RGBA'), overlay)
-            final_img = final_img.convert('RGB')
+            # Composite overlay on base image, releasing each canvas as soon as
+            # the next one exists so at most two full frames are alive at once
+            base_rgba = base_img.convert('RGBA')
+            base_img.close()
+            final_img = Image.alpha_composite(base_rgba, overlay)
+            base_rgba.close()
+            overlay.close()
+            final_rgb = final_img.convert('RGB')
+            final_img.close()
             
-            # Convert to base64 data URL
-            try:
+            with timed_stage(f"encode_{width}x{height}"):
                 output = BytesIO()
-                final_img.save(output, format='PNG', quality=95, optimize=True)
-                output.seek(0)
-                
-                import base64
-                img_base64 = base64.b64encode(output.read()).decode('utf-8')
-                data_url = f"data:image/png;base64,{img_base64}"
-                
-                # Verify the data URL is valid
-                if len(img_base64) > 0:
-                    print(f"Successfully generated image: {len(img_base64)} bytes")
-                    return data_url
-                else:
-                    print("Error: Generated empty base64 image")
-                    return self._create_placeholder_image({"title": title}, 0)
-            except Exception as e:
-                print(f"Error converting image to base64: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                return self._create_placeholder_image({"title": title}, 0)
+                final_rgb.save(output, format='PNG', quality=95, optimize=True)
+                final_rgb.close()
+                return output.getvalue() or None
         
         except Exception as e:
-            print(f"Error creating ad image with overlay: {str(e)}")
-            return self._create_placeholder_image({"title": title}, 0)
+            logger.exception("Error rendering ad image: %s", e)
+            return None
+    
+    def _fit(self, text: str, box: tuple, max_size: int, min_size: int, max_lines: int = 1) -> TextBlock:
+        """Largest layout of text that fits box (left, top, right, bottom)"""
+        left, top, right, bottom = box
+        return fit_text(text, right - left, bottom - top, max_size, min_size, max_lines)
+    
+    def _draw_block(self, draw, block: TextBlock, box: tuple, fill: tuple):
+        """Draw each line of a laid-out block, centred in box"""
+        font = block.font
+        for line, position in zip(block.lines, block.positions(box)):
+            draw.text(position, line, fill=fill, font=font)
+    
+    def _render_memory_estimate(self, source: Optional[Image.Image], size: tuple, cover: bool = False) -> int:
+        """Decoded bytes a render allocates: the resized source plus its full-frame canvases"""
+        width, height = size
+        resized = 0
+        if source is not None and cover:
+            # ImageOps.fit scales the source to cover the frame, then crops
+            resized = width * height * 3 * 2
+        elif source is not None:
+            # _resize_and_crop first fits the source within twice the target
+            scale = min(1.0, width * 2 / source.width, height * 2 / source.height)
+            resized = int(source.width * scale) * int(source.height * scale) * len(source.getbands())
+        # RGB base, RGBA base, overlay and composite (RGBA), final RGB
+        return resized + width * height * 18
     
     def _resize_and_crop(self, img: Image.Image, size: tuple) -> Image.Image:
         """Resize and crop image to exact size maintaining aspect ratio"""
         target_width, target_height = size
-        img.thumbnail((target_width * 2, target_height * 2), Image.Resampling.LANCZOS)
+        # Fit within twice the target, as Image.thumbnail would, but into a new
+        # image: the source may be a cached image shared with other renders
+        scale = min(1.0, target_width * 2 / img.width, target_height * 2 / img.height)
+        if scale < 1.0:
+            fitted = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            img = img.resize(fitted, Image.Resampling.LANCZOS, reducing_gap=2.0)
         
         # Crop to exact size from center
         width, height = img.size
@@ -289,29 +468,86 @@ class ImageService:
     
     def _create_gradient_background(self, width: int, height: int, category: str) -> Image.Image:
         """Create gradient background based on category"""
-        from PIL import Image
-        
-        # Category-based color schemes
-        color_schemes = {
-            "Artist": [(100, 50, 150), (200, 100, 200)],
-            "Cartoonist": [(255, 200, 100), (255, 150, 50)],
-            "Sticker": [(100, 200, 255), (50, 150, 255)],
-            "Realistic Image Store": [(240, 240, 250), (220, 220, 240)]
-        }
-        
-        colors = color_schemes.get(category, [(240, 240, 250), (220, 220, 240)])
-        
-        img = Image.new('RGB', (width, height), colors[0])
-        # Simple gradient effect
-        for y in range(height):
-            ratio = y / height
-            r = int(colors[0][0] * (1 - ratio) + colors[1][0] * ratio)
-            g = int(colors[0][1] * (1 - ratio) + colors[1][1] * ratio)
-            b = int(colors[0][2] * (1 - ratio) + colors[1][2] * ratio)
-            for x in range(width):
-                img.putpixel((x, y), (r, g, b))
-        
-        return img
+        return _gradient_strip(height, category).resize((width, height), Image.Resampling.NEAREST)
+    
+    def can_generate_backgrounds(self) -> bool:
+        """Whether AI backgrounds are enabled and the configured provider has credentials"""
+        if not self.backgrounds_enabled:
+            return False
+        if self.provider == "openai":
+            return configured_api_key("OPENAI_API_KEY", "your_openai_api_key_here") is not None
+        if self.provider == "replicate":
+            return configured_api_key("REPLICATE_API_TOKEN") is not None
+        return bool(self.api_key)
+    
+    def start_background(self, keywords: List[str], category: str) -> Optional[asyncio.Future]:
+        """
+        Begin loading the generated background for these keywords and category,
+        from the prompt-keyed cache or the image provider, and return the
+        future of its ProductImage (None inside when generation fails).
+        Requests for one prompt share a single generation, which carries on
+        when a caller stops waiting so the next request finds it cached.
+        Returns None when background generation isn't available.
+        """
+        if not self.can_generate_backgrounds():
+            return None
+        prompt = background_prompt(keywords, category)
+        key = render_key("ai_background", BACKGROUND_VERSION, prompt=prompt, provider=self.provider)
+        pending = self._background_inflight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._load_background(key, prompt))
+            self._background_inflight[key] = pending
+            pending.add_done_callback(lambda task: self._finish_background(key, task))
+        return pending
+    
+    def _finish_background(self, key: str, task: asyncio.Future):
+        if self._background_inflight.get(key) is task:
+            del self._background_inflight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here so abandoned failures aren't reported as unhandled
+    
+    async def _load_background(self, key: str, prompt: str) -> Optional[ProductImage]:
+        loop = asyncio.get_running_loop()
+        data = await self.background_cache.aget(key)
+        generated = data is None
+        if generated:
+            with timed_stage("background_generation"):
+                data = await self._generate_background(prompt)
+            if not data:
+                background_requests.inc(result="error")
+                return None
+        try:
+            # Same byte and pixel limits as product images
+            image = await loop.run_in_executor(None, self.product_images._decode, data)
+        except Exception as e:
+            logger.warning("Could not decode generated background: %s", e)
+            background_requests.inc(result="error")
+            return None
+        if generated:
+            background_requests.inc(result="generated")
+            await self.background_cache.aput(key, data)
+        else:
+            background_requests.inc(result="hit")
+        return ProductImage(f"generated:{key}", data, image)
+    
+    async def _generate_background(self, prompt: str) -> Optional[bytes]:
+        """Image bytes from the configured provider, which answers with a data URL or a download URL"""
+        generate = {
+            "openai": self._generate_with_openai,
+            "replicate": self._generate_with_replicate,
+        }.get(self.provider, self._generate_with_stability)
+        url = await generate(prompt)
+        if not url:
+            return None
+        try:
+            if url.startswith("data:"):
+                return base64.b64decode(url.partition(",")[2])
+            async with http_client.session.get(url, timeout=stage_timeout("generation", 30)) as response:
+                response.raise_for_status()
+                return await response.read()
+        except Exception as e:
+            logger.warning("Could not download generated background: %s", e)
+            return None
     
     async def _generate_with_stability(self, prompt: str) -> str:
         """Generate image using Stability AI"""
@@ -319,10 +555,7 @@ class ImageService:
             if not self.api_key:
                 return None
             
-            import asyncio
-            import aiohttp
-            
-            url = "https://api.stability.ai/v1/generation/stable-diffusion-xl-1024-v1-0/text-to-image"
+            url = f"{self.stability_api_host}/v1/generation/stable-diffusion-xl-1024-v1-0/text-to-image"
             headers = {
                 "Authorization": f"Bearer {self.api_key}",
                 "Content-Type": "application/json"
@@ -336,66 +569,57 @@ class ImageService:
                 "steps": 30
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=data, timeout=30) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        if result.get("artifacts"):
-                            # In production, you'd save the image and return a URL
-                            # For now, return a placeholder
-                            return self._save_generated_image(result["artifacts"][0].get("base64"))
+            with track_provider_call("stability", "text_to_image"):
+                async with http_client.session.post(
+                    url, headers=headers, json=data, timeout=stage_timeout("generation", 30)
+                ) as response:
+                    response.raise_for_status()
+                    result = await response.json()
+            if result.get("artifacts"):
+                # In production, you'd save the image and return a URL
+                # For now, return a placeholder
+                return self._save_generated_image(result["artifacts"][0].get("base64"))
             
             return None
         except Exception as e:
-            print(f"Stability AI error: {str(e)}")
+            logger.error("Stability AI error: %s", e)
             return None
     
     async def _generate_with_openai(self, prompt: str) -> str:
         """Generate image using OpenAI DALL-E"""
         try:
-            import openai
-            import asyncio
-            
-            client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-            
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: client.images.generate(
-                    model="dall-e-3",
-                    prompt=prompt,
-                    size="1024x1024",
-                    quality="standard",
-                    n=1
+            with track_provider_call("openai", "image_generation"):
+                output = await prediction_runner.run(
+                    "openai_images", "dall-e-3",
+                    {"prompt": prompt, "size": "1024x1024", "quality": "standard", "n": 1},
+                    operation="image_generation",
                 )
-            )
-            
-            return response.data[0].url
+            return output[0] if output else None
         except Exception as e:
-            print(f"OpenAI DALL-E error: {str(e)}")
+            logger.error("OpenAI DALL-E error: %s", e)
             return None
     
     async def _generate_with_replicate(self, prompt: str) -> str:
         """Generate image using Replicate"""
         try:
-            import replicate
-            import asyncio
-            
-            loop = asyncio.get_event_loop()
-            output = await loop.run_in_executor(
-                None,
-                lambda: replicate.run(
+            with track_provider_call("replicate", "image_generation"):
+                output = await prediction_runner.run(
+                    "replicate",
                     "stability-ai/stable-diffusion:db21e45d3f7023abc2a46ee38a23973f6dce16bb082a930b0c49861f96d1e5bf",
-                    input={"prompt": prompt}
+                    {"prompt": prompt},
+                    operation="image_generation",
                 )
-            )
+            if isinstance(output, str):
+                return output
             return output[0] if output else None
         except Exception as e:
-            print(f"Replicate error: {str(e)}")
+            logger.error("Replicate error: %s", e)
             return None
     
     def _create_placeholder_image(self, product_info: Dict[str, Any], variation: int = 0) -> str:
         """Create a placeholder image when API is not available"""
+        if self._placeholder_url is not None:
+            return self._placeholder_url
         try:
             # Create a simple placeholder image
             img = Image.new('RGB', (1024, 1024), color=(240, 240, 250))
@@ -405,12 +629,12 @@ class ImageService:
             img.save(img_bytes, format='PNG')
             img_bytes.seek(0)
             
-            # Convert to base64 data URL
-            import base64
+            # Convert to base64 data URL; it never changes, so keep it
             img_base64 = base64.b64encode(img_bytes.read()).decode('utf-8')
-            return f"data:image/png;base64,{img_base64}"
+            self._placeholder_url = f"data:image/png;base64,{img_base64}"
+            return self._placeholder_url
         except Exception as e:
-            print(f"Error creating placeholder image: {str(e)}")
+            logger.error("Error creating placeholder image: %s", e)
             # Return a minimal valid data URL
             return "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
     
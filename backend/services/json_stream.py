@@ -0,0 +1,141 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class IncrementalJSONParser:
+    """
+    Parses the first JSON object in streamed LLM output as it arrives.
+
+    Text before the object (prose, a ``` fence) is skipped. Each top-level
+    field becomes available as soon as its value is complete, and items of
+    a top-level array are exposed one by one while the array is still open.
+    Nested objects and arrays, and braces inside strings, are handled by
+    tracking nesting depth and string state rather than pattern matching.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        # Items received so far for top-level arrays that are still open
+        self.partial: Dict[str, List[Any]] = {}
+        self.done = False
+        self._buffer = ""
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._end: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key: Optional[str] = None
+        self._key_start: Optional[int] = None
+        self._value_start: Optional[int] = None
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consume more text and return the top-level fields it completed"""
+        self._buffer += chunk
+        buf = self._buffer
+        completed: List[Tuple[str, Any]] = []
+        i = self._pos
+        while i < len(buf) and not self.done:
+            c = buf[i]
+            if self._start is None:
+                if c == "{":
+                    self._start = i
+                    self._depth = 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        self._key = self._load(buf[self._key_start:i + 1])
+                        self._key_start = None
+            elif c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._key is None:
+                    self._key_start = i
+            elif c == ":":
+                if self._depth == 1 and self._key is not None and self._value_start is None:
+                    self._value_start = i + 1
+            elif c in "{[":
+                self._depth += 1
+                if c == "[" and self._depth == 2 and not buf[self._value_start:i].strip():
+                    # The top-level value itself is an array: track its items
+                    self._item_start = i + 1
+                    self.partial[self._key] = []
+            elif c in "}]":
+                if self._depth == 2 and self._item_start is not None:
+                    self._finish_item(i)
+                    self._item_start = None
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish_value(i, completed)
+                    self._end = i + 1
+                    self.done = True
+            elif c == ",":
+                if self._depth == 1:
+                    self._finish_value(i, completed)
+                elif self._depth == 2 and self._item_start is not None:
+                    self._finish_item(i)
+                    self._item_start = i + 1
+            i += 1
+        self._pos = i
+        return completed
+
+    @staticmethod
+    def _load(text: str) -> Any:
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+
+    def _finish_item(self, end: int):
+        text = self._buffer[self._item_start:end].strip()
+        if text:
+            self.partial[self._key].append(self._load(text))
+
+    def _finish_value(self, end: int, completed: List[Tuple[str, Any]]):
+        if self._key is not None and self._value_start is not None:
+            text = self._buffer[self._value_start:end].strip()
+            try:
+                value = json.loads(text)
+            except ValueError:
+                value = None
+            else:
+                self.fields[self._key] = value
+                completed.append((self._key, value))
+            self.partial.pop(self._key, None)
+        self._key = None
+        self._value_start = None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """A completed field, or the items so far of an array that is still streaming"""
+        if key in self.fields:
+            return self.fields[key]
+        return self.partial.get(key, default)
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """
+        The parsed object once complete. For truncated output, whatever
+        fields (and partial arrays) arrived; None if nothing usable did.
+        """
+        if self.done:
+            try:
+                value = json.loads(self._buffer[self._start:self._end])
+                if isinstance(value, dict):
+                    return value
+            except ValueError:
+                pass
+        salvaged = dict(self.fields)
+        for key, items in self.partial.items():
+            salvaged.setdefault(key, items)
+        return salvaged or None
+
+
+def parse_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """Extract the first JSON object from LLM output, allowing prose, fences and nesting"""
+    parser = IncrementalJSONParser()
+    parser.feed(text or "")
+    return parser.result()
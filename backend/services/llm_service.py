@@ -1,48 +1,119 @@
 import os
 import base64
-from typing import Dict, Any, Optional
+import threading
+import time
+from typing import AsyncIterator, Dict, Any, Optional
 import asyncio
-import openai
-from anthropic import Anthropic
-import google.generativeai as genai
+
+from services.copy_engine import copy_engine
+from services.deadline import mark_degraded, stage_budget
+from services.json_stream import IncrementalJSONParser, parse_json_object
+from services.logging_config import get_logger
+from services.metrics import record_stage, track_provider_call
+from services.provider_registry import ProviderRegistry, configured_api_key
+
+logger = get_logger(__name__)
+
+CATEGORIES = ("Artist", "Cartoonist", "Sticker", "Realistic Image Store")
+
+# Floor for SDK request timeouts, so a nearly spent budget still allows a real attempt
+MIN_CALL_TIMEOUT = 1.0
+
+
+def _create_openai_client():
+    api_key = configured_api_key("OPENAI_API_KEY", "your_openai_api_key_here")
+    if not api_key:
+        return None
+    import openai
+    openai.api_key = api_key
+    return openai.OpenAI(api_key=api_key)
+
+
+def _create_anthropic_client():
+    api_key = configured_api_key("ANTHROPIC_API_KEY", "your_anthropic_api_key_here")
+    if not api_key:
+        return None
+    from anthropic import Anthropic
+    # ANTHROPIC_BASE_URL lets load tests point at a local stand-in server
+    return Anthropic(
+        api_key=api_key,
+        base_url=os.getenv("ANTHROPIC_BASE_URL") or None
+    )
+
+
+def _create_google_models():
+    api_key = configured_api_key("GOOGLE_API_KEY", "your_google_api_key_here")
+    if not api_key:
+        return None
+    import google.generativeai as genai
+    google_endpoint = os.getenv("GOOGLE_API_ENDPOINT")
+    if google_endpoint:
+        # Custom endpoints (e.g. the local load-test stand-in) only speak REST
+        genai.configure(
+            api_key=api_key,
+            transport="rest",
+            client_options={"api_endpoint": google_endpoint}
+        )
+    else:
+        genai.configure(api_key=api_key)
+    # Use gemini-pro for text and gemini-pro-vision for images (correct model names)
+    return {
+        "text": genai.GenerativeModel('gemini-pro'),
+        "vision": genai.GenerativeModel('gemini-pro-vision'),
+    }
+
+
+PROVIDER_FACTORIES = {
+    "openai": _create_openai_client,
+    "anthropic": _create_anthropic_client,
+    "google": _create_google_models,
+}
 
 
 class LLMService:
     def __init__(self):
         self.provider = os.getenv("PRIMARY_LLM_PROVIDER", "openai").lower()
+        # Combined mode classifies the image and writes the ad copy in one request
+        self.combined_analysis = os.getenv("LLM_COMBINED_ANALYSIS", "false").lower() == "true"
+        self.image_max_side = int(os.getenv("LLM_IMAGE_MAX_SIDE", "768"))
+        # Stream completions so callers can act on fields before the response ends
+        self.streaming = os.getenv("LLM_STREAMING", "true").lower() == "true"
+        # "fast" writes the ad copy locally instead of asking the LLM
+        self.copy_mode = os.getenv("COPY_MODE", "llm").lower()
+        # SDK request timeout in seconds when a call has no request deadline to go by
+        self.call_timeout = float(os.getenv("LLM_CALL_TIMEOUT", "60"))
         
-        # Initialize OpenAI (only if API key is provided)
-        self.openai_client = None
-        openai_key = os.getenv("OPENAI_API_KEY")
-        if openai_key and openai_key.strip() and openai_key != "your_openai_api_key_here":
-            try:
-                openai.api_key = openai_key
-                self.openai_client = openai.OpenAI(api_key=openai_key)
-            except Exception as e:
-                print(f"Warning: Failed to initialize OpenAI client: {str(e)}")
-        
-        # Initialize Anthropic (only if API key is provided)
-        self.anthropic_client = None
-        anthropic_key = os.getenv("ANTHROPIC_API_KEY")
-        if anthropic_key and anthropic_key.strip() and anthropic_key != "your_anthropic_api_key_here":
-            try:
-                self.anthropic_client = Anthropic(api_key=anthropic_key)
-            except Exception as e:
-                print(f"Warning: Failed to initialize Anthropic client: {str(e)}")
-        
-        # Initialize Google Gemini (only if API key is provided)
-        self.google_model = None
-        self.google_vision_model = None
-        google_key = os.getenv("GOOGLE_API_KEY")
-        if google_key and google_key.strip() and google_key != "your_google_api_key_here":
-            try:
-                genai.configure(api_key=google_key)
-                # Use gemini-pro for text and gemini-pro-vision for images (correct model names)
-                self.google_model = genai.GenerativeModel('gemini-pro')
-                self.google_vision_model = genai.GenerativeModel('gemini-pro-vision')
-                print("Gemini API initialized successfully")
-            except Exception as e:
-                print(f"Warning: Failed to initialize Google Gemini: {str(e)}")
+        # Provider SDKs are imported and configured on first use, so only the
+        # provider that actually serves requests pays its startup cost
+        self.providers = ProviderRegistry()
+        for name, factory in PROVIDER_FACTORIES.items():
+            self.providers.register(name, factory)
+    
+    @property
+    def openai_client(self):
+        return self.providers.get("openai")
+    
+    @property
+    def anthropic_client(self):
+        return self.providers.get("anthropic")
+    
+    @property
+    def google_model(self):
+        models = self.providers.get("google")
+        return models["text"] if models else None
+    
+    @property
+    def google_vision_model(self):
+        models = self.providers.get("google")
+        return models["vision"] if models else None
+    
+    def _call_timeout(self, stage: str) -> float:
+        """
+        SDK request timeout for a call made within a stage. Cancelling the
+        awaiting coroutine doesn't stop the executor thread blocked on the
+        provider, so the SDK itself has to give up once the budget is spent.
+        """
+        return max(MIN_CALL_TIMEOUT, stage_budget(stage, self.call_timeout))
     
     async def analyze_image(self, image_data: bytes) -> Dict[str, Any]:
         """
@@ -51,6 +122,7 @@ class LLMService:
         try:
             # Encode image to base64
             image_base64 = base64.b64encode(image_data).decode('utf-8')
+            await self.providers.aget(self.provider)
             
             prompt = """Analyze this product image and classify it into ONE of these categories based on visual style:
 - "Artist" - Hand-drawn, artistic, creative illustrations
@@ -65,84 +137,90 @@ Also provide:
 Format your response as JSON with keys: description, category (must be one of the 4 above), keywords (array), category_description.
 Be concise and marketing-focused."""
             
-            if self.provider == "openai" and hasattr(self, 'openai_client'):
+            if self.provider == "openai" and self.openai_client:
                 return await self._analyze_with_openai(image_data, prompt)
-            elif self.provider == "anthropic" and hasattr(self, 'anthropic_client'):
+            elif self.provider == "anthropic" and self.anthropic_client:
                 return await self._analyze_with_anthropic(image_base64, prompt)
-            elif self.provider == "google" and hasattr(self, 'google_model'):
+            elif self.provider == "google" and self.google_model:
                 return await self._analyze_with_google(image_data, prompt)
             else:
                 # Fallback to default analysis
                 return self._default_image_analysis()
         
         except Exception as e:
-            print(f"Error in LLM image analysis: {str(e)}")
+            logger.error("Error in LLM image analysis: %s", e)
             return self._default_image_analysis()
     
     async def _analyze_with_openai(self, image_data: bytes, prompt: str) -> Dict[str, Any]:
         """Analyze image using OpenAI GPT-4 Vision"""
         try:
             loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.openai_client.chat.completions.create(
-                    model="gpt-4-vision-preview",
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": prompt},
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:image/jpeg;base64,{base64.b64encode(image_data).decode('utf-8')}"
+            timeout = self._call_timeout("classify")
+            with track_provider_call("openai", "analyze_image"):
+                response = await loop.run_in_executor(
+                    None,
+                    lambda: self.openai_client.chat.completions.create(
+                        model="gpt-4-vision-preview",
+                        messages=[
+                            {
+                                "role": "user",
+                                "content": [
+                                    {"type": "text", "text": prompt},
+                                    {
+                                        "type": "image_url",
+                                        "image_url": {
+                                            "url": f"data:image/jpeg;base64,{base64.b64encode(image_data).decode('utf-8')}"
+                                        }
                                     }
-                                }
-                            ]
-                        }
-                    ],
-                    max_tokens=300
+                                ]
+                            }
+                        ],
+                        max_tokens=300,
+                        timeout=timeout
+                    )
                 )
-            )
             
             result_text = response.choices[0].message.content
             return self._parse_llm_response(result_text)
         except Exception as e:
-            print(f"OpenAI analysis error: {str(e)}")
+            logger.error("OpenAI analysis error: %s", e)
             return self._default_image_analysis()
     
     async def _analyze_with_anthropic(self, image_base64: str, prompt: str) -> Dict[str, Any]:
         """Analyze image using Anthropic Claude"""
         try:
             loop = asyncio.get_event_loop()
-            message = await loop.run_in_executor(
-                None,
-                lambda: self.anthropic_client.messages.create(
-                    model="claude-3-opus-20240229",
-                    max_tokens=300,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "image",
-                                    "source": {
-                                        "type": "base64",
-                                        "media_type": "image/jpeg",
-                                        "data": image_base64
-                                    }
-                                },
-                                {"type": "text", "text": prompt}
-                            ]
-                        }
-                    ]
+            timeout = self._call_timeout("classify")
+            with track_provider_call("anthropic", "analyze_image"):
+                message = await loop.run_in_executor(
+                    None,
+                    lambda: self.anthropic_client.messages.create(
+                        model="claude-3-opus-20240229",
+                        max_tokens=300,
+                        messages=[
+                            {
+                                "role": "user",
+                                "content": [
+                                    {
+                                        "type": "image",
+                                        "source": {
+                                            "type": "base64",
+                                            "media_type": "image/jpeg",
+                                            "data": image_base64
+                                        }
+                                    },
+                                    {"type": "text", "text": prompt}
+                                ]
+                            }
+                        ],
+                        timeout=timeout
+                    )
                 )
-            )
             
             result_text = message.content[0].text
             return self._parse_llm_response(result_text)
         except Exception as e:
-            print(f"Anthropic analysis error: {str(e)}")
+            logger.error("Anthropic analysis error: %s", e)
             return self._default_image_analysis()
     
     async def _analyze_with_google(self, image_data: bytes, prompt: str) -> Dict[str, Any]:
@@ -151,8 +229,8 @@ Be concise and marketing-focused."""
             import PIL.Image
             import io
             
-            if not hasattr(self, 'google_vision_model') or self.google_vision_model is None:
-                if not hasattr(self, 'google_model') or self.google_model is None:
+            if self.google_vision_model is None:
+                if self.google_model is None:
                     return self._default_image_analysis()
                 # Fallback to text model if vision model not available
                 model = self.google_model
@@ -161,25 +239,36 @@ Be concise and marketing-focused."""
             
             image = PIL.Image.open(io.BytesIO(image_data))
             loop = asyncio.get_event_loop()
+            timeout = self._call_timeout("classify")
             
-            response = await loop.run_in_executor(
-                None,
-                lambda: model.generate_content([prompt, image])
-            )
+            with track_provider_call("google", "analyze_image"):
+                response = await loop.run_in_executor(
+                    None,
+                    lambda: model.generate_content([prompt, image], request_options={"timeout": timeout})
+                )
             
             result_text = response.text
             return self._parse_llm_response(result_text)
         except Exception as e:
-            print(f"Google Gemini analysis error: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Google Gemini analysis error: %s", e)
             return self._default_image_analysis()
     
-    async def analyze_product(self, product_info: Dict[str, Any]) -> Dict[str, Any]:
+    async def analyze_product(
+        self, product_info: Dict[str, Any], ready: Optional[asyncio.Future] = None, mode: str = "llm"
+    ) -> Dict[str, Any]:
         """
         Analyze product information and generate marketing insights.
         Note: Image analysis for category is done separately in main.py
+
+        When streaming, `ready` is resolved with primary_cta and the keywords
+        received so far as soon as the CTA and first keyword have arrived,
+        which is all ad rendering needs. mode "fast" writes the copy locally;
+        callers resolve it from the request, defaulting to COPY_MODE. When the
+        provider fails, the local copy is returned and the copy_analysis
+        stage is marked degraded.
         """
+        if mode == "fast":
+            return self.local_copy(product_info)
         try:
             product_text = f"""
 Product Title: {product_info.get('title', 'N/A')}
@@ -192,59 +281,301 @@ Analyze this product and provide:
 3. A primary call-to-action keyword (single word or short phrase like "SHOP NOW", "BUY NOW", "GET IT")
 4. Target audience insights
 
-Format as JSON with keys: keywords (array), captions (array), primary_cta, target_audience.
+Format as JSON with keys in this order: primary_cta, keywords (array), captions (array), target_audience.
 Focus on high-converting, bold keywords that work well in ad creatives. Keywords should be UPPERCASE and attention-grabbing.
 """
             
-            loop = asyncio.get_event_loop()
+            await self.providers.aget(self.provider)
+            
+            result_text = None
+            if self.streaming:
+                result_text = await self._stream_product_analysis(product_text, ready)
+            
+            if result_text is None:
+                result_text = await self._complete_text("analyze_product", product_text, max_tokens=400)
+            if result_text is None:
+                # No provider configured to write the copy
+                mark_degraded("copy_analysis", reason="fallback")
+                return self._default_product_analysis(product_info)
             
-            if self.provider == "openai" and hasattr(self, 'openai_client'):
+            return self._parse_llm_response(result_text)
+        
+        except Exception as e:
+            logger.error("Error in LLM product analysis: %s", e)
+            mark_degraded("copy_analysis", reason="error")
+            return self._default_product_analysis(product_info)
+    
+    async def _complete_text(self, operation: str, prompt: str, max_tokens: int) -> Optional[str]:
+        """Run a text-only completion on the primary provider; None if it isn't configured"""
+        loop = asyncio.get_event_loop()
+        timeout = self._call_timeout("copy_analysis")
+        if self.provider == "openai" and self.openai_client:
+            with track_provider_call("openai", operation):
                 response = await loop.run_in_executor(
                     None,
                     lambda: self.openai_client.chat.completions.create(
                         model="gpt-4",
-                        messages=[{"role": "user", "content": product_text}],
-                        max_tokens=400
+                        messages=[{"role": "user", "content": prompt}],
+                        max_tokens=max_tokens,
+                        timeout=timeout
                     )
                 )
-                result_text = response.choices[0].message.content
-            elif self.provider == "anthropic" and hasattr(self, 'anthropic_client'):
+            return response.choices[0].message.content
+        elif self.provider == "anthropic" and self.anthropic_client:
+            with track_provider_call("anthropic", operation):
                 message = await loop.run_in_executor(
                     None,
                     lambda: self.anthropic_client.messages.create(
                         model="claude-3-opus-20240229",
-                        max_tokens=400,
-                        messages=[{"role": "user", "content": product_text}]
+                        max_tokens=max_tokens,
+                        messages=[{"role": "user", "content": prompt}],
+                        timeout=timeout
                     )
                 )
-                result_text = message.content[0].text
-            elif self.provider == "google" and hasattr(self, 'google_model'):
+            return message.content[0].text
+        elif self.provider == "google" and self.google_model:
+            with track_provider_call("google", operation):
                 response = await loop.run_in_executor(
                     None,
-                    lambda: self.google_model.generate_content(product_text)
+                    lambda: self.google_model.generate_content(prompt, request_options={"timeout": timeout})
+                )
+            return response.text
+        return None
+    
+    async def _stream_product_analysis(self, product_text: str, ready: Optional[asyncio.Future]) -> Optional[str]:
+        """Stream the product analysis, resolving `ready` early; None if streaming isn't possible"""
+        started = time.perf_counter()
+        parser = IncrementalJSONParser()
+        chunks = []
+        try:
+            async for chunk in self._stream_text("analyze_product", product_text, max_tokens=400):
+                chunks.append(chunk)
+                parser.feed(chunk)
+                if ready is not None and not ready.done():
+                    keywords = parser.get("keywords")
+                    if "primary_cta" in parser.fields and keywords:
+                        record_stage("copy_first_fields", time.perf_counter() - started)
+                        ready.set_result({"primary_cta": parser.fields["primary_cta"], "keywords": list(keywords)})
+        except Exception as e:
+            if chunks:
+                # Keep what arrived; the parser salvages completed fields
+                logger.warning("Streaming %s response broke off after %d chunks: %s", self.provider, len(chunks), e)
+            else:
+                # Nothing received yet: let the caller retry without streaming
+                logger.warning("Streaming %s request failed, retrying without streaming: %s", self.provider, e)
+                return None
+        return "".join(chunks) if chunks else None
+    
+    async def _stream_text(self, operation: str, prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        """Yield text deltas of a streamed completion from the primary provider"""
+        timeout = self._call_timeout("copy_analysis")
+        if self.provider == "openai" and self.openai_client:
+            def open_stream():
+                return self.openai_client.chat.completions.create(
+                    model="gpt-4",
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=max_tokens,
+                    stream=True,
+                    timeout=timeout
                 )
+            
+            def extract(chunk):
+                return chunk.choices[0].delta.content if chunk.choices else None
+        elif self.provider == "anthropic" and self.anthropic_client:
+            def open_stream():
+                return self.anthropic_client.messages.create(
+                    model="claude-3-opus-20240229",
+                    max_tokens=max_tokens,
+                    messages=[{"role": "user", "content": prompt}],
+                    stream=True,
+                    timeout=timeout
+                )
+            
+            def extract(event):
+                if getattr(event, "type", None) == "content_block_delta":
+                    return getattr(event.delta, "text", None)
+                return None
+        elif self.provider == "google" and self.google_model:
+            def open_stream():
+                return self.google_model.generate_content(prompt, stream=True, request_options={"timeout": timeout})
+            
+            def extract(chunk):
+                return chunk.text
+        else:
+            return
+        
+        with track_provider_call(self.provider, operation):
+            async for text in self._iterate_in_thread(open_stream, extract):
+                yield text
+    
+    async def _iterate_in_thread(self, open_stream, extract) -> AsyncIterator[str]:
+        """Drive a blocking SDK stream in the executor, handing text back to the event loop"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        finished = object()
+        # Set when the consumer stops early, so the thread quits reading and
+        # frees its executor slot instead of draining the whole response
+        stop = threading.Event()
+        
+        def pump():
+            stream = None
+            try:
+                stream = open_stream()
+                for item in stream:
+                    if stop.is_set():
+                        break
+                    text = extract(item)
+                    if text:
+                        loop.call_soon_threadsafe(queue.put_nowait, text)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                if stop.is_set() and hasattr(stream, "close"):
+                    try:
+                        stream.close()
+                    except Exception:
+                        pass
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(queue.put_nowait, finished)
+        
+        worker = loop.run_in_executor(None, pump)
+        try:
+            while True:
+                item = await queue.get()
+                if item is finished:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+        # Not awaited on cancellation: a deadline shouldn't wait for the SDK to drain
+        await worker
+    
+    async def analyze_product_with_image(self, product_info: Dict[str, Any], image_data: bytes) -> Optional[Dict[str, Any]]:
+        """
+        Classify the product image and generate ad copy in a single multimodal request.
+        Returns None when the combined call fails, so callers can fall back to
+        analyze_image plus analyze_product.
+        """
+        try:
+            prompt = f"""Product Title: {product_info.get('title', 'N/A')}
+Description: {product_info.get('description', 'N/A')}
+Price: {product_info.get('price', 'N/A')}
+
+Look at the product image and classify it into ONE of these categories based on visual style:
+- "Artist" - Hand-drawn, artistic, creative illustrations
+- "Cartoonist" - Cartoon-style, animated, playful illustrations
+- "Sticker" - Sticker-style, simple, bold graphics
+- "Realistic Image Store" - Photorealistic, professional product photography
+
+Then, using the product details and the image, provide:
+1. A brief description of the image (2-3 sentences)
+2. 10-15 bold, eye-catching marketing keywords (for ad text overlays) - make them SHORT, POWERFUL and UPPERCASE
+3. 3-5 suggested ad captions (short, compelling, high-converting)
+4. A primary call-to-action keyword (single word or short phrase like "SHOP NOW", "BUY NOW", "GET IT")
+5. Target audience insights
+
+Format your response as a single JSON object with keys: category (must be one of the 4 above), category_description, description, keywords (array), captions (array), primary_cta, target_audience."""
+            
+            loop = asyncio.get_event_loop()
+            await self.providers.aget(self.provider)
+            image_data = await loop.run_in_executor(None, self._downscale_image, image_data)
+            timeout = self._call_timeout("classify")
+            
+            if self.provider == "openai" and self.openai_client:
+                image_url = f"data:image/jpeg;base64,{base64.b64encode(image_data).decode('utf-8')}"
+                with track_provider_call("openai", "analyze_combined"):
+                    response = await loop.run_in_executor(
+                        None,
+                        lambda: self.openai_client.chat.completions.create(
+                            model="gpt-4-vision-preview",
+                            messages=[
+                                {
+                                    "role": "user",
+                                    "content": [
+                                        {"type": "text", "text": prompt},
+                                        {"type": "image_url", "image_url": {"url": image_url}}
+                                    ]
+                                }
+                            ],
+                            max_tokens=700,
+                            timeout=timeout
+                        )
+                    )
+                result_text = response.choices[0].message.content
+            elif self.provider == "anthropic" and self.anthropic_client:
+                with track_provider_call("anthropic", "analyze_combined"):
+                    message = await loop.run_in_executor(
+                        None,
+                        lambda: self.anthropic_client.messages.create(
+                            model="claude-3-opus-20240229",
+                            max_tokens=700,
+                            messages=[
+                                {
+                                    "role": "user",
+                                    "content": [
+                                        {
+                                            "type": "image",
+                                            "source": {
+                                                "type": "base64",
+                                                "media_type": "image/jpeg",
+                                                "data": base64.b64encode(image_data).decode('utf-8')
+                                            }
+                                        },
+                                        {"type": "text", "text": prompt}
+                                    ]
+                                }
+                            ],
+                            timeout=timeout
+                        )
+                    )
+                result_text = message.content[0].text
+            elif self.provider == "google" and self.google_vision_model:
+                import PIL.Image
+                import io
+                image = PIL.Image.open(io.BytesIO(image_data))
+                with track_provider_call("google", "analyze_combined"):
+                    response = await loop.run_in_executor(
+                        None,
+                        lambda: self.google_vision_model.generate_content([prompt, image], request_options={"timeout": timeout})
+                    )
                 result_text = response.text
             else:
-                return self._default_product_analysis(product_info)
+                return None
             
-            return self._parse_llm_response(result_text)
+            result = self._parse_llm_response(result_text)
+            if result.get("category") not in CATEGORIES or not isinstance(result.get("keywords"), list):
+                logger.warning("Combined analysis response is missing required fields, falling back")
+                return None
+            return result
         
         except Exception as e:
-            print(f"Error in LLM product analysis: {str(e)}")
-            return self._default_product_analysis(product_info)
+            logger.error("Error in combined LLM analysis: %s", e)
+            return None
+    
+    def _downscale_image(self, image_data: bytes) -> bytes:
+        """Shrink an image to LLM_IMAGE_MAX_SIDE and re-encode it as JPEG to cut upload size and tokens"""
+        from PIL import Image
+        import io
+        
+        img = Image.open(io.BytesIO(image_data))
+        img.draft("RGB", (self.image_max_side, self.image_max_side))
+        if img.mode != "RGB":
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        img.thumbnail((self.image_max_side, self.image_max_side))
+        output = io.BytesIO()
+        img.save(output, format="JPEG", quality=85)
+        return output.getvalue()
     
     def _parse_llm_response(self, text: str) -> Dict[str, Any]:
         """Parse LLM response text into structured format"""
-        import json
-        import re
-        
-        # Try to extract JSON from response
-        json_match = re.search(r'\{[^{}]*\}', text, re.DOTALL)
-        if json_match:
-            try:
-                return json.loads(json_match.group())
-            except:
-                pass
+        # Extract the first JSON object, allowing surrounding prose, code fences and nesting
+        parsed = parse_json_object(text)
+        if parsed:
+            return parsed
         
         # Fallback parsing
         result = {
@@ -257,14 +588,8 @@ Focus on high-converting, bold keywords that work well in ad creatives. Keywords
         return result
     
     def _extract_keywords(self, text: str) -> list:
-        """Extract potential keywords from text"""
-        import re
-        # Simple keyword extraction
-        words = re.findall(r'\b[a-zA-Z]{4,}\b', text.lower())
-        # Remove common words
-        stop_words = {'this', 'that', 'with', 'from', 'have', 'will', 'would', 'could', 'should'}
-        keywords = [w for w in set(words) if w not in stop_words][:10]
-        return keywords[:10]
+        """Extract potential keywords from text, most distinctive first"""
+        return copy_engine.rank_keywords({"description": text}, limit=10)
     
     def _default_image_analysis(self) -> Dict[str, Any]:
         """Default analysis when LLM fails"""
@@ -275,17 +600,11 @@ Focus on high-converting, bold keywords that work well in ad creatives. Keywords
             "keywords": ["premium", "quality", "professional", "modern", "creative"]
         }
     
+    def local_copy(self, product_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Ad copy written locally from the scraped fields: deterministic and in well under 5 ms"""
+        return copy_engine.analyze(product_info)
+    
     def _default_product_analysis(self, product_info: Dict[str, Any]) -> Dict[str, Any]:
         """Default analysis when LLM fails"""
-        title = product_info.get('title', 'Product')
-        return {
-            "keywords": ["PREMIUM", "QUALITY", "EXCLUSIVE", "LIMITED", "NOW"] + title.upper().split()[:5],
-            "captions": [
-                f"Discover {title}",
-                f"Premium {title}",
-                f"Get {title} Now"
-            ],
-            "primary_cta": "Shop Now",
-            "target_audience": "General consumers"
-        }
+        return self.local_copy(product_info)
 
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from io import BytesIO
+from typing import Deque, Optional, Tuple
+
+from PIL import Image
+
+from services.metrics import Counter, Gauge, Histogram, registry
+
+decoded_bytes_in_use = registry.register(Gauge(
+    "adgen_decoded_pixel_bytes",
+    "Decoded pixel bytes currently reserved by renders (bounded-memory mode).",
+))
+pixel_budget_waits = registry.register(Counter(
+    "adgen_pixel_budget_waits_total",
+    "Renders that had to wait for decoded-pixel budget, by kind.",
+    ("kind",),
+))
+pixel_budget_wait_seconds = registry.register(Histogram(
+    "adgen_pixel_budget_wait_seconds",
+    "Time renders waited for decoded-pixel budget.",
+    ("kind",),
+))
+
+
+def image_dimensions(image_data: Optional[bytes], draft_size: Optional[Tuple[int, int]] = None) -> Tuple[int, int, int]:
+    """
+    (width, height, bands) the image will decode to, read from its header
+    without decoding. With draft_size, JPEGs report the reduced scale PIL's
+    draft mode would decode at.
+    """
+    if not image_data:
+        return 0, 0, 0
+    try:
+        img = Image.open(BytesIO(image_data))
+        if draft_size is not None:
+            img.draft("RGB", draft_size)
+        return img.width, img.height, len(img.getbands())
+    except Exception:
+        return 0, 0, 0
+
+
+class PixelBudget:
+    """
+    Worker-wide cap on decoded pixel memory held by concurrent renders.
+
+    Each render reserves an estimate of the bytes its decoded images,
+    canvases and frames will need, and waits (FIFO, so large renders are not
+    starved) while the total would exceed the cap. A reservation larger than
+    the whole cap is clamped to it, so an oversized render runs alone rather
+    than never. Disabled unless MEMORY_BOUNDED is set.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.capacity = 0
+        self.in_use = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    def configure(self):
+        self.enabled = os.getenv("MEMORY_BOUNDED", "false").lower() == "true"
+        self.capacity = int(os.getenv("MEMORY_MAX_DECODED_BYTES", str(512 * 1024 * 1024)))
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int, kind: str = "render"):
+        if not self.enabled or nbytes <= 0:
+            yield
+            return
+        nbytes = min(nbytes, self.capacity)
+        await self._acquire(nbytes, kind)
+        try:
+            yield
+        finally:
+            self._release(nbytes)
+
+    async def _acquire(self, nbytes: int, kind: str):
+        if not self._waiters and self.in_use + nbytes <= self.capacity:
+            self.in_use += nbytes
+            decoded_bytes_in_use.set(self.in_use)
+            return
+        pixel_budget_waits.inc(kind=kind)
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (nbytes, waiter)
+        self._waiters.append(entry)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release(nbytes)
+            else:
+                self._waiters.remove(entry)
+                self._wake()
+            raise
+        pixel_budget_wait_seconds.observe(time.monotonic() - started, kind=kind)
+
+    def _release(self, nbytes: int):
+        self.in_use -= nbytes
+        self._wake()
+        decoded_bytes_in_use.set(self.in_use)
+
+    def _wake(self):
+        while self._waiters and self.in_use + self._waiters[0][0] <= self.capacity:
+            nbytes, waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_use += nbytes
+            waiter.set_result(None)
+
+
+pixel_budget = PixelBudget()
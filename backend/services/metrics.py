@@ -0,0 +1,398 @@
+import os
+import time
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, List, Optional, Tuple
+
+# Latency buckets in seconds, covering fast parsing up to slow provider calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Memory buckets in bytes, from small parses up to multi-hundred-MB renders
+MEMORY_BUCKETS = tuple(float(2 ** n) for n in range(20, 31))
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names"""
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """Value that can go up and down, with a fixed set of label names"""
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition format"""
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            counts = self._series.get(key)
+            if counts is None:
+                counts = self._series[key] = [0] * len(self.buckets)
+                self._sums[key] = 0.0
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._sums[key] += value
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key in sorted(self._series):
+                cumulative = 0
+                for bound, count in zip(self.buckets, self._series[key]):
+                    cumulative += count
+                    le = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {self._sums[key]}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[object] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.register(Histogram(
+    "adgen_http_request_duration_seconds",
+    "End-to-end HTTP request latency.",
+    ("method", "path", "status"),
+))
+stage_duration = registry.register(Histogram(
+    "adgen_stage_duration_seconds",
+    "Latency of individual pipeline stages.",
+    ("stage",),
+))
+provider_request_duration = registry.register(Histogram(
+    "adgen_provider_request_duration_seconds",
+    "Latency of calls to external providers.",
+    ("provider", "operation"),
+))
+provider_requests = registry.register(Counter(
+    "adgen_provider_requests_total",
+    "Calls to external providers by outcome.",
+    ("provider", "operation", "outcome"),
+))
+request_peak_memory = registry.register(Histogram(
+    "adgen_request_peak_memory_bytes",
+    "Peak traced Python memory growth during a request (MEMORY_PROFILING only).",
+    ("path",),
+    buckets=MEMORY_BUCKETS,
+))
+stage_peak_memory = registry.register(Histogram(
+    "adgen_stage_peak_memory_bytes",
+    "Peak traced Python memory growth during a stage (MEMORY_PROFILING only).",
+    ("stage",),
+    buckets=MEMORY_BUCKETS,
+))
+
+
+class _Interval:
+    __slots__ = ("start", "peak")
+
+    def __init__(self, start: int):
+        self.start = start
+        self.peak = start
+
+
+class MemoryProfiler:
+    """
+    Opt-in tracemalloc accounting of peak memory per stage and per request.
+
+    tracemalloc keeps one process-wide peak, so overlapping intervals share
+    it: whenever any interval begins or ends, the peak since the last reset
+    is credited to every open interval and reset. Each interval therefore
+    sees the true process peak during its lifetime; with concurrent requests
+    that includes their allocations too, so figures are exact when requests
+    run one at a time and an upper bound otherwise. Allocations in worker
+    processes are not traced.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._open: set = set()
+
+    def configure(self):
+        """Start tracing if MEMORY_PROFILING is set; tracing slows allocation noticeably"""
+        if os.getenv("MEMORY_PROFILING", "false").lower() == "true" and not self.enabled:
+            tracemalloc.start(int(os.getenv("MEMORY_PROFILING_FRAMES", "1")))
+            self.enabled = True
+
+    def _credit_peak(self):
+        _, peak = tracemalloc.get_traced_memory()
+        for interval in self._open:
+            interval.peak = max(interval.peak, peak)
+        tracemalloc.reset_peak()
+
+    def begin(self) -> _Interval:
+        with self._lock:
+            self._credit_peak()
+            interval = _Interval(tracemalloc.get_traced_memory()[0])
+            self._open.add(interval)
+            return interval
+
+    def end(self, interval: _Interval) -> int:
+        """Peak bytes above the interval's starting point"""
+        with self._lock:
+            self._credit_peak()
+            self._open.discard(interval)
+            return max(0, interval.peak - interval.start)
+
+
+memory_profiler = MemoryProfiler()
+
+
+def _format_megabytes(value: int) -> str:
+    return f"{value / (1024 * 1024):.1f}MB"
+
+
+class RequestTimings:
+    """Stage durations collected for one request, rendered as a Server-Timing header"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._stages: Dict[str, List[float]] = {}
+        # Peak memory per stage and for the whole request, when profiling
+        self.memory: Dict[str, int] = {}
+        self.request_memory: Optional[int] = None
+        self._memory_interval = memory_profiler.begin() if memory_profiler.enabled else None
+
+    def add(self, name: str, seconds: float):
+        entry = self._stages.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    def add_memory(self, name: str, peak: int):
+        self.memory[name] = max(self.memory.get(name, 0), peak)
+
+    def finish_memory(self) -> Optional[int]:
+        """Close the request-wide memory interval and return its peak"""
+        if self._memory_interval is not None:
+            self.request_memory = memory_profiler.end(self._memory_interval)
+            self._memory_interval = None
+        return self.request_memory
+
+    def stages(self) -> Dict[str, float]:
+        return {name: total for name, (total, _) in self._stages.items()}
+
+    def server_timing_header(self, include_total: bool = True) -> str:
+        parts = []
+        for name, (total, count) in self._stages.items():
+            part = f"{name};dur={total * 1000:.1f}"
+            notes = []
+            if count > 1:
+                notes.append(f"{count} calls")
+            if name in self.memory:
+                notes.append(f"peak {_format_megabytes(self.memory[name])}")
+            if notes:
+                part += f';desc="{", ".join(notes)}"'
+            parts.append(part)
+        if include_total:
+            part = f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}"
+            if self.request_memory is not None:
+                part += f';desc="peak {_format_megabytes(self.request_memory)}"'
+            parts.append(part)
+        return ", ".join(parts)
+
+
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def start_request_timing() -> RequestTimings:
+    """Begin collecting stage timings for the current request context"""
+    timings = RequestTimings()
+    _current_timings.set(timings)
+    return timings
+
+
+def current_request_timings() -> Optional[RequestTimings]:
+    return _current_timings.get()
+
+
+def record_stage(stage: str, seconds: float):
+    stage_duration.observe(seconds, stage=stage)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+def record_stage_memory(stage: str, peak: int):
+    stage_peak_memory.observe(peak, stage=stage)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add_memory(stage, peak)
+
+
+@contextmanager
+def timed_stage(stage: str):
+    """Time a pipeline stage into the stage histogram and the request's Server-Timing"""
+    interval = memory_profiler.begin() if memory_profiler.enabled else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+        if interval is not None:
+            record_stage_memory(stage, memory_profiler.end(interval))
+
+
+class ProviderHealth:
+    """
+    Rolling view of each provider's most recent calls, for readiness checks.
+
+    Keeps the last `window` outcomes per provider. A provider whose last
+    `failure_threshold` calls all failed is reported as failing, one with
+    errors in its window as degraded.
+    """
+
+    def __init__(self, window: int = 50, failure_threshold: int = 5):
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self._calls: Dict[str, Deque[Tuple[float, bool, float]]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, seconds: float, ok: bool):
+        with self._lock:
+            calls = self._calls.setdefault(provider, deque(maxlen=self.window))
+            calls.append((seconds, ok, time.time()))
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            recent = {provider: list(calls) for provider, calls in self._calls.items()}
+        report = {}
+        for provider, calls in recent.items():
+            latencies = sorted(seconds for seconds, _, _ in calls)
+            errors = sum(1 for _, ok, _ in calls if not ok)
+            consecutive = 0
+            for _, ok, _ in reversed(calls):
+                if ok:
+                    break
+                consecutive += 1
+            if consecutive >= self.failure_threshold:
+                state = "failing"
+            elif errors:
+                state = "degraded"
+            else:
+                state = "ok"
+            report[provider] = {
+                "state": state,
+                "calls": len(calls),
+                "error_rate": round(errors / len(calls), 3),
+                "consecutive_errors": consecutive,
+                "latency_p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+                "latency_p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1),
+                "last_call_age_seconds": round(time.time() - calls[-1][2], 1),
+            }
+        return report
+
+
+provider_health = ProviderHealth()
+
+
+@contextmanager
+def track_provider_call(provider: str, operation: str):
+    """Time an external provider call and count it as ok or error"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        provider_request_duration.observe(elapsed, provider=provider, operation=operation)
+        provider_requests.inc(provider=provider, operation=operation, outcome=outcome)
+        provider_health.record(provider, elapsed, outcome == "ok")
+
+
+def render_prometheus() -> str:
+    return registry.render()
@@ -1,14 +1,74 @@
+import asyncio
+import multiprocessing
 import os
-from typing import Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional
 import base64
-from io import BytesIO
-from PIL import Image
+
+import numpy as np
+
+from services import motion_engine
+from services.logging_config import get_logger
+from services.memory_budget import image_dimensions, pixel_budget
+from services.metrics import timed_stage, track_provider_call
+from services.prediction_jobs import prediction_runner
+from services.render_cache import RenderCache, digest_bytes, render_key
+
+logger = get_logger(__name__)
+
+# Bump whenever a change to the local effect alters its output
+EFFECT_VERSION = "2"
+
+MIME_TYPES = {"webp": "image/webp", "gif": "image/gif", "png": "image/png"}
 
 
 class MotionService:
     def __init__(self):
         self.api_key = os.getenv("MOTION_EFFECT_API_KEY")
         self.provider = os.getenv("MOTION_EFFECT_PROVIDER", "stability").lower()
+        self.render_cache = RenderCache("motion")
+        # Local animation settings
+        self.effect = os.getenv("MOTION_EFFECT", "auto").lower()
+        self.frame_count = max(2, int(os.getenv("MOTION_FRAME_COUNT", "24")))
+        self.fps = float(os.getenv("MOTION_FPS", "12"))
+        self.frame_size = int(os.getenv("MOTION_FRAME_SIZE", "512"))
+        self.output_format = os.getenv("MOTION_FORMAT", "webp").lower()
+        if self.output_format not in ("webp", "gif"):
+            logger.warning("Unknown MOTION_FORMAT %r, using webp", self.output_format)
+            self.output_format = "webp"
+        self.workers = int(os.getenv("MOTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self._pool: Optional[ProcessPoolExecutor] = None
+    
+    def _effect_for(self, analysis: Optional[Dict[str, Any]]) -> str:
+        if self.effect in motion_engine.EFFECTS:
+            return self.effect
+        category = (analysis or {}).get("category")
+        return motion_engine.CATEGORY_EFFECTS.get(category, "ken_burns")
+    
+    def _frame_pool(self) -> Optional[ProcessPoolExecutor]:
+        """Worker processes for frame rendering, started on first use; None renders in a thread"""
+        if self.workers <= 1:
+            return None
+        if self._pool is None:
+            # spawn rather than fork: the server process has live threads (logging, event loop)
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+    
+    async def warm_up(self):
+        """Spawn the frame workers and encode a tiny animation so no request pays process startup or codec init"""
+        loop = asyncio.get_running_loop()
+        base = np.full((20, 20, 3), 128, dtype=np.uint8)
+        pool = self._frame_pool()
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(pool, motion_engine.render_frames, base, "ken_burns", (16, 16), 2)
+            for _ in range(max(1, self.workers))
+        ))
+        await loop.run_in_executor(None, motion_engine.encode_animation, parts[0], self.output_format, self.fps)
+    
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
     
     async def generate_motion_effect(
         self,
@@ -27,7 +87,7 @@ class MotionService:
                 result = await self._generate_with_replicate(image_data, analysis)
             else:
                 # Fallback: return original with effect applied
-                result = self._apply_simple_effect(image_data)
+                result = await self._apply_simple_effect(image_data, analysis)
             
             return {
                 "url": result.get("url"),
@@ -35,7 +95,7 @@ class MotionService:
             }
         
         except Exception as e:
-            print(f"Error generating motion effect: {str(e)}")
+            logger.error("Error generating motion effect: %s", e)
             # Return original image as fallback
             return {
                 "url": self._image_to_data_url(image_data),
@@ -46,124 +106,130 @@ class MotionService:
         """Generate motion effect using Stability AI"""
         try:
             if not self.api_key:
-                return self._apply_simple_effect(image_data)
+                return await self._apply_simple_effect(image_data, analysis)
             
             # Stability AI image-to-image or animation API
             # Note: This is a placeholder - actual implementation depends on Stability AI's API
             image_base64 = base64.b64encode(image_data).decode('utf-8')
             
             # For now, apply a simple effect
-            return self._apply_simple_effect(image_data)
+            return await self._apply_simple_effect(image_data, analysis)
         
         except Exception as e:
-            print(f"Stability motion error: {str(e)}")
-            return self._apply_simple_effect(image_data)
+            logger.error("Stability motion error: %s", e)
+            return await self._apply_simple_effect(image_data, analysis)
     
     async def _generate_with_runway(self, image_data: bytes, analysis: Dict[str, Any]) -> Dict[str, Any]:
         """Generate motion effect using Runway ML"""
         try:
             if not self.api_key:
-                return self._apply_simple_effect(image_data)
+                return await self._apply_simple_effect(image_data, analysis)
             
             # Runway ML API implementation
             # Placeholder for actual API integration
-            return self._apply_simple_effect(image_data)
+            return await self._apply_simple_effect(image_data, analysis)
         
         except Exception as e:
-            print(f"Runway ML error: {str(e)}")
-            return self._apply_simple_effect(image_data)
+            logger.error("Runway ML error: %s", e)
+            return await self._apply_simple_effect(image_data, analysis)
     
     async def _generate_with_replicate(self, image_data: bytes, analysis: Dict[str, Any]) -> Dict[str, Any]:
         """Generate motion effect using Replicate"""
         try:
-            import replicate
-            import asyncio
-            
             # Upload image first
             image_url = self._image_to_data_url(image_data)
             
-            loop = asyncio.get_event_loop()
-            output = await loop.run_in_executor(
-                None,
-                lambda: replicate.run(
+            # Video generations take minutes; the job is polled, not waited on in a thread
+            with track_provider_call("replicate", "motion"):
+                output = await prediction_runner.run(
+                    "replicate",
                     "anotherjesse/zeroscope-v2-xl:9f6f602cd9b8d11b689c67c87b44b18fc4c40b9e",
-                    input={
+                    {
                         "image": image_url,
                         "prompt": f"Motion effect for {analysis.get('category', 'image')}"
-                    }
+                    },
+                    operation="motion",
                 )
-            )
+            if isinstance(output, str):
+                output = [output]
             
             return {"url": output[0] if output else self._image_to_data_url(image_data)}
         
         except Exception as e:
-            print(f"Replicate error: {str(e)}")
-            return self._apply_simple_effect(image_data)
+            logger.error("Replicate error: %s", e)
+            return await self._apply_simple_effect(image_data, analysis)
+    
+    def _effect_key(self, image_digest: str, effect: str) -> str:
+        return render_key(
+            "motion_effect", EFFECT_VERSION, image=image_digest, effect=effect, format=self.output_format,
+            frames=self.frame_count, fps=self.fps, size=self.frame_size,
+        )
     
-    def _apply_simple_effect(self, image_data: bytes) -> Dict[str, Any]:
-        """Apply visual effects to simulate motion/animation"""
+    async def _apply_simple_effect(self, image_data: bytes, analysis: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Animate the image locally, reusing earlier output for the same image and settings"""
+        effect = self._effect_for(analysis)
+        cache_key = self._effect_key(digest_bytes(image_data), effect)
+        rendered = await self.render_cache.aget(cache_key)
+        if rendered is None:
+            rendered = await self._render_animation(image_data, effect)
+            if rendered is None:
+                return {"url": self._image_to_data_url(image_data)}
+            await self.render_cache.aput(cache_key, rendered)
+        return {"url": self._image_to_data_url(rendered, MIME_TYPES[self.output_format])}
+    
+    async def cached_effect(self, image_digest: str, analysis: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Locally rendered effect for an earlier image, if it is still in the render cache"""
+        rendered = await self.render_cache.aget(self._effect_key(image_digest, self._effect_for(analysis)))
+        if rendered is None:
+            return None
+        url = self._image_to_data_url(rendered, MIME_TYPES[self.output_format])
+        return {"url": url, "download_url": url}
+    
+    async def _render_animation(self, image_data: bytes, effect: str) -> Optional[bytes]:
+        """
+        Render the effect as an animated WebP/GIF, or None if the image can't
+        be processed. Frame ranges are spread across the worker processes;
+        decoding and encoding happen once, in a thread.
+        """
+        loop = asyncio.get_running_loop()
         try:
-            from PIL import Image, ImageEnhance, ImageFilter, ImageDraw
-            import numpy as np
-            
-            img = Image.open(BytesIO(image_data))
-            original_format = img.format or 'PNG'
-            
-            # Convert to RGB if needed
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Apply motion-like effects
-            # 1. Enhance brightness and contrast for dynamic look
-            enhancer = ImageEnhance.Brightness(img)
-            img = enhancer.enhance(1.15)
-            
-            enhancer = ImageEnhance.Contrast(img)
-            img = enhancer.enhance(1.1)
-            
-            enhancer = ImageEnhance.Saturation(img)
-            img = enhancer.enhance(1.2)
-            
-            # 2. Apply subtle motion blur effect
-            img = img.filter(ImageFilter.GaussianBlur(radius=0.5))
-            
-            # 3. Add slight sharpening to maintain clarity
-            img = img.filter(ImageFilter.SHARPEN)
-            
-            # 4. Add a subtle glow effect (simulate motion trails)
-            glow = img.copy()
-            glow = glow.filter(ImageFilter.GaussianBlur(radius=2))
-            glow = Image.blend(img, glow, 0.3)
-            
-            # Blend the glow with original
-            final_img = Image.blend(img, glow, 0.7)
-            
-            # Convert back to bytes
-            output = BytesIO()
-            final_img.save(output, format='PNG', quality=95)
-            output.seek(0)
-            
-            return {"url": self._image_to_data_url(output.read())}
+            chunks = max(1, min(self.workers, self.frame_count))
+            source_w, source_h, bands = image_dimensions(image_data, (self.frame_size * 2, self.frame_size * 2))
+            estimate = source_w * source_h * bands + motion_engine.working_set_bytes(
+                source_w, source_h, self.frame_size, self.frame_count, chunks
+            )
+            async with pixel_budget.reserve(estimate, kind="motion"):
+                with timed_stage("motion_decode"):
+                    base = await loop.run_in_executor(None, motion_engine.prepare_base, image_data, self.frame_size)
+                height, width = base.shape[:2]
+                out_size = motion_engine.output_size(
+                    round(width / motion_engine.OVERSAMPLE), round(height / motion_engine.OVERSAMPLE), self.frame_size
+                )
+                
+                with timed_stage("motion_frames"):
+                    pool = self._frame_pool()
+                    bounds = np.linspace(0, self.frame_count, chunks + 1).astype(int)
+                    parts = await asyncio.gather(*(
+                        loop.run_in_executor(
+                            pool, motion_engine.render_frames, base, effect, out_size, self.frame_count, int(start), int(stop)
+                        )
+                        for start, stop in zip(bounds[:-1], bounds[1:])
+                    ))
+                    del base
+                    frames = np.concatenate(parts)
+                    del parts
+                
+                with timed_stage("encode"):
+                    return await loop.run_in_executor(
+                        None, motion_engine.encode_animation, frames, self.output_format, self.fps
+                    )
         
         except Exception as e:
-            print(f"Motion effect error: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            # Return original image with basic enhancement as fallback
-            try:
-                from PIL import Image, ImageEnhance
-                img = Image.open(BytesIO(image_data))
-                enhancer = ImageEnhance.Brightness(img)
-                img = enhancer.enhance(1.1)
-                output = BytesIO()
-                img.save(output, format='PNG')
-                output.seek(0)
-                return {"url": self._image_to_data_url(output.read())}
-            except:
-                return {"url": self._image_to_data_url(image_data)}
+            logger.exception("Motion effect error: %s", e)
+            return None
     
-    def _image_to_data_url(self, image_data: bytes) -> str:
+    def _image_to_data_url(self, image_data: bytes, mime_type: str = "image/png") -> str:
         """Convert image bytes to data URL"""
         image_base64 = base64.b64encode(image_data).decode('utf-8')
-        return f"data:image/png;base64,{image_base64}"
+        return f"data:{mime_type};base64,{image_base64}"
 
@@ -0,0 +1,410 @@
+"""
+Asynchronous runner for long-running provider generations.
+
+Image and video generations take from seconds to minutes. Rather than
+holding an executor thread inside a blocking SDK call for all of that time,
+a job is submitted over HTTP and then polled from the event loop with
+backoff, so the number of generations in flight is bounded only by the
+providers. Job state is persisted, so predictions submitted before a
+restart are picked up again afterwards, and jobs can be cancelled, which
+cancels the remote prediction too.
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from services.http_client import http_client
+from services.logging_config import get_logger
+from services.metrics import Counter, Gauge, Histogram, registry
+from services.provider_registry import configured_api_key
+from services.scrape_scheduler import parse_retry_after
+from services.storage import cache_path
+
+logger = get_logger(__name__)
+
+prediction_jobs_active = registry.register(Gauge(
+    "adgen_prediction_jobs_active",
+    "Provider generation jobs currently submitted or polling, by backend.",
+    ("backend",),
+))
+prediction_jobs_finished = registry.register(Counter(
+    "adgen_prediction_jobs_total",
+    "Provider generation jobs finished, by backend and final status.",
+    ("backend", "status"),
+))
+prediction_job_duration = registry.register(Histogram(
+    "adgen_prediction_job_seconds",
+    "Wall time from submission to a final status, by backend.",
+    ("backend",),
+    buckets=(1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0),
+))
+
+TERMINAL_STATUSES = ("succeeded", "failed", "canceled")
+
+# Poll responses worth retrying rather than failing the job
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+
+class PredictionError(Exception):
+    """A generation job failed, was cancelled or ran out of time"""
+
+
+class _RetryablePoll(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PredictionJob:
+    def __init__(self, backend: str, model: str, operation: str, job_id: Optional[str] = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.backend = backend
+        self.model = model
+        self.operation = operation
+        self.remote_id: Optional[str] = None
+        self.status = "pending"
+        self.output: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.polls = 0
+        self.cancel_requested = False
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "backend": self.backend,
+            "model": self.model,
+            "operation": self.operation,
+            "remote_id": self.remote_id,
+            "status": self.status,
+            "output": self.output,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "polls": self.polls,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PredictionJob":
+        job = cls(data["backend"], data.get("model", ""), data.get("operation", ""), job_id=data["id"])
+        job.remote_id = data.get("remote_id")
+        job.status = data.get("status", "pending")
+        job.output = data.get("output")
+        job.error = data.get("error")
+        job.created_at = data.get("created_at", job.created_at)
+        job.updated_at = data.get("updated_at", job.created_at)
+        job.polls = data.get("polls", 0)
+        return job
+
+
+async def _json_or_raise(response: aiohttp.ClientResponse, action: str) -> Dict[str, Any]:
+    if response.status in RETRYABLE_STATUSES:
+        raise _RetryablePoll(f"{action}: HTTP {response.status}", parse_retry_after(response.headers.get("Retry-After")))
+    if response.status >= 400:
+        raise PredictionError(f"{action}: HTTP {response.status} {(await response.text())[:200]}")
+    return await response.json()
+
+
+class ReplicateBackend:
+    """Replicate's predictions API: create, then poll until a final status"""
+
+    name = "replicate"
+    resumable = True
+
+    @property
+    def api_base(self) -> str:
+        return os.getenv("REPLICATE_API_BASE", "https://api.replicate.com").rstrip("/")
+
+    def _headers(self) -> Dict[str, str]:
+        token = os.getenv("REPLICATE_API_TOKEN")
+        if not token:
+            raise PredictionError("REPLICATE_API_TOKEN is not set")
+        return {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+    async def submit(self, job: PredictionJob, payload: Dict[str, Any]):
+        # "owner/name:version" pins a version; "owner/name" runs the model's latest
+        if ":" in job.model:
+            url, body = f"{self.api_base}/v1/predictions", {"version": job.model.split(":", 1)[1], "input": payload}
+        else:
+            url, body = f"{self.api_base}/v1/models/{job.model}/predictions", {"input": payload}
+        async with http_client.session.post(url, headers=self._headers(), json=body) as response:
+            result = await _json_or_raise(response, "create prediction")
+        job.remote_id = result["id"]
+        self._apply(job, result)
+
+    async def poll(self, job: PredictionJob):
+        url = f"{self.api_base}/v1/predictions/{job.remote_id}"
+        async with http_client.session.get(url, headers=self._headers()) as response:
+            self._apply(job, await _json_or_raise(response, "poll prediction"))
+
+    async def cancel(self, job: PredictionJob):
+        url = f"{self.api_base}/v1/predictions/{job.remote_id}/cancel"
+        async with http_client.session.post(url, headers=self._headers()) as response:
+            if response.status >= 400:
+                logger.warning("Could not cancel Replicate prediction %s: HTTP %d", job.remote_id, response.status)
+
+    @staticmethod
+    def _apply(job: PredictionJob, result: Dict[str, Any]):
+        status = result.get("status", "starting")
+        job.status = status if status in TERMINAL_STATUSES else "running"
+        job.output = result.get("output")
+        if result.get("error"):
+            job.error = str(result["error"])
+
+
+class OpenAIImagesBackend:
+    """
+    OpenAI image generation. The API answers in a single (slow) request with
+    no job to poll, so it is awaited directly on the event loop and cannot be
+    resumed after a restart.
+    """
+
+    name = "openai_images"
+    resumable = False
+
+    @property
+    def api_base(self) -> str:
+        return (os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1").rstrip("/")
+
+    async def submit(self, job: PredictionJob, payload: Dict[str, Any]):
+        api_key = configured_api_key("OPENAI_API_KEY", "your_openai_api_key_here")
+        if not api_key:
+            raise PredictionError("OPENAI_API_KEY is not set")
+        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        async with http_client.session.post(
+            f"{self.api_base}/images/generations", headers=headers, json={"model": job.model, **payload},
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=10),
+        ) as response:
+            result = await _json_or_raise(response, "generate image")
+        job.status = "succeeded"
+        # b64_json responses become data URLs, so the output is always a URL
+        job.output = [
+            item.get("url") or (f"data:image/png;base64,{item['b64_json']}" if item.get("b64_json") else None)
+            for item in result.get("data", [])
+        ]
+
+    async def poll(self, job: PredictionJob):
+        raise PredictionError("openai_images jobs complete on submission")
+
+    async def cancel(self, job: PredictionJob):
+        # Nothing to cancel remotely; cancelling the local task aborts the request
+        pass
+
+
+class PredictionRunner:
+    """
+    Submits, polls, persists and cancels provider generation jobs.
+
+    run() submits a job and waits for its output. Polling starts after
+    PREDICTION_POLL_INITIAL seconds and backs off by half again per poll up
+    to PREDICTION_POLL_MAX, with jitter, and honours Retry-After on 429s.
+    Job state (never the inputs, which can hold whole images) is written to
+    PREDICTION_JOBS_PATH on every transition; resume() re-attaches to jobs
+    that were still running remotely when the process stopped. A caller that
+    gives up (cancellation, deadline) cancels the remote prediction so it
+    stops costing quota.
+    """
+
+    def __init__(self):
+        self.backends = {backend.name: backend for backend in (ReplicateBackend(), OpenAIImagesBackend())}
+        self.jobs: Dict[str, PredictionJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._save_lock = threading.Lock()
+        # Snapshots are numbered on the loop; saves finishing out of order skip older ones
+        self._snapshot_seq = 0
+        self._saved_seq = 0
+        self.configure()
+
+    def configure(self):
+        self.path = os.getenv("PREDICTION_JOBS_PATH") or cache_path("prediction_jobs.json")
+        self.poll_initial = float(os.getenv("PREDICTION_POLL_INITIAL", "1"))
+        self.poll_max = float(os.getenv("PREDICTION_POLL_MAX", "10"))
+        self.timeout = float(os.getenv("PREDICTION_TIMEOUT", "900"))
+        self.keep = int(os.getenv("PREDICTION_JOBS_KEEP", "500"))
+
+    async def run(self, backend: str, model: str, payload: Dict[str, Any], operation: str = "generation") -> Any:
+        """Submit a job and return its output; raises PredictionError if it doesn't succeed"""
+        job = self.start(backend, model, payload, operation)
+        try:
+            # Shielded so the caller's cancellation is handled below, not by killing the poller mid-request
+            return await asyncio.shield(self._tasks[job.id])
+        except asyncio.CancelledError:
+            asyncio.ensure_future(self.cancel(job.id))
+            raise
+
+    def start(self, backend: str, model: str, payload: Dict[str, Any], operation: str = "generation") -> PredictionJob:
+        """Create a job and drive it in the background"""
+        if backend not in self.backends:
+            raise PredictionError(f"Unknown prediction backend {backend!r}")
+        job = PredictionJob(backend, model, operation)
+        self.jobs[job.id] = job
+        self._spawn(job, payload)
+        return job
+
+    def _spawn(self, job: PredictionJob, payload: Optional[Dict[str, Any]]):
+        task = asyncio.ensure_future(self._drive(job, payload))
+        self._tasks[job.id] = task
+        prediction_jobs_active.inc(backend=job.backend)
+
+        def finished(done: asyncio.Future):
+            self._tasks.pop(job.id, None)
+            prediction_jobs_active.dec(backend=job.backend)
+            if not done.cancelled():
+                done.exception()  # retrieved so unawaited failures of resumed jobs aren't reported as unhandled
+
+        task.add_done_callback(finished)
+
+    async def _drive(self, job: PredictionJob, payload: Optional[Dict[str, Any]]) -> Any:
+        backend = self.backends[job.backend]
+        deadline = job.created_at + self.timeout
+        try:
+            if job.remote_id is None:
+                await backend.submit(job, payload or {})
+                await self._transition(job)
+            delay = self.poll_initial
+            while not job.done:
+                if time.time() + delay > deadline:
+                    raise PredictionError(f"no result after {self.timeout:g}s")
+                await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+                job.polls += 1
+                previous = job.status
+                try:
+                    await backend.poll(job)
+                except (_RetryablePoll, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.warning("Poll of %s job %s failed, retrying: %s", job.backend, job.id, e)
+                    delay = max(delay, getattr(e, "retry_after", None) or 0.0)
+                if job.status != previous:
+                    await self._transition(job)
+                delay = min(self.poll_max, delay * 1.5)
+        except asyncio.CancelledError:
+            if not job.cancel_requested:
+                # Shutting down: leave the job running remotely for resume()
+                raise
+            job.status = "canceled"
+            await self._transition(job)
+        except Exception as e:
+            if job.remote_id is not None and backend.resumable:
+                await self._cancel_remote(job)
+            job.status = "failed"
+            job.error = str(e) if isinstance(e, PredictionError) else f"{type(e).__name__}: {e}"
+            await self._transition(job)
+
+        if job.status != "succeeded":
+            raise PredictionError(f"{job.backend} job {job.id} {job.status}: {job.error or 'no output'}")
+        return job.output
+
+    async def _transition(self, job: PredictionJob):
+        job.updated_at = time.time()
+        if job.done:
+            prediction_jobs_finished.inc(backend=job.backend, status=job.status)
+            prediction_job_duration.observe(job.updated_at - job.created_at, backend=job.backend)
+            logger.info("%s job %s %s after %d polls", job.backend, job.id, job.status, job.polls)
+        await asyncio.get_running_loop().run_in_executor(None, self.save, self._snapshot())
+
+    async def _cancel_remote(self, job: PredictionJob):
+        try:
+            await self.backends[job.backend].cancel(job)
+        except Exception as e:
+            logger.warning("Could not cancel %s job %s remotely: %s", job.backend, job.id, e)
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a job locally and at the provider; False if it is unknown or already finished"""
+        job = self.jobs.get(job_id)
+        if job is None or job.done:
+            return False
+        job.cancel_requested = True
+        if job.remote_id is not None:
+            await self._cancel_remote(job)
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+            # Let the poller record the cancellation before reporting back
+            await asyncio.wait({task}, timeout=5)
+        else:
+            job.status = "canceled"
+            await self._transition(job)
+        return True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        return job.to_dict() if job is not None else None
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        jobs = sorted(self.jobs.values(), key=lambda job: job.updated_at, reverse=True)
+        return [job.to_dict() for job in jobs[:limit]]
+
+    async def resume(self):
+        """Load persisted jobs and resume polling those still running at the provider"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable prediction job state %s: %s", self.path, e)
+            return
+        resumed = 0
+        for entry in data.get("jobs", []):
+            job = PredictionJob.from_dict(entry)
+            if job.backend not in self.backends or job.id in self.jobs:
+                continue
+            self.jobs[job.id] = job
+            if job.done:
+                continue
+            if job.remote_id is not None and self.backends[job.backend].resumable:
+                self._spawn(job, None)
+                resumed += 1
+            else:
+                # Never reached the provider, or the provider has no job to re-attach to
+                job.status = "failed"
+                job.error = "interrupted by restart"
+                await self._transition(job)
+        if resumed:
+            logger.info("Resumed %d prediction jobs", resumed)
+
+    async def close(self):
+        """Stop polling without cancelling remote jobs, so the next start can resume them"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.save(self._snapshot())
+
+    def _snapshot(self) -> Dict[str, Any]:
+        """Every unfinished job plus the most recent finished ones; older finished jobs are forgotten"""
+        finished = sorted((job for job in self.jobs.values() if job.done), key=lambda job: job.updated_at)
+        for job in finished[:max(0, len(finished) - self.keep)]:
+            del self.jobs[job.id]
+        self._snapshot_seq += 1
+        return {"seq": self._snapshot_seq, "jobs": [job.to_dict() for job in self.jobs.values()]}
+
+    def save(self, payload: Dict[str, Any]):
+        """Atomically write a job state snapshot (taken on the event loop) unless a newer one is on disk"""
+        with self._save_lock:
+            if payload["seq"] <= self._saved_seq:
+                return
+            self._saved_seq = payload["seq"]
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(payload, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning("Could not persist prediction jobs to %s: %s", self.path, e)
+
+
+prediction_runner = PredictionRunner()
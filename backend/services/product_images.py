@@ -0,0 +1,316 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from io import BytesIO
+from typing import Dict, Mapping, Optional
+
+import aiohttp
+from PIL import Image
+
+from services.http_client import http_client
+from services.logging_config import get_logger
+from services.metrics import Counter, Gauge, registry
+from services.render_cache import RenderCache, digest_bytes
+from services.storage import cache_path
+
+logger = get_logger(__name__)
+
+product_image_requests = registry.register(Counter(
+    "adgen_product_image_requests_total",
+    "Product image lookups by result (memory_hit, disk_hit, revalidated, fetched, stale, rejected, error).",
+    ("result",),
+))
+product_image_memory_bytes = registry.register(Gauge(
+    "adgen_product_image_cache_memory_bytes",
+    "Decoded pixel plus original bytes held by the product image memory tier.",
+))
+
+# Freshness assumed for a response without an explicit lifetime or Last-Modified
+HEURISTIC_FRACTION = 0.1
+
+
+def parse_cache_control(header: Optional[str]) -> Dict[str, Optional[str]]:
+    """Directives of a Cache-Control header, lower-cased, with their values (None for flags)"""
+    directives: Dict[str, Optional[str]] = {}
+    for part in (header or "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.strip().lower()] = value.strip().strip('"') or None
+    return directives
+
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness_lifetime(headers: Mapping[str, str], default_ttl: float, now: Optional[float] = None) -> Optional[float]:
+    """
+    Seconds a response may be reused without revalidation, following RFC 9111:
+    s-maxage / max-age, then Expires, then a heuristic of 10% of the time since
+    Last-Modified (capped at default_ttl), then default_ttl. None means the
+    response must not be stored (no-store); 0 means revalidate on every use.
+    """
+    now = time.time() if now is None else now
+    directives = parse_cache_control(headers.get("Cache-Control"))
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0.0
+    for name in ("s-maxage", "max-age"):
+        if directives.get(name) is not None:
+            try:
+                return max(0.0, float(directives[name]))
+            except ValueError:
+                return 0.0
+    date = _http_date(headers.get("Date")) or now
+    if "Expires" in headers:
+        expires = _http_date(headers.get("Expires"))
+        return max(0.0, expires - date) if expires is not None else 0.0
+    last_modified = _http_date(headers.get("Last-Modified"))
+    if last_modified is not None:
+        return min(default_ttl, max(0.0, (date - last_modified) * HEURISTIC_FRACTION))
+    return default_ttl
+
+
+class ProductImageRejected(Exception):
+    """The image exceeds the configured byte or pixel limits"""
+
+
+class ProductImage:
+    """A fetched product image: original bytes, the decoded image and its HTTP validators"""
+
+    def __init__(self, url: str, data: bytes, image: Image.Image, etag: Optional[str] = None,
+                 last_modified: Optional[str] = None, expires_at: float = 0.0):
+        self.url = url
+        self.data = data
+        self.image = image
+        self.digest = digest_bytes(data)
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) + self.image.width * self.image.height * len(self.image.getbands())
+
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    def update_validity(self, headers: Mapping[str, str], lifetime: float):
+        """Apply the headers of a 304 (or fresh 200) to this entry"""
+        self.etag = headers.get("ETag") or self.etag
+        self.last_modified = headers.get("Last-Modified") or self.last_modified
+        self.expires_at = time.time() + lifetime
+
+    def metadata(self) -> dict:
+        return {"url": self.url, "etag": self.etag, "last_modified": self.last_modified, "expires_at": self.expires_at}
+
+
+class ProductImageCache:
+    """
+    Cross-request cache of product images fetched from retailer CDNs.
+
+    The memory tier is an LRU of decoded images (with their original bytes),
+    bounded by decoded size, so a popular product renders with neither a
+    network round trip nor a decode. Behind it a disk tier keeps the original
+    bytes with their validators. Freshness follows the CDN's Cache-Control /
+    Expires headers; stale entries are revalidated with If-None-Match /
+    If-Modified-Since and served stale if the CDN can't be reached.
+    Concurrent fetches of one URL share a single request. Images over
+    PRODUCT_IMAGE_MAX_BYTES or PRODUCT_IMAGE_MAX_PIXELS are rejected before
+    they are decoded.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("PRODUCT_IMAGE_CACHE_ENABLED", "true").lower() == "true"
+        self.memory_limit = int(os.getenv("PRODUCT_IMAGE_CACHE_MEMORY_BYTES", str(256 * 1024 * 1024)))
+        self.default_ttl = float(os.getenv("PRODUCT_IMAGE_DEFAULT_TTL", "3600"))
+        self.max_bytes = int(os.getenv("PRODUCT_IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+        self.max_pixels = int(os.getenv("PRODUCT_IMAGE_MAX_PIXELS", str(40_000_000)))
+        self.disk = RenderCache(
+            "product_images",
+            memory_bytes=0,
+            disk_bytes=int(os.getenv("PRODUCT_IMAGE_CACHE_DISK_BYTES", str(1024 * 1024 * 1024))),
+            directory=os.getenv("PRODUCT_IMAGE_CACHE_DIR", cache_path("product_images")),
+            enabled=self.enabled,
+        )
+        self._memory: "OrderedDict[str, ProductImage]" = OrderedDict()
+        self._memory_usage = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def fetch(self, url: str, timeout: Optional[aiohttp.ClientTimeout] = None) -> Optional[ProductImage]:
+        """
+        The image at url, from cache when fresh. Returns None when it can't be
+        fetched or is rejected; raises asyncio.TimeoutError when the fetch
+        overruns its timeout with no cached copy to fall back on.
+        """
+        entry = self._memory_get(url)
+        if entry is not None and entry.fresh():
+            product_image_requests.inc(result="memory_hit")
+            return entry
+        pending = self._inflight.get(url)
+        if pending is None:
+            pending = asyncio.ensure_future(self._load(url, entry, timeout))
+            self._inflight[url] = pending
+            pending.add_done_callback(lambda task: self._finish(url, task))
+        # Shielded so one caller running out of deadline doesn't cancel the fetch for the others
+        return await asyncio.shield(pending)
+
+    def _finish(self, url: str, task: asyncio.Future):
+        if self._inflight.get(url) is task:
+            del self._inflight[url]
+        if not task.cancelled():
+            task.exception()  # retrieved here so abandoned failures aren't reported as unhandled
+
+    async def _load(self, url: str, entry: Optional[ProductImage], timeout: Optional[aiohttp.ClientTimeout]) -> Optional[ProductImage]:
+        loop = asyncio.get_running_loop()
+        if entry is None and self.enabled:
+            entry = await loop.run_in_executor(None, self._disk_get, url)
+            if entry is not None:
+                self._remember(entry)
+                if entry.fresh():
+                    product_image_requests.inc(result="disk_hit")
+                    return entry
+
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        try:
+            async with http_client.session.get(url, headers=headers, timeout=timeout) as response:
+                if response.status == 304 and entry is not None:
+                    entry.update_validity(response.headers, freshness_lifetime(response.headers, self.default_ttl) or 0.0)
+                    product_image_requests.inc(result="revalidated")
+                    await loop.run_in_executor(None, self._disk_put, entry)
+                    return entry
+                if response.status != 200:
+                    if entry is not None and response.status >= 500:
+                        product_image_requests.inc(result="stale")
+                        return entry
+                    product_image_requests.inc(result="error")
+                    return None
+                data = await self._read_limited(response)
+                response_headers = response.headers
+        except ProductImageRejected as e:
+            logger.warning("Rejected product image %s: %s", url, e)
+            product_image_requests.inc(result="rejected")
+            return None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if entry is not None:
+                logger.warning("Serving stale product image %s: %s", url, e)
+                product_image_requests.inc(result="stale")
+                return entry
+            product_image_requests.inc(result="error")
+            raise
+
+        try:
+            image = await loop.run_in_executor(None, self._decode, data)
+        except ProductImageRejected as e:
+            logger.warning("Rejected product image %s: %s", url, e)
+            product_image_requests.inc(result="rejected")
+            return None
+        except Exception as e:
+            logger.warning("Could not decode product image %s: %s", url, e)
+            product_image_requests.inc(result="error")
+            return None
+
+        product_image_requests.inc(result="fetched")
+        lifetime = freshness_lifetime(response_headers, self.default_ttl)
+        fetched = ProductImage(url, data, image, expires_at=time.time())
+        if lifetime is None or not self.enabled:
+            # no-store: use it for this request only
+            return fetched
+        fetched.update_validity(response_headers, lifetime)
+        self._remember(fetched)
+        await loop.run_in_executor(None, self._disk_put, fetched)
+        return fetched
+
+    async def _read_limited(self, response: aiohttp.ClientResponse) -> bytes:
+        if response.content_length is not None and response.content_length > self.max_bytes:
+            raise ProductImageRejected(f"{response.content_length} bytes exceeds the {self.max_bytes} byte limit")
+        chunks = []
+        size = 0
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            size += len(chunk)
+            if size > self.max_bytes:
+                raise ProductImageRejected(f"more than the {self.max_bytes} byte limit")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _decode(self, data: bytes) -> Image.Image:
+        img = Image.open(BytesIO(data))
+        # The header gives the size without decoding, which stops decompression bombs early
+        if img.width * img.height > self.max_pixels:
+            raise ProductImageRejected(f"{img.width}x{img.height} exceeds the {self.max_pixels} pixel limit")
+        img.load()
+        return img
+
+    @staticmethod
+    def _disk_key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _disk_get(self, url: str) -> Optional[ProductImage]:
+        stored = self.disk.get(self._disk_key(url))
+        if stored is None:
+            return None
+        try:
+            header, _, data = stored.partition(b"\n")
+            metadata = json.loads(header)
+            if metadata.get("url") != url:
+                return None
+            return ProductImage(
+                url, data, self._decode(data),
+                etag=metadata.get("etag"),
+                last_modified=metadata.get("last_modified"),
+                expires_at=float(metadata.get("expires_at", 0.0)),
+            )
+        except Exception as e:
+            logger.warning("Discarding unreadable cached product image %s: %s", url, e)
+            return None
+
+    def _disk_put(self, entry: ProductImage):
+        header = json.dumps(entry.metadata()).encode("utf-8")
+        self.disk.put(self._disk_key(entry.url), header + b"\n" + entry.data, replace=True)
+
+    def _memory_get(self, url: str) -> Optional[ProductImage]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._memory.get(url)
+            if entry is not None:
+                self._memory.move_to_end(url)
+        return entry
+
+    def _remember(self, entry: ProductImage):
+        if entry.nbytes > self.memory_limit:
+            return
+        with self._lock:
+            previous = self._memory.pop(entry.url, None)
+            if previous is not None:
+                self._memory_usage -= previous.nbytes
+            self._memory[entry.url] = entry
+            self._memory_usage += entry.nbytes
+            while self._memory_usage > self.memory_limit and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_usage -= evicted.nbytes
+            product_image_memory_bytes.set(self._memory_usage)
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_usage = 0
+            product_image_memory_bytes.set(0)
+
@@ -1,166 +1,293 @@
 import requests
 from bs4 import BeautifulSoup
-from typing import Dict, Any, Optional
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Optional
+from urllib.parse import urlparse
 import re
 import asyncio
 import aiohttp
 
+from services.deadline import stage_timeout
+from services.http_client import http_client
+from services.logging_config import get_logger
+from services.scrape_scheduler import RetryableScrapeError, ScrapeScheduler, parse_retry_after
+from services.selector_memory import SelectorMemory
+
+logger = get_logger(__name__)
+
+# Responses that mean "not now" rather than "never"
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
 
 class ProductScraper:
     def __init__(self):
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+        self.scheduler = ScrapeScheduler()
+        self.selector_memory = SelectorMemory()
     
     async def scrape_product(self, url: str) -> Optional[Dict[str, Any]]:
         """
         Scrape product information from a URL.
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(str(url), headers=self.headers, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                    response.raise_for_status()
-                    content = await response.read()
-            
-            soup = BeautifulSoup(content, 'html.parser')
-            
-            # Try to extract product information using common patterns
-            product_info = {
-                "title": self._extract_title(soup),
-                "description": self._extract_description(soup),
-                "price": self._extract_price(soup),
-                "image_url": self._extract_image(soup),
-                "category": self._extract_category(soup)
-            }
-            
-            # Validate that we got at least a title
-            if not product_info.get("title"):
-                return None
-            
-            return product_info
-        
+            content = await self.scheduler.run(url, lambda: self._fetch_page(url))
+            return self.parse_product_html(content, domain=urlparse(str(url)).hostname)
+
         except Exception as e:
-            print(f"Error scraping product: {str(e)}")
+            logger.error("Error scraping product: %s", e)
             return None
+
+    async def scrape_many(self, urls: List[str], concurrency: int = 32) -> List[Optional[Dict[str, Any]]]:
+        """
+        Scrape many product URLs concurrently. Per-domain limits still apply,
+        so pages from different retailers proceed in parallel while each
+        retailer is only hit at its polite rate.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def scrape_one(url: str) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                return await self.scrape_product(url)
+
+        return await asyncio.gather(*(scrape_one(url) for url in urls))
+
+    async def _fetch_page(self, url: str) -> bytes:
+        """Download a page, classifying throttling and transient failures as retryable"""
+        try:
+            async with http_client.session.get(str(url), headers=self.headers, timeout=stage_timeout("scrape", 10)) as response:
+                if response.status in RETRYABLE_STATUSES:
+                    raise RetryableScrapeError(
+                        f"HTTP {response.status} from {response.url.host}",
+                        status=response.status,
+                        retry_after=parse_retry_after(response.headers.get("Retry-After"))
+                    )
+                response.raise_for_status()
+                return await response.read()
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            raise RetryableScrapeError(f"{type(e).__name__}: {e}")
+
+    def parse_product_html(self, content: bytes, domain: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Extract product information from an already downloaded product page.
+        When a domain is given, strategies learned for it are tried first.
+        """
+        soup = BeautifulSoup(content, 'html.parser')
+
+        # Try to extract product information using common patterns
+        product_info = {
+            "title": self._extract_title(soup, domain),
+            "description": self._extract_description(soup, domain),
+            "price": self._extract_price(soup, domain),
+            "image_url": self._extract_image(soup, domain),
+            "category": self._extract_category(soup, domain)
+        }
+
+        # Validate that we got at least a title
+        if not product_info.get("title"):
+            return None
+
+        return product_info
     
-    def _extract_title(self, soup: BeautifulSoup) -> str:
+    def _extract_field(self, soup: BeautifulSoup, field: str, domain: Optional[str]) -> Optional[str]:
+        """
+        Run a field's strategies in order and return the first match. The
+        strategy learned for this domain, if any, is tried before the rest.
+        """
+        strategies = FIELD_STRATEGIES[field]
+        page_text = None
+        
+        def run(strategy_id: str) -> Optional[str]:
+            # "text:" strategies search the page text, extracted once for all of them
+            nonlocal page_text
+            if strategy_id.startswith("text:"):
+                if page_text is None:
+                    page_text = soup.get_text()
+                return strategies[strategy_id](page_text)
+            return strategies[strategy_id](soup)
+        
+        learned = self.selector_memory.get(domain, field) if domain else None
+        if learned in strategies:
+            value = run(learned)
+            if value is not None:
+                self.selector_memory.record_hit(domain, field)
+                return value
+        
+        for strategy_id in strategies:
+            if strategy_id == learned:
+                continue
+            value = run(strategy_id)
+            if value is not None:
+                if domain:
+                    self.selector_memory.learn(domain, field, strategy_id)
+                return value
+        
+        if learned:
+            self.selector_memory.record_miss(domain, field)
+        return None
+    
+    def _extract_title(self, soup: BeautifulSoup, domain: Optional[str] = None) -> str:
         """Extract product title"""
-        # Try multiple selectors
-        selectors = [
+        title = self._extract_field(soup, "title", domain)
+        return title if title is not None else "Product"
+    
+    def _extract_description(self, soup: BeautifulSoup, domain: Optional[str] = None) -> str:
+        """Extract product description"""
+        description = self._extract_field(soup, "description", domain)
+        return description if description is not None else ""
+    
+    def _extract_price(self, soup: BeautifulSoup, domain: Optional[str] = None) -> str:
+        """Extract product price"""
+        price = self._extract_field(soup, "price", domain)
+        return price if price is not None else "Price not available"
+    
+    def _extract_image(self, soup: BeautifulSoup, domain: Optional[str] = None) -> str:
+        """Extract product image URL"""
+        image = self._extract_field(soup, "image_url", domain)
+        return image if image is not None else ""
+    
+    def _extract_category(self, soup: BeautifulSoup, domain: Optional[str] = None) -> str:
+        """Extract product category"""
+        category = self._extract_field(soup, "category", domain)
+        return category if category is not None else "General"
+
+
+# Extraction strategies. Each takes the parsed page (for "text:" strategies, its
+# text) and returns the field value, or None when it does not match so the next
+# strategy is tried.
+
+def _meta_or_text(selector: str, min_length: int = 0, max_length: Optional[int] = None) -> Callable:
+    """Match an element; meta tags yield their content, others their non-empty text"""
+    def strategy(soup: BeautifulSoup) -> Optional[str]:
+        element = soup.select_one(selector)
+        if not element:
+            return None
+        if element.name == 'meta':
+            return element.get('content', '').strip()
+        text = element.get_text().strip()
+        if text and len(text) > min_length:
+            return text[:max_length] if max_length else text
+        return None
+    return strategy
+
+
+def _title_selector(selector: str) -> Callable:
+    def strategy(soup: BeautifulSoup) -> Optional[str]:
+        element = soup.select_one(selector)
+        if not element:
+            return None
+        if element.name == 'meta':
+            return element.get('content', '').strip()
+        return element.get_text().strip()
+    return strategy
+
+
+def _title_tag(soup: BeautifulSoup) -> Optional[str]:
+    # Fallback: use page title
+    title_tag = soup.find('title')
+    return title_tag.get_text().strip() if title_tag else None
+
+
+def _price_pattern(pattern: str) -> Callable:
+    compiled = re.compile(pattern)
+    def strategy(text: str) -> Optional[str]:
+        matches = compiled.findall(text)
+        return matches[0] if matches else None
+    return strategy
+
+
+def _price_selector(selector: str) -> Callable:
+    def strategy(soup: BeautifulSoup) -> Optional[str]:
+        element = soup.select_one(selector)
+        if not element:
+            return None
+        if element.name == 'meta':
+            price = element.get('content', '')
+            if price:
+                return f"${price}"
+        text = element.get_text().strip()
+        return text or None
+    return strategy
+
+
+def _image_selector(selector: str) -> Callable:
+    def strategy(soup: BeautifulSoup) -> Optional[str]:
+        element = soup.select_one(selector)
+        if not element:
+            return None
+        if element.name == 'meta':
+            return element.get('content', '')
+        return element.get('src') or element.get('data-src') or None
+    return strategy
+
+
+def _category_selector(selector: str) -> Callable:
+    def strategy(soup: BeautifulSoup) -> Optional[str]:
+        element = soup.select_one(selector)
+        if not element:
+            return None
+        if element.name == 'meta':
+            return element.get('content', '')
+        text = element.get_text().strip()
+        if text:
+            return text.split('>')[-1].strip() if '>' in text else text
+        return None
+    return strategy
+
+
+def _strategies(*pairs) -> "OrderedDict[str, Callable]":
+    return OrderedDict(pairs)
+
+
+# Strategy ids are persisted by SelectorMemory; bump STRATEGY_VERSION there if they change meaning
+FIELD_STRATEGIES: Dict[str, "OrderedDict[str, Callable]"] = {
+    "title": _strategies(
+        *[(f"css:{sel}", _title_selector(sel)) for sel in [
             'h1.product-title',
             'h1[class*="title"]',
             'h1[class*="name"]',
             'meta[property="og:title"]',
             'title'
-        ]
-        
-        for selector in selectors:
-            element = soup.select_one(selector)
-            if element:
-                if element.name == 'meta':
-                    return element.get('content', '').strip()
-                return element.get_text().strip()
-        
-        # Fallback: use page title
-        title_tag = soup.find('title')
-        if title_tag:
-            return title_tag.get_text().strip()
-        
-        return "Product"
-    
-    def _extract_description(self, soup: BeautifulSoup) -> str:
-        """Extract product description"""
-        selectors = [
+        ]],
+        ("tag:title", _title_tag),
+    ),
+    "description": _strategies(
+        *[(f"css:{sel}", _meta_or_text(sel, min_length=20, max_length=500)) for sel in [
             'meta[name="description"]',
             'meta[property="og:description"]',
             '.product-description',
             '[class*="description"]',
             'p[class*="description"]'
-        ]
-        
-        for selector in selectors:
-            element = soup.select_one(selector)
-            if element:
-                if element.name == 'meta':
-                    return element.get('content', '').strip()
-                text = element.get_text().strip()
-                if text and len(text) > 20:
-                    return text[:500]  # Limit length
-        
-        return ""
-    
-    def _extract_price(self, soup: BeautifulSoup) -> str:
-        """Extract product price"""
-        # Try to find price patterns
-        price_patterns = [
+        ]],
+    ),
+    "price": _strategies(
+        # Try to find price patterns in the page text, then price elements
+        *[(f"text:{pattern}", _price_pattern(pattern)) for pattern in [
             r'\$[\d,]+\.?\d*',
             r'€[\d,]+\.?\d*',
             r'£[\d,]+\.?\d*',
             r'[\d,]+\.?\d*\s*(USD|EUR|GBP)'
-        ]
-        
-        text = soup.get_text()
-        for pattern in price_patterns:
-            matches = re.findall(pattern, text)
-            if matches:
-                return matches[0]
-        
-        # Try meta tags
-        price_selectors = [
+        ]],
+        *[(f"css:{sel}", _price_selector(sel)) for sel in [
             'meta[property="product:price:amount"]',
             '[class*="price"]',
             '[id*="price"]'
-        ]
-        
-        for selector in price_selectors:
-            element = soup.select_one(selector)
-            if element:
-                if element.name == 'meta':
-                    price = element.get('content', '')
-                    if price:
-                        return f"${price}"
-                text = element.get_text().strip()
-                if text:
-                    return text
-        
-        return "Price not available"
-    
-    def _extract_image(self, soup: BeautifulSoup) -> str:
-        """Extract product image URL"""
-        selectors = [
+        ]],
+    ),
+    "image_url": _strategies(
+        *[(f"css:{sel}", _image_selector(sel)) for sel in [
             'meta[property="og:image"]',
             'img[class*="product"]',
             'img[class*="main"]',
             'img[alt*="product"]'
-        ]
-        
-        for selector in selectors:
-            element = soup.select_one(selector)
-            if element:
-                if element.name == 'meta':
-                    return element.get('content', '')
-                src = element.get('src') or element.get('data-src')
-                if src:
-                    return src
-        
-        return ""
-    
-    def _extract_category(self, soup: BeautifulSoup) -> str:
-        """Extract product category"""
-        selectors = [
+        ]],
+    ),
+    "category": _strategies(
+        *[(f"css:{sel}", _category_selector(sel)) for sel in [
             'meta[property="product:category"]',
             '[class*="category"]',
             '[class*="breadcrumb"]'
-        ]
-        
-        for selector in selectors:
-            element = soup.select_one(selector)
-            if element:
-                if element.name == 'meta':
-                    return element.get('content', '')
-                text = element.get_text().strip()
-                if text:
-                    return text.split('>')[-1].strip() if '>' in text else text
-        
-        return "General"
-
+        ]],
+    ),
+}
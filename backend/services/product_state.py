@@ -0,0 +1,174 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set
+
+from services.logging_config import get_logger
+from services.metrics import Counter, registry
+from services.storage import cache_path
+
+logger = get_logger(__name__)
+
+incremental_stages = registry.register(Counter(
+    "adgen_incremental_stages_total",
+    "Pipeline stages on regeneration of a known product, by whether they re-ran or reused stored output.",
+    ("stage", "result"),
+))
+
+STATE_VERSION = 1
+
+# Inputs each stage reads: product_info fields, plus the copy mode the request
+# resolved to, so template copy from "fast" mode is never reused for "llm".
+# The price is in the copy prompt only as context, so a price move alone
+# doesn't regenerate the copy
+STAGE_FIELDS = {
+    "classify": ("image_url",),
+    "copy_analysis": ("title", "description", "copy_mode"),
+    "render": ("title", "image_url"),
+}
+
+# Stages whose output another stage consumes
+STAGE_INPUTS = {
+    "render": ("classify", "copy_analysis"),
+}
+
+STAGES = tuple(STAGE_FIELDS)
+TRACKED_FIELDS = tuple(sorted({field for fields in STAGE_FIELDS.values() for field in fields} | {"price"}))
+
+
+def changed_fields(previous: Dict[str, Any], inputs: Dict[str, Any]) -> Set[str]:
+    """Tracked inputs whose value differs from the stored ones"""
+    return {field for field in TRACKED_FIELDS if previous.get(field) != inputs.get(field)}
+
+
+def affected_stages(changed: Iterable[str]) -> Set[str]:
+    """Stages that read a changed field, plus every stage downstream of one"""
+    changed = set(changed)
+    affected = {stage for stage, fields in STAGE_FIELDS.items() if changed.intersection(fields)}
+    grew = True
+    while grew:
+        grew = False
+        for stage, inputs in STAGE_INPUTS.items():
+            if stage not in affected and affected.intersection(inputs):
+                affected.add(stage)
+                grew = True
+    return affected
+
+
+class ProductStateStore:
+    """
+    Last successful generation for each product URL: the scraped fields and
+    copy mode it was built from, and the stage outputs worth keeping (copy
+    analysis and category).
+
+    On regeneration the new scrape is diffed against the stored one and
+    only stages that read a changed field (or consume the output of a
+    stage that re-runs) are run again, per STAGE_FIELDS / STAGE_INPUTS.
+    Renders are not stored here: they are keyed by their inputs in the
+    render cache, so unchanged ones are cache hits anyway. Entries older
+    than PRODUCT_STATE_MAX_AGE are ignored, so products are regenerated
+    from scratch now and then. Persisted as JSON so state survives restarts.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.enabled = os.getenv("PRODUCT_STATE_ENABLED", "true").lower() == "true"
+        self.path = path or os.getenv("PRODUCT_STATE_PATH", cache_path("product_state.json"))
+        self.max_entries = int(os.getenv("PRODUCT_STATE_MAX_ENTRIES", "50000"))
+        self.max_age = float(os.getenv("PRODUCT_STATE_MAX_AGE", "86400"))
+        self.save_interval = float(os.getenv("PRODUCT_STATE_SAVE_INTERVAL", "60"))
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._dirty = False
+        self._saving = False
+        self._last_save = time.monotonic()
+        self._lock = threading.Lock()
+        if self.enabled:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """The stored state for url, unless there is none or it has expired"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(url)
+        if entry is None or time.time() - entry.get("updated_at", 0.0) > self.max_age:
+            return None
+        return entry
+
+    def plan(self, previous: Optional[Dict[str, Any]], inputs: Dict[str, Any]) -> Set[str]:
+        """Stages to run for these inputs (the scrape plus copy_mode): all for a new product, else those the diff affects"""
+        if previous is None:
+            return set(STAGES)
+        changed = changed_fields(previous.get("fields", {}), inputs)
+        rerun = affected_stages(changed)
+        for stage in STAGES:
+            incremental_stages.inc(stage=stage, result="rerun" if stage in rerun else "reused")
+        logger.debug("Changed fields %s; re-running %s", sorted(changed), sorted(rerun))
+        return rerun
+
+    def record(self, url: str, inputs: Dict[str, Any], **outputs: Any):
+        """Store the inputs and outputs of a successful generation"""
+        if not self.enabled:
+            return
+        entry = {
+            "fields": {field: inputs.get(field) for field in TRACKED_FIELDS},
+            "outputs": outputs,
+            "updated_at": time.time(),
+        }
+        with self._lock:
+            self._entries.pop(url, None)
+            self._entries[url] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+        self._maybe_save()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable product state %s: %s", self.path, e)
+            return
+        if data.get("version") != STATE_VERSION:
+            logger.info("Discarding product state v%s", data.get("version"))
+            return
+        with self._lock:
+            for url, entry in data.get("entries", []):
+                self._entries[url] = entry
+        self._dirty = False
+
+    def save(self):
+        """Atomically write the state to disk if it changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = {"version": STATE_VERSION, "entries": list(self._entries.items())}
+            self._dirty = False
+            self._last_save = time.monotonic()
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not persist product state to %s: %s", self.path, e)
+
+    def _maybe_save(self):
+        # Periodic saves run off the request path
+        if self._dirty and not self._saving and time.monotonic() - self._last_save >= self.save_interval:
+            self._saving = True
+            threading.Thread(target=self._background_save, name="product-state-save", daemon=True).start()
+
+    def _background_save(self):
+        try:
+            self.save()
+        finally:
+            self._saving = False
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from services.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def configured_api_key(env_name: str, placeholder: Optional[str] = None) -> Optional[str]:
+    """Return the configured API key, ignoring blanks and the env.example placeholder"""
+    key = os.getenv(env_name)
+    if key and key.strip() and key != placeholder:
+        return key
+    return None
+
+
+class ProviderRegistry:
+    """
+    Create provider clients on first use instead of at import/startup.
+
+    Each provider is registered with a zero-argument factory that performs its
+    own SDK import and client construction. The factory runs at most once per
+    process; a factory that raises or returns None marks the provider as
+    unavailable.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.load_times: Dict[str, float] = {}
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+
+    def is_registered(self, name: str) -> bool:
+        return name in self._factories
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def get(self, name: str) -> Optional[Any]:
+        """Return the provider client, importing and constructing it on first call"""
+        if name in self._instances:
+            return self._instances[name]
+        if name not in self._factories:
+            return None
+        with self._lock:
+            if name not in self._instances:
+                start = time.perf_counter()
+                try:
+                    instance = self._factories[name]()
+                except Exception as e:
+                    logger.warning("Failed to initialize %s provider: %s", name, e)
+                    instance = None
+                self.load_times[name] = time.perf_counter() - start
+                self._instances[name] = instance
+                if instance is not None:
+                    logger.info("Initialized %s provider in %.1f ms", name, self.load_times[name] * 1000)
+        return self._instances[name]
+
+    async def aget(self, name: str) -> Optional[Any]:
+        """Like get(), but runs a first-time load in the executor so SDK imports don't block the event loop"""
+        if name in self._instances or name not in self._factories:
+            return self._instances.get(name)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.get, name)
@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+from services.logging_config import get_logger
+from services.metrics import Counter, registry
+from services.storage import cache_path
+
+logger = get_logger(__name__)
+
+cache_requests = registry.register(Counter(
+    "adgen_render_cache_requests_total",
+    "Render cache lookups by cache, tier and result.",
+    ("cache", "result"),
+))
+
+
+def digest_bytes(data: Optional[bytes]) -> Optional[str]:
+    return hashlib.sha256(data).hexdigest() if data is not None else None
+
+
+def render_key(kind: str, version: str, **inputs: Any) -> str:
+    """
+    Digest of everything that affects a render's output pixels.
+
+    Byte inputs should be passed through digest_bytes() first; the renderer
+    version must be bumped whenever drawing code changes its output.
+    """
+    payload = json.dumps({"kind": kind, "version": version, "inputs": inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    Two-tier cache of encoded render output: an in-memory LRU bounded by
+    total bytes, backed by a size-bounded directory of files named by key.
+
+    Async code should use aget()/aput(), which keep disk reads, writes and
+    eviction off the event loop. The disk tier's size is counted on the
+    first write rather than at construction, which happens at import.
+    """
+
+    def __init__(self, name: str, memory_bytes: Optional[int] = None, disk_bytes: Optional[int] = None, directory: Optional[str] = None,
+                 enabled: Optional[bool] = None):
+        self.name = name
+        self.enabled = enabled if enabled is not None else os.getenv("RENDER_CACHE_ENABLED", "true").lower() == "true"
+        self.memory_limit = memory_bytes if memory_bytes is not None else int(os.getenv("RENDER_CACHE_MEMORY_BYTES", str(128 * 1024 * 1024)))
+        self.disk_limit = disk_bytes if disk_bytes is not None else int(os.getenv("RENDER_CACHE_DISK_BYTES", str(1024 * 1024 * 1024)))
+        self.directory = directory or os.path.join(os.getenv("RENDER_CACHE_DIR", cache_path("render")), name)
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_usage = 0
+        self._disk_usage: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _scan_disk(self) -> int:
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, filename))
+                except OSError:
+                    pass
+        return total
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Blocking lookup; reads the disk tier on a memory miss"""
+        if not self.enabled:
+            return None
+        value = self._memory_get(key)
+        if value is None:
+            value = self._disk_get(key)
+        return value
+
+    async def aget(self, key: str) -> Optional[bytes]:
+        """get() for the event loop: memory hits return at once, disk reads run in the executor"""
+        if not self.enabled:
+            return None
+        value = self._memory_get(key)
+        if value is None:
+            value = await asyncio.get_running_loop().run_in_executor(None, self._disk_get, key)
+        return value
+
+    def put(self, key: str, value: bytes, replace: bool = False):
+        """Store value; renders are immutable per key, so an existing file is kept unless replace is set"""
+        if not self.enabled:
+            return
+        self._remember(key, value)
+        if self._fits_disk(value):
+            self._write_disk(key, value, replace)
+
+    async def aput(self, key: str, value: bytes, replace: bool = False):
+        """put() for the event loop; the disk write and any eviction run in the executor"""
+        if not self.enabled:
+            return
+        self._remember(key, value)
+        if self._fits_disk(value):
+            await asyncio.get_running_loop().run_in_executor(None, self._write_disk, key, value, replace)
+
+    def _fits_disk(self, value: bytes) -> bool:
+        return self.disk_limit > 0 and len(value) <= self.disk_limit
+
+    def _memory_get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+        if value is not None:
+            cache_requests.inc(cache=self.name, result="memory_hit")
+        elif self.disk_limit <= 0:
+            cache_requests.inc(cache=self.name, result="miss")
+        return value
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        if self.disk_limit <= 0:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+            os.utime(path)
+        except OSError:
+            cache_requests.inc(cache=self.name, result="miss")
+            return None
+        cache_requests.inc(cache=self.name, result="disk_hit")
+        self._remember(key, value)
+        return value
+
+    def _remember(self, key: str, value: bytes):
+        if len(value) > self.memory_limit:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_usage -= len(previous)
+            self._memory[key] = value
+            self._memory_usage += len(value)
+            while self._memory_usage > self.memory_limit and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_usage -= len(evicted)
+
+    def _write_disk(self, key: str, value: bytes, replace: bool = False):
+        if self._disk_usage is None:
+            usage = self._scan_disk()
+            with self._lock:
+                if self._disk_usage is None:
+                    self._disk_usage = usage
+        path = self._path(key)
+        previous_size = 0
+        if os.path.exists(path):
+            if not replace:
+                return
+            try:
+                previous_size = os.path.getsize(path)
+            except OSError:
+                pass
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write %s render cache entry: %s", self.name, e)
+            return
+        with self._lock:
+            self._disk_usage += len(value) - previous_size
+            over_limit = self._disk_usage > self.disk_limit
+        if over_limit:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Delete least recently used files until usage is back under 90% of the limit"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        usage = sum(size for _, size, _ in entries)
+        target = int(self.disk_limit * 0.9)
+        for _, size, path in entries:
+            if usage <= target:
+                break
+            try:
+                os.remove(path)
+                usage -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_usage = usage
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_usage = 0
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import random
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional, TypeVar
+from urllib.parse import urlparse
+
+from services.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class RetryableScrapeError(Exception):
+    """A fetch failure worth retrying (throttling, 5xx, connection reset)"""
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given as delta-seconds or an HTTP date"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """Refilling token bucket; acquire() waits until a token is available"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class DomainState:
+    def __init__(self, rate: float, burst: float, concurrency: int):
+        self.bucket = TokenBucket(rate, burst)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.blocked_until = 0.0
+        self.in_flight = 0
+
+
+class ScrapeScheduler:
+    """
+    Per-domain politeness for outbound scraping.
+
+    Each host gets its own token-bucket rate limit and concurrency cap, so one
+    retailer never sees a burst while requests to other hosts proceed in
+    parallel. Throttling responses are retried with jittered exponential
+    backoff, and a Retry-After from the server pauses the whole domain.
+    """
+
+    def __init__(self):
+        self.rate = float(os.getenv("SCRAPE_DOMAIN_RPS", "2"))
+        self.burst = float(os.getenv("SCRAPE_DOMAIN_BURST", "4"))
+        self.concurrency = int(os.getenv("SCRAPE_DOMAIN_CONCURRENCY", "2"))
+        self.max_retries = int(os.getenv("SCRAPE_MAX_RETRIES", "3"))
+        self.backoff_base = float(os.getenv("SCRAPE_BACKOFF_BASE", "0.5"))
+        self.backoff_max = float(os.getenv("SCRAPE_BACKOFF_MAX", "30"))
+        self.max_domains = int(os.getenv("SCRAPE_MAX_TRACKED_DOMAINS", "10000"))
+        self._domains: "OrderedDict[str, DomainState]" = OrderedDict()
+
+    def _state(self, domain: str) -> DomainState:
+        state = self._domains.get(domain)
+        if state is None:
+            state = self._domains[domain] = DomainState(self.rate, self.burst, self.concurrency)
+            self._evict_idle()
+        else:
+            self._domains.move_to_end(domain)
+        return state
+
+    def _evict_idle(self):
+        # Drop the least recently used domains that have nothing in flight
+        now = time.monotonic()
+        for domain in list(self._domains):
+            if len(self._domains) <= self.max_domains:
+                break
+            state = self._domains[domain]
+            if state.in_flight == 0 and state.blocked_until <= now:
+                del self._domains[domain]
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform over [0, min(max, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def run(self, url: str, fetch: Callable[[], Awaitable[T]]) -> T:
+        """Run fetch() under the politeness limits of url's domain, retrying throttled attempts"""
+        domain = (urlparse(str(url)).hostname or "").lower()
+        state = self._state(domain)
+        attempt = 0
+        while True:
+            wait = state.blocked_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            async with state.semaphore:
+                await state.bucket.acquire()
+                state.in_flight += 1
+                try:
+                    return await fetch()
+                except RetryableScrapeError as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = e.retry_after if e.retry_after is not None else self._backoff(attempt)
+                    delay = min(delay, self.backoff_max)
+                    if e.retry_after is not None:
+                        # The server asked us to back off: pause the whole domain
+                        state.blocked_until = max(state.blocked_until, time.monotonic() + delay)
+                    logger.info(
+                        "Retrying %s in %.2fs (attempt %d/%d): %s",
+                        domain, delay, attempt + 1, self.max_retries, e
+                    )
+                finally:
+                    state.in_flight -= 1
+            attempt += 1
+            await asyncio.sleep(delay)
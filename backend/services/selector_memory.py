@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from services.logging_config import get_logger
+from services.storage import cache_path
+
+logger = get_logger(__name__)
+
+# Bump when the scraper's strategy lists change meaning, to discard old memory
+STRATEGY_VERSION = 1
+
+
+class SelectorMemory:
+    """
+    Remembers which extraction strategy worked for each field on each domain.
+
+    Learned strategies are tried first on later pages from the same domain. A
+    strategy is replaced as soon as a different one matches instead, and
+    forgotten after `max_misses` consecutive pages where nothing matched.
+    State is persisted as JSON so it survives restarts.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv(
+            "SCRAPER_SELECTOR_MEMORY_PATH",
+            cache_path("selector_memory.json")
+        )
+        self.max_misses = int(os.getenv("SCRAPER_SELECTOR_MAX_MISSES", "2"))
+        self.save_interval = float(os.getenv("SCRAPER_SELECTOR_SAVE_INTERVAL", "30"))
+        self._domains: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._dirty = False
+        self._saving = False
+        self._last_save = time.monotonic()
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable selector memory %s: %s", self.path, e)
+            return
+        if data.get("version") != STRATEGY_VERSION:
+            logger.info("Discarding selector memory from strategy version %s", data.get("version"))
+            return
+        self._domains = data.get("domains", {})
+
+    def save(self):
+        """Atomically write the memory to disk if it changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            # Copied under the lock: hits and misses update entries in place
+            payload = {"version": STRATEGY_VERSION, "domains": self._copy_domains()}
+            self._dirty = False
+            self._last_save = time.monotonic()
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not persist selector memory to %s: %s", self.path, e)
+
+    def _maybe_save(self):
+        # Scrapes run on the event loop, so periodic saves happen off it
+        if self._dirty and not self._saving and time.monotonic() - self._last_save >= self.save_interval:
+            self._saving = True
+            threading.Thread(target=self._background_save, name="selector-memory-save", daemon=True).start()
+
+    def _background_save(self):
+        try:
+            self.save()
+        finally:
+            self._saving = False
+
+    def _copy_domains(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        return {
+            domain: {field: dict(entry) for field, entry in fields.items()}
+            for domain, fields in self._domains.items()
+        }
+
+    def get(self, domain: str, field: str) -> Optional[str]:
+        with self._lock:
+            entry = self._domains.get(domain, {}).get(field)
+            return entry["strategy"] if entry else None
+
+    def record_hit(self, domain: str, field: str):
+        with self._lock:
+            entry = self._domains.get(domain, {}).get(field)
+            if entry is None:
+                return
+            entry["hits"] += 1
+            if entry["misses"]:
+                entry["misses"] = 0
+        # Hit counts are informational; don't force a write just for them
+        self._maybe_save()
+
+    def learn(self, domain: str, field: str, strategy: str):
+        with self._lock:
+            self._domains.setdefault(domain, {})[field] = {"strategy": strategy, "hits": 1, "misses": 0}
+            self._dirty = True
+        self._maybe_save()
+
+    def record_miss(self, domain: str, field: str):
+        with self._lock:
+            entry = self._domains.get(domain, {}).get(field)
+            if entry is None:
+                return
+            entry["misses"] += 1
+            if entry["misses"] >= self.max_misses:
+                del self._domains[domain][field]
+                logger.info("Forgetting %s strategy %s for %s", field, entry["strategy"], domain)
+            self._dirty = True
+        self._maybe_save()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return self._copy_domains()
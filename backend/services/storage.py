@@ -0,0 +1,10 @@
+import os
+
+
+def cache_dir() -> str:
+    """Root directory for on-disk caches and learned state (CACHE_DIR, default .cache)"""
+    return os.getenv("CACHE_DIR", ".cache")
+
+
+def cache_path(*parts: str) -> str:
+    return os.path.join(cache_dir(), *parts)
@@ -0,0 +1,184 @@
+import os
+from functools import lru_cache
+from typing import List, Tuple
+
+from PIL import ImageFont
+
+# TrueType face for ad text; PIL's bundled scalable font stands in when it isn't installed
+FONT_PATH = os.getenv("AD_FONT_PATH", "arial.ttf")
+
+ELLIPSIS = "…"
+
+# Extra space between wrapped lines, as a fraction of the line height
+LINE_GAP = 0.1
+
+
+@lru_cache(maxsize=128)
+def load_font(size: int, path: str = FONT_PATH):
+    """The face at path in the given size, or PIL's default font at that size when it can't be loaded"""
+    try:
+        return ImageFont.truetype(path, size=size)
+    except Exception:
+        try:
+            return ImageFont.load_default(size=size)
+        except TypeError:  # Pillow without FreeType: fixed-size bitmap font
+            return ImageFont.load_default()
+
+
+@lru_cache(maxsize=65536)
+def measure(text: str, size: int, path: str = FONT_PATH) -> float:
+    """Advance width of text in pixels; memoized per (font, size, text)"""
+    font = load_font(size, path)
+    if hasattr(font, "getlength"):
+        return font.getlength(text)
+    left, _, right, _ = font.getbbox(text)
+    return right - left
+
+
+@lru_cache(maxsize=256)
+def line_height(size: int, path: str = FONT_PATH) -> int:
+    """Ascent plus descent: the height of one line drawn with the default "la" anchor"""
+    font = load_font(size, path)
+    if hasattr(font, "getmetrics"):
+        ascent, descent = font.getmetrics()
+        return ascent + descent
+    _, top, _, bottom = font.getbbox("Ag")
+    return bottom - top
+
+
+class TextBlock:
+    """Lines of text laid out at one font size, with each line's width and the block's height"""
+
+    def __init__(self, lines: Tuple[str, ...], size: int, path: str = FONT_PATH):
+        self.lines = lines
+        self.size = size
+        self.path = path
+        self.line_height = line_height(size, path)
+        self.spacing = int(self.line_height * LINE_GAP)
+        self.widths = tuple(measure(line, size, path) for line in lines)
+
+    @property
+    def height(self) -> int:
+        if not self.lines:
+            return 0
+        return len(self.lines) * self.line_height + (len(self.lines) - 1) * self.spacing
+
+    @property
+    def font(self):
+        return load_font(self.size, self.path)
+
+    def positions(self, box: Tuple[int, int, int, int]) -> List[Tuple[int, int]]:
+        """Top-left of each line, centred horizontally and vertically in box (left, top, right, bottom)"""
+        left, top, right, bottom = box
+        y = top + (bottom - top - self.height) // 2
+        result = []
+        for width in self.widths:
+            result.append((int(left + (right - left - width) / 2), y))
+            y += self.line_height + self.spacing
+        return result
+
+
+def _split_word(word: str, size: int, max_width: float, path: str) -> List[str]:
+    """Break a word wider than the line into the longest pieces that fit"""
+    pieces = []
+    piece = ""
+    for char in word:
+        if piece and measure(piece + char, size, path) > max_width:
+            pieces.append(piece)
+            piece = char
+        else:
+            piece += char
+    if piece:
+        pieces.append(piece)
+    return pieces
+
+
+def wrap(text: str, size: int, max_width: float, path: str = FONT_PATH) -> List[str]:
+    """
+    Greedy word wrap at a font size. Line widths are summed from memoized
+    word and space widths, so re-wrapping the same words at another size or
+    width measures nothing new.
+    """
+    space = measure(" ", size, path)
+    lines: List[str] = []
+    line: List[str] = []
+    width = 0.0
+    for word in text.split():
+        word_width = measure(word, size, path)
+        if word_width > max_width:
+            if line:
+                lines.append(" ".join(line))
+            *full, rest = _split_word(word, size, max_width, path)
+            lines.extend(full)
+            line, width = [rest], measure(rest, size, path)
+        elif line and width + space + word_width > max_width:
+            lines.append(" ".join(line))
+            line, width = [word], word_width
+        else:
+            width += (space if line else 0.0) + word_width
+            line.append(word)
+    if line:
+        lines.append(" ".join(line))
+    return lines
+
+
+def _ellipsize(text: str, size: int, max_width: float, path: str) -> str:
+    """text cut at a word (or, failing that, a character) boundary so it fits with a trailing ellipsis"""
+    if measure(text, size, path) <= max_width:
+        return text
+    words = text.split()
+    while len(words) > 1:
+        words.pop()
+        candidate = " ".join(words).rstrip(",.;:-") + ELLIPSIS
+        if measure(candidate, size, path) <= max_width:
+            return candidate
+    candidate = text
+    while candidate and measure(candidate + ELLIPSIS, size, path) > max_width:
+        candidate = candidate[:-1]
+    return candidate + ELLIPSIS if candidate else ""
+
+
+@lru_cache(maxsize=4096)
+def fit_text(
+    text: str,
+    max_width: int,
+    max_height: int,
+    max_size: int,
+    min_size: int,
+    max_lines: int = 1,
+    path: str = FONT_PATH,
+) -> TextBlock:
+    """
+    Lay text out at the largest font size in [min_size, max_size] where it
+    wraps into at most max_lines lines within max_width x max_height.
+    Larger sizes never need fewer lines, so the size is found by binary
+    search. When even min_size doesn't fit, the text is set at min_size and
+    cut to max_lines with an ellipsis. Results are memoized, so each ad
+    size lays out a given text once.
+    """
+    text = " ".join(str(text).split())
+    min_size = max(1, min(min_size, max_size))
+
+    def layout(size: int) -> TextBlock:
+        return TextBlock(tuple(wrap(text, size, max_width, path)), size, path)
+
+    low, high = min_size, max_size
+    best = None
+    while low <= high:
+        size = (low + high) // 2
+        block = layout(size)
+        if len(block.lines) <= max_lines and block.height <= max_height:
+            best = block
+            low = size + 1
+        else:
+            high = size - 1
+    if best is not None:
+        return best
+
+    lines = wrap(text, min_size, max_width, path)
+    height = line_height(min_size, path)
+    gap = int(height * LINE_GAP)
+    fitting = max(1, min(max_lines, (max_height + gap) // max(1, height + gap)))
+    if len(lines) > fitting:
+        lines = lines[:fitting - 1] + [_ellipsize(" ".join(lines[fitting - 1:]), min_size, max_width, path)]
+    return TextBlock(tuple(lines), min_size, path)
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.logging_config import get_logger
+from services.metrics import Gauge, Histogram, registry
+
+logger = get_logger(__name__)
+
+worker_ready = registry.register(Gauge(
+    "adgen_worker_ready",
+    "1 once start-up warm-up has finished and the worker accepts traffic, 0 while warming or draining.",
+))
+warmup_step_duration = registry.register(Histogram(
+    "adgen_warmup_step_seconds",
+    "Duration of each start-up warm-up step.",
+    ("step",),
+))
+
+
+class Warmup:
+    """
+    Start-up warm-up and the readiness flag behind /ready.
+
+    Steps run in order in the background after start-up, so /health answers
+    immediately while /ready reports 503 until every step has run. A step
+    that fails or overruns WARMUP_STEP_TIMEOUT is logged and reported but
+    does not keep the worker out of rotation: it is no colder than it would
+    have been without warm-up. The worker turns unready again on shutdown
+    so the load balancer stops routing to it while it drains.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+        self.step_timeout = float(os.getenv("WARMUP_STEP_TIMEOUT", "30"))
+        self._steps: List[Tuple[str, Callable[[], Awaitable[Any]]]] = []
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.ready = False
+        self.draining = False
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        worker_ready.set(0)
+
+    def add_step(self, name: str, step: Callable[[], Awaitable[Any]]):
+        self._steps.append((name, step))
+
+    def start(self):
+        """Run the steps in a background task (or mark ready straight away when disabled)"""
+        self.started_at = time.time()
+        if not self.enabled:
+            self._set_ready()
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        for name, step in self._steps:
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(step(), timeout=self.step_timeout)
+                status, error = "ok", None
+            except asyncio.TimeoutError:
+                status, error = "timeout", f"exceeded {self.step_timeout:g}s"
+            except Exception as e:
+                status, error = "error", str(e)
+            elapsed = time.perf_counter() - started
+            warmup_step_duration.observe(elapsed, step=name)
+            self.results[name] = {"status": status, "duration_ms": round(elapsed * 1000, 1)}
+            if error:
+                self.results[name]["error"] = error
+                logger.warning("Warm-up step %s %s: %s", name, status, error)
+        self._set_ready()
+        logger.info("Warm-up finished in %.0f ms", (self.finished_at - self.started_at) * 1000)
+
+    def _set_ready(self):
+        self.finished_at = time.time()
+        if not self.draining:
+            self.ready = True
+            worker_ready.set(1)
+
+    def drain(self):
+        self.draining = True
+        self.ready = False
+        worker_ready.set(0)
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def snapshot(self) -> Dict[str, Any]:
+        if self.draining:
+            status = "draining"
+        elif self.ready:
+            status = "ready"
+        else:
+            status = "warming"
+        report = {"status": status, "steps": dict(self.results)}
+        if self.started_at is not None:
+            report["uptime_seconds"] = round(time.time() - self.started_at, 1)
+        if self.finished_at is not None and self.started_at is not None:
+            report["warmup_ms"] = round((self.finished_at - self.started_at) * 1000, 1)
+        return report
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Keep caches and learned state written by the services out of the working tree
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="adgen-tests-"))
@@ -0,0 +1,126 @@
+import asyncio
+
+import httpx
+import pytest
+
+import main
+from services.admission import AdmissionController, AdmissionLimiter, AdmissionRejected
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_admits_up_to_max_in_flight():
+    async def scenario():
+        limiter = AdmissionLimiter("test", max_in_flight=2, max_queue=0, queue_timeout=1)
+        await limiter.acquire()
+        await limiter.acquire()
+        assert limiter.in_flight == 2
+        with pytest.raises(AdmissionRejected) as rejected:
+            await limiter.acquire()
+        assert rejected.value.reason == "queue_full"
+        assert rejected.value.retry_after >= 1
+        limiter.release()
+        await limiter.acquire()
+        assert limiter.in_flight == 2
+
+    run(scenario())
+
+
+def test_queue_timeout_rejects():
+    async def scenario():
+        limiter = AdmissionLimiter("test", max_in_flight=1, max_queue=1, queue_timeout=0.01)
+        await limiter.acquire()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await limiter.acquire()
+        assert rejected.value.reason == "queue_timeout"
+        assert limiter.queue_depth == 0
+        assert limiter.in_flight == 1
+
+    run(scenario())
+
+
+def test_release_hands_slot_to_oldest_waiter():
+    async def scenario():
+        limiter = AdmissionLimiter("test", max_in_flight=1, max_queue=2, queue_timeout=5)
+        await limiter.acquire()
+        admitted = []
+
+        async def wait(name):
+            await limiter.acquire()
+            admitted.append(name)
+
+        first = asyncio.create_task(wait("first"))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(wait("second"))
+        await asyncio.sleep(0)
+        assert limiter.queue_depth == 2
+
+        limiter.release()
+        await first
+        assert admitted == ["first"]
+        assert limiter.in_flight == 1
+        limiter.release()
+        await second
+        assert admitted == ["first", "second"]
+        assert limiter.in_flight == 1
+
+    run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        limiter = AdmissionLimiter("test", max_in_flight=1, max_queue=1, queue_timeout=5)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.queue_depth == 0
+        limiter.release()
+        assert limiter.in_flight == 0
+
+    run(scenario())
+
+
+def test_retry_after_grows_with_backlog():
+    limiter = AdmissionLimiter("test", max_in_flight=2, max_queue=10, queue_timeout=5)
+    limiter._service_time = 3.0
+    limiter.in_flight = 2
+    assert limiter.retry_after() == 3
+    limiter._waiters.extend([object()] * 4)
+    assert limiter.retry_after() == 9
+
+
+def test_endpoint_sheds_with_429_and_retry_after(monkeypatch):
+    monkeypatch.setenv("ADMISSION_MAX_IN_FLIGHT", "ad=1")
+    monkeypatch.setenv("ADMISSION_MAX_QUEUE", "ad=0")
+    monkeypatch.setattr(main, "admission", AdmissionController({"/api/generate-ad-from-url": "ad"}))
+
+    async def scenario():
+        started = asyncio.Event()
+        finish = asyncio.Event()
+
+        async def scrape_product(url):
+            started.set()
+            await finish.wait()
+            return None
+
+        monkeypatch.setattr(main.product_scraper, "scrape_product", scrape_product)
+        body = {"product_url": "https://shop.example.com/products/1"}
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            busy = asyncio.create_task(client.post("/api/generate-ad-from-url", json=body))
+            await started.wait()
+            shed = await client.post("/api/generate-ad-from-url", json=body)
+            finish.set()
+            first = await busy
+        return first, shed
+
+    first, shed = run(scenario())
+    assert shed.status_code == 429
+    assert int(shed.headers["Retry-After"]) >= 1
+    # The admitted request ran to completion (no product found)
+    assert first.status_code == 400
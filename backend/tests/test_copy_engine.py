@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from services.copy_engine import CAPTION_TEMPLATES, CopyEngine, copy_engine, short_title, tokenize
+from services.llm_service import LLMService
+
+PRODUCT = {
+    "title": "Kawaii Cat Vinyl Sticker Pack, Waterproof (50 pcs)",
+    "description": "Waterproof vinyl stickers with cute cats for laptops, bottles and journals. Free shipping.",
+    "category": "Stickers",
+}
+
+
+def test_analyze_is_deterministic():
+    first = copy_engine.analyze(PRODUCT)
+    assert copy_engine.analyze(dict(PRODUCT)) == first
+    # A separately built engine over the same corpus agrees
+    assert CopyEngine().analyze(PRODUCT) == first
+
+
+def test_analyze_shape():
+    result = copy_engine.analyze(PRODUCT)
+    assert set(result) == {"primary_cta", "keywords", "captions", "target_audience"}
+    assert result["primary_cta"] == "GRAB YOURS"
+    assert result["target_audience"] == "Fans personalising laptops, bottles and journals"
+    assert len(result["captions"]) == 3
+    assert all(keyword == keyword.upper() for keyword in result["keywords"])
+    assert all(isinstance(keyword, str) for keyword in result["keywords"])
+
+
+def test_keywords_skip_stop_and_commerce_words():
+    keywords = copy_engine.rank_keywords(PRODUCT)
+    assert "shipping" not in keywords
+    assert "free" not in keywords
+    assert "with" not in keywords
+    assert "pcs" not in keywords
+
+
+def test_title_words_outrank_description_words():
+    keywords = copy_engine.rank_keywords({"title": "Brass Lamp", "description": "A lamp for walnut desks"})
+    assert keywords.index("brass") < keywords.index("walnut")
+
+
+def test_rank_keywords_respects_limit():
+    assert len(copy_engine.rank_keywords(PRODUCT, limit=3)) == 3
+    assert copy_engine.rank_keywords({}) == []
+
+
+def test_empty_listing_gets_filler_copy():
+    result = copy_engine.analyze({})
+    assert result["primary_cta"] == "SHOP NOW"
+    assert result["keywords"] == ["STYLE", "QUALITY", "VALUE"]
+    assert len(result["captions"]) == 3
+
+
+def test_caption_rotation_depends_on_title():
+    openers = {
+        copy_engine.analyze({"title": f"Product {i}"})["captions"][0].replace(f"Product {i}", "{title}")
+        for i in range(20)
+    }
+    assert 1 < len(openers) <= len(CAPTION_TEMPLATES)
+
+
+@pytest.mark.parametrize("title, expected", [
+    ("Acme: Walnut Writing Desk, 120cm (Brown)", "Walnut Writing Desk"),
+    ("Brass Desk Lamp - Warm White | Lamp Store", "Brass Desk Lamp"),
+    ("Plain Title", "Plain Title"),
+    ("Limited edition: the big one", "Limited edition: the big one"),
+])
+def test_short_title(title, expected):
+    assert short_title(title) == expected
+
+
+def test_tokenize():
+    assert tokenize("The Cat's 3 new T-Shirts!") == ["cat's", "t-shirts"]
+
+
+def test_unreadable_corpus_falls_back_to_term_frequency(tmp_path):
+    engine = CopyEngine(corpus_path=str(tmp_path / "missing.txt"))
+    assert engine.rank_keywords({"title": "Brass Lamp Brass"})[0] == "brass"
+
+
+def test_llm_service_fast_mode_is_local(monkeypatch):
+    service = LLMService()
+
+    async def unexpected(*args, **kwargs):
+        raise AssertionError("fast mode must not call a provider")
+
+    monkeypatch.setattr(service, "_complete_text", unexpected)
+    monkeypatch.setattr(service, "_stream_product_analysis", unexpected)
+    assert asyncio.run(service.analyze_product(PRODUCT, mode="fast")) == copy_engine.analyze(PRODUCT)
+    assert service._default_product_analysis(PRODUCT) == copy_engine.analyze(PRODUCT)
@@ -0,0 +1,112 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from services.deadline import mark_degraded
+from services.product_state import ProductStateStore
+
+PRODUCT = {
+    "title": "Alpine Fleece Hoodie",
+    "description": "Warm recycled fleece hoodie with a zip pocket for cold mountain mornings",
+    "price": "$59.00",
+    "image_url": "",
+    "category": "Apparel",
+}
+
+LLM_COPY = {
+    "primary_cta": "GET YOURS",
+    "keywords": ["WARM", "COSY"],
+    "captions": ["Written by the LLM"],
+    "target_audience": "Hikers",
+}
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    """The ad endpoint with a canned scrape, a stub LLM and no rendering; .calls lists the copy modes the LLM saw"""
+    calls = []
+    failing = []
+
+    async def scrape_product(url):
+        return dict(PRODUCT)
+
+    async def analyze_product(product_info, ready=None, mode="llm"):
+        calls.append(mode)
+        if mode == "fast":
+            return main.llm_service.local_copy(product_info)
+        if failing:
+            mark_degraded("copy_analysis", reason="error")
+            return main.llm_service._default_product_analysis(product_info)
+        return dict(LLM_COPY)
+
+    async def generate_ad_creatives(**kwargs):
+        return {"ad_sizes": {}, "images": []}
+
+    monkeypatch.setattr(main.product_scraper, "scrape_product", scrape_product)
+    monkeypatch.setattr(main.llm_service, "analyze_product", analyze_product)
+    monkeypatch.setattr(main.llm_service, "copy_mode", "llm")
+    monkeypatch.setattr(main.llm_service, "combined_analysis", False)
+    monkeypatch.setattr(main.image_service, "generate_ad_creatives", generate_ad_creatives)
+    monkeypatch.setattr(main.image_service, "backgrounds_enabled", False)
+    monkeypatch.setattr(main, "product_state", ProductStateStore(path=str(tmp_path / "product_state.json")))
+    test_client = TestClient(main.app)
+    test_client.calls = calls
+    test_client.failing = failing
+    return test_client
+
+
+def generate(client, copy_mode=None):
+    body = {"product_url": "https://shop.example.com/products/alpine-hoodie"}
+    if copy_mode is not None:
+        body["copy_mode"] = copy_mode
+    response = client.post("/api/generate-ad-from-url", json=body)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_fast_copy_is_local_and_deterministic(client):
+    first = generate(client, "fast")
+    second = generate(client, "fast")
+    assert client.calls == []
+    assert first["primary_cta"] == second["primary_cta"]
+    assert first["keywords"] == second["keywords"] == main.llm_service.local_copy(PRODUCT)["keywords"]
+
+
+def test_llm_after_fast_calls_the_llm(client):
+    generate(client, "fast")
+    result = generate(client, "llm")
+    assert client.calls == ["llm"]
+    assert result["primary_cta"] == LLM_COPY["primary_cta"]
+    assert result["keywords"] == LLM_COPY["keywords"]
+
+
+def test_fast_after_llm_does_not_reuse_llm_copy(client):
+    generate(client, "llm")
+    result = generate(client, "fast")
+    assert client.calls == ["llm"]
+    assert result["keywords"] == main.llm_service.local_copy(PRODUCT)["keywords"]
+
+
+def test_unchanged_product_reuses_llm_copy(client):
+    generate(client, "llm")
+    result = generate(client, "llm")
+    assert client.calls == ["llm"]
+    assert result["primary_cta"] == LLM_COPY["primary_cta"]
+
+
+def test_request_mode_overrides_fast_default(client, monkeypatch):
+    monkeypatch.setattr(main.llm_service, "copy_mode", "fast")
+    generate(client)
+    assert client.calls == []
+    result = generate(client, "llm")
+    assert client.calls == ["llm"]
+    assert result["primary_cta"] == LLM_COPY["primary_cta"]
+
+
+def test_failed_llm_copy_is_not_reused(client):
+    client.failing.append(True)
+    generate(client, "llm")
+    client.failing.clear()
+    result = generate(client, "llm")
+    assert client.calls == ["llm", "llm"]
+    assert result["primary_cta"] == LLM_COPY["primary_cta"]
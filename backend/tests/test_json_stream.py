@@ -0,0 +1,157 @@
+import json
+
+import pytest
+
+from services.json_stream import IncrementalJSONParser, parse_json_object
+
+
+def whole(text):
+    return [text]
+
+
+def by_char(text):
+    return list(text)
+
+
+CHUNKINGS = pytest.mark.parametrize("chunks", [whole, by_char], ids=["whole", "by_char"])
+
+
+def feed_all(text, chunks):
+    """Feed text to a new parser in the given chunks; returns the parser and every field completed, in order"""
+    parser = IncrementalJSONParser()
+    completed = []
+    for chunk in chunks(text):
+        completed.extend(parser.feed(chunk))
+    return parser, completed
+
+
+@CHUNKINGS
+def test_plain_object(chunks):
+    text = '{"primary_cta": "SHOP NOW", "keywords": ["A", "B"], "count": 3}'
+    parser, completed = feed_all(text, chunks)
+    assert parser.done
+    assert parser.result() == json.loads(text)
+    assert [key for key, _ in completed] == ["primary_cta", "keywords", "count"]
+
+
+@CHUNKINGS
+def test_skips_prose_before_object(chunks):
+    text = 'Sure! Here is the analysis you asked for:\n\n{"primary_cta": "BUY NOW"}\nHope this helps.'
+    parser, _ = feed_all(text, chunks)
+    assert parser.done
+    assert parser.result() == {"primary_cta": "BUY NOW"}
+
+
+@CHUNKINGS
+def test_skips_code_fence(chunks):
+    text = '```json\n{"category": "Sticker", "keywords": ["cute"]}\n```'
+    parser, _ = feed_all(text, chunks)
+    assert parser.result() == {"category": "Sticker", "keywords": ["cute"]}
+
+
+@CHUNKINGS
+def test_braces_and_brackets_inside_strings(chunks):
+    text = '{"caption": "Use {code} and [tags], then }", "cta": "GO]"}'
+    parser, completed = feed_all(text, chunks)
+    assert parser.result() == {"caption": "Use {code} and [tags], then }", "cta": "GO]"}
+    assert dict(completed)["cta"] == "GO]"
+
+
+@CHUNKINGS
+def test_escaped_quotes_inside_strings(chunks):
+    text = r'{"caption": "The \"best\" lamp, {really}", "path": "C:\\dir\\", "cta": "OK"}'
+    parser, _ = feed_all(text, chunks)
+    assert parser.result() == json.loads(text)
+    assert parser.get("caption") == 'The "best" lamp, {really}'
+    assert parser.get("path") == "C:\\dir\\"
+
+
+@CHUNKINGS
+def test_escaped_quote_in_key(chunks):
+    text = r'{"say \"hi\"": 1, "next": 2}'
+    parser, completed = feed_all(text, chunks)
+    assert completed == [('say "hi"', 1), ("next", 2)]
+
+
+@CHUNKINGS
+def test_nested_values_in_top_level_array(chunks):
+    text = '{"items": [{"name": "a", "tags": ["x", "y"]}, [1, [2, 3]], "s, with comma", {"n": {"m": []}}], "after": true}'
+    parser, completed = feed_all(text, chunks)
+    expected = json.loads(text)
+    assert parser.result() == expected
+    assert dict(completed) == expected
+
+
+@CHUNKINGS
+def test_nested_object_value(chunks):
+    text = '{"meta": {"a": [1, 2], "b": {"c": "}"}}, "cta": "SHOP"}'
+    parser, completed = feed_all(text, chunks)
+    assert completed == [("meta", {"a": [1, 2], "b": {"c": "}"}}), ("cta", "SHOP")]
+
+
+def test_fields_complete_as_they_stream():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"primary_cta": "SHOP NOW"') == []
+    assert parser.feed(', "keywords": ["A", ') == [("primary_cta", "SHOP NOW")]
+    assert parser.get("primary_cta") == "SHOP NOW"
+    assert parser.get("keywords") == ["A"]
+    assert not parser.done
+    assert parser.feed('"B"]}') == [("keywords", ["A", "B"])]
+    assert parser.done
+
+
+def test_array_items_exposed_one_at_a_time():
+    parser = IncrementalJSONParser()
+    seen = []
+    for char in '{"keywords": ["ONE", "TWO", {"k": [1]}], "x": 1}':
+        parser.feed(char)
+        items = parser.get("keywords")
+        if items and items != (seen[-1] if seen else None):
+            seen.append(list(items))
+    assert seen == [["ONE"], ["ONE", "TWO"], ["ONE", "TWO", {"k": [1]}]]
+
+
+@CHUNKINGS
+def test_salvages_truncated_output(chunks):
+    text = '{"primary_cta": "SHOP NOW", "keywords": ["A", "B", "C'
+    parser, _ = feed_all(text, chunks)
+    assert not parser.done
+    assert parser.result() == {"primary_cta": "SHOP NOW", "keywords": ["A", "B"]}
+
+
+@CHUNKINGS
+def test_truncated_in_nested_value_keeps_completed_fields(chunks):
+    text = '{"cta": "GO", "meta": {"a": [1, 2'
+    parser, _ = feed_all(text, chunks)
+    assert parser.result() == {"cta": "GO"}
+
+
+@CHUNKINGS
+def test_nothing_usable(chunks):
+    parser, _ = feed_all('I could not analyze this image. {"cta": ', chunks)
+    assert parser.result() is None
+    parser, _ = feed_all("no json here", chunks)
+    assert parser.result() is None
+
+
+@CHUNKINGS
+def test_ignores_text_after_object(chunks):
+    text = '{"a": 1} {"b": 2}'
+    parser, completed = feed_all(text, chunks)
+    assert completed == [("a", 1)]
+    assert parser.result() == {"a": 1}
+
+
+@pytest.mark.parametrize("split", range(1, 40))
+def test_chunk_boundary_anywhere(split):
+    text = 'ok: {"t": "a \\"b\\" {c}", "k": [1, {"d": "]"}], "n": null}'
+    parser = IncrementalJSONParser()
+    parser.feed(text[:split])
+    parser.feed(text[split:])
+    assert parser.result() == json.loads(text[text.index("{"):])
+
+
+def test_parse_json_object():
+    assert parse_json_object('```json\n{"a": {"b": [1]}}\n```') == {"a": {"b": [1]}}
+    assert parse_json_object("") is None
+    assert parse_json_object(None) is None
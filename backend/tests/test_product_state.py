@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from services.product_state import STAGES, ProductStateStore, affected_stages, changed_fields
+
+PRODUCT = {
+    "title": "Walnut Writing Desk",
+    "description": "Solid walnut writing desk with brass handles",
+    "price": "$499",
+    "image_url": "https://shop.example.com/desk.jpg",
+    "copy_mode": "llm",
+}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv("PRODUCT_STATE_ENABLED", "true")
+    monkeypatch.setenv("PRODUCT_STATE_SAVE_INTERVAL", "3600")
+    return ProductStateStore(path=str(tmp_path / "product_state.json"))
+
+
+@pytest.mark.parametrize("changed, expected", [
+    (set(), set()),
+    ({"price"}, set()),
+    ({"image_url"}, {"classify", "render"}),
+    ({"title"}, {"copy_analysis", "render"}),
+    ({"description"}, {"copy_analysis", "render"}),
+    ({"copy_mode"}, {"copy_analysis", "render"}),
+    ({"title", "image_url"}, {"classify", "copy_analysis", "render"}),
+])
+def test_affected_stages(changed, expected):
+    assert affected_stages(changed) == expected
+
+
+def test_changed_fields():
+    assert changed_fields(PRODUCT, dict(PRODUCT)) == set()
+    assert changed_fields(PRODUCT, dict(PRODUCT, price="$449", title="Oak Desk")) == {"price", "title"}
+    # Untracked fields don't count
+    assert changed_fields(PRODUCT, dict(PRODUCT, category="Furniture")) == set()
+
+
+def test_new_product_runs_every_stage(store):
+    assert store.get("https://shop.example.com/desk") is None
+    assert store.plan(None, PRODUCT) == set(STAGES)
+
+
+def test_regeneration_reruns_only_affected_stages(store):
+    url = "https://shop.example.com/desk"
+    store.record(url, PRODUCT, analysis={"primary_cta": "SHOP NOW"}, category="Artist")
+    previous = store.get(url)
+    assert previous["outputs"] == {"analysis": {"primary_cta": "SHOP NOW"}, "category": "Artist"}
+    assert store.plan(previous, dict(PRODUCT)) == set()
+    assert store.plan(previous, dict(PRODUCT, price="$449")) == set()
+    assert store.plan(previous, dict(PRODUCT, title="Oak Writing Desk")) == {"copy_analysis", "render"}
+    assert store.plan(previous, dict(PRODUCT, image_url="https://shop.example.com/desk2.jpg")) == {"classify", "render"}
+    assert store.plan(previous, dict(PRODUCT, copy_mode="fast")) == {"copy_analysis", "render"}
+
+
+def test_entries_expire(store):
+    url = "https://shop.example.com/desk"
+    store.record(url, PRODUCT, category="Artist")
+    store.max_age = 60
+    store._entries[url]["updated_at"] = time.time() - 61
+    assert store.get(url) is None
+
+
+def test_oldest_entries_are_evicted(store):
+    store.max_entries = 2
+    for i in range(3):
+        store.record(f"https://shop.example.com/{i}", PRODUCT)
+    assert store.get("https://shop.example.com/0") is None
+    assert store.get("https://shop.example.com/2") is not None
+    assert len(store) == 2
+
+
+def test_state_survives_a_restart(store):
+    url = "https://shop.example.com/desk"
+    store.record(url, PRODUCT, analysis={"keywords": ["WALNUT"]}, category="Artist")
+    store.save()
+    reloaded = ProductStateStore(path=store.path)
+    assert reloaded.get(url)["outputs"]["analysis"] == {"keywords": ["WALNUT"]}
+    assert reloaded.plan(reloaded.get(url), dict(PRODUCT)) == set()
+
+
+def test_disabled_store_remembers_nothing(tmp_path, monkeypatch):
+    monkeypatch.setenv("PRODUCT_STATE_ENABLED", "false")
+    store = ProductStateStore(path=str(tmp_path / "product_state.json"))
+    store.record("https://shop.example.com/desk", PRODUCT, category="Artist")
+    assert store.get("https://shop.example.com/desk") is None
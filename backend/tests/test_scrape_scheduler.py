@@ -0,0 +1,152 @@
+import asyncio
+import types
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services import scrape_scheduler
+from services.scrape_scheduler import RetryableScrapeError, ScrapeScheduler, TokenBucket, parse_retry_after
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Deterministic monotonic clock: sleeping advances it instantly and is recorded in .sleeps"""
+    real_sleep = asyncio.sleep
+    fake = types.SimpleNamespace(now=1000.0, sleeps=[])
+
+    async def sleep(seconds):
+        fake.sleeps.append(seconds)
+        fake.now += max(0.0, seconds)
+        await real_sleep(0)
+
+    monkeypatch.setattr(scrape_scheduler, "time", types.SimpleNamespace(monotonic=lambda: fake.now))
+    monkeypatch.setattr(scrape_scheduler, "asyncio", types.SimpleNamespace(sleep=sleep, Semaphore=asyncio.Semaphore))
+    return fake
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setenv("SCRAPE_DOMAIN_RPS", "2")
+    monkeypatch.setenv("SCRAPE_DOMAIN_BURST", "4")
+    monkeypatch.setenv("SCRAPE_DOMAIN_CONCURRENCY", "2")
+    monkeypatch.setenv("SCRAPE_MAX_RETRIES", "2")
+    return ScrapeScheduler()
+
+
+def test_bucket_allows_a_burst_then_paces_at_the_rate(clock):
+    bucket = TokenBucket(rate=2, burst=4)
+
+    async def take(count):
+        for _ in range(count):
+            await bucket.acquire()
+
+    asyncio.run(take(4))
+    assert clock.now == 1000.0
+    asyncio.run(take(6))
+    assert clock.now == pytest.approx(1003.0)
+
+
+def test_bucket_refills_while_idle_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2, burst=4)
+
+    async def take(count):
+        for _ in range(count):
+            await bucket.acquire()
+
+    asyncio.run(take(4))
+    clock.now += 60
+    asyncio.run(take(4))
+    assert clock.now == 1060.0
+    asyncio.run(take(1))
+    assert clock.now == pytest.approx(1060.5)
+
+
+def test_burst_below_one_still_admits_one_request(clock):
+    bucket = TokenBucket(rate=1, burst=0)
+    asyncio.run(bucket.acquire())
+    assert clock.sleeps == []
+
+
+def test_domains_are_limited_independently(clock, scheduler):
+    async def fetch():
+        return "ok"
+
+    async def scenario():
+        for _ in range(4):
+            await scheduler.run("https://a.example.com/p", fetch)
+        started = clock.now
+        for _ in range(4):
+            await scheduler.run("https://b.example.com/p", fetch)
+        return started
+
+    started = asyncio.run(scenario())
+    # b's burst is untouched by a's requests
+    assert clock.now == started
+
+
+def test_concurrency_cap_per_domain(clock, scheduler):
+    async def scenario():
+        active = 0
+        peak = 0
+        release = asyncio.Event()
+
+        async def fetch():
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await release.wait()
+            active -= 1
+            return "ok"
+
+        tasks = [asyncio.create_task(scheduler.run("https://a.example.com/p", fetch)) for _ in range(4)]
+        for _ in range(5):
+            await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+        return peak
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_retry_after_pauses_the_domain_then_succeeds(clock, scheduler):
+    attempts = []
+
+    async def fetch():
+        attempts.append(clock.now)
+        if len(attempts) == 1:
+            raise RetryableScrapeError("HTTP 429", status=429, retry_after=7)
+        return "ok"
+
+    assert asyncio.run(scheduler.run("https://a.example.com/p", fetch)) == "ok"
+    assert attempts[1] - attempts[0] >= 7
+    assert scheduler._domains["a.example.com"].blocked_until == pytest.approx(attempts[0] + 7)
+
+
+def test_gives_up_after_max_retries(clock, scheduler):
+    attempts = []
+
+    async def fetch():
+        attempts.append(clock.now)
+        raise RetryableScrapeError("HTTP 503", status=503)
+
+    with pytest.raises(RetryableScrapeError):
+        asyncio.run(scheduler.run("https://a.example.com/p", fetch))
+    assert len(attempts) == 3
+    # Jittered backoff stays within base * 2^attempt
+    assert all(0 <= delay <= 0.5 * 2 ** i for i, delay in enumerate(clock.sleeps))
+
+
+def test_backoff_is_capped(scheduler):
+    scheduler.backoff_max = 2.0
+    assert all(scheduler._backoff(10) <= 2.0 for _ in range(100))
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 <= parse_retry_after(format_datetime(later, usegmt=True)) <= 30
+    earlier = datetime.now(timezone.utc) - timedelta(seconds=30)
+    assert parse_retry_after(format_datetime(earlier, usegmt=True)) == 0.0
@@ -0,0 +1,74 @@
+import pytest
+
+from services.text_layout import ELLIPSIS, TextBlock, fit_text, line_height, measure, wrap
+
+
+def fits(block, max_width, max_height, max_lines):
+    return (
+        len(block.lines) <= max_lines
+        and block.height <= max_height
+        and all(width <= max_width for width in block.widths)
+    )
+
+
+@pytest.mark.parametrize("text, max_width, max_height, max_lines", [
+    ("SHOP NOW", 400, 80, 1),
+    ("Solid Walnut Writing Desk With Brass Handles", 500, 120, 2),
+    ("BUY", 1000, 40, 1),
+    ("Hand-drawn botanical art print", 300, 200, 3),
+])
+def test_fit_is_the_largest_size_that_fits(text, max_width, max_height, max_lines):
+    block = fit_text(text, max_width, max_height, 200, 8, max_lines)
+    assert fits(block, max_width, max_height, max_lines)
+    assert " ".join(block.lines) == text
+    if block.size < 200:
+        # One size larger no longer fits: the binary search found the boundary
+        larger = TextBlock(tuple(wrap(text, block.size + 1, max_width)), block.size + 1)
+        assert not fits(larger, max_width, max_height, max_lines)
+
+
+def test_size_stays_within_bounds():
+    assert fit_text("HI", 2000, 2000, 48, 12).size == 48
+    assert fit_text("A very long headline that cannot possibly fit", 40, 10, 48, 12).size == 12
+
+
+def test_min_size_above_max_is_clamped():
+    assert fit_text("SHOP", 500, 100, 20, 30).size == 20
+
+
+def test_overflow_at_min_size_is_ellipsized():
+    text = "Extra long product title that goes on and on well past any reasonable length"
+    block = fit_text(text, 200, 1000, 40, 14, max_lines=2)
+    assert block.size == 14
+    assert len(block.lines) == 2
+    assert block.lines[-1].endswith(ELLIPSIS)
+    assert all(width <= 200 for width in block.widths)
+
+
+def test_lines_limited_by_height_at_min_size():
+    block = fit_text("one two three four five six seven eight nine ten", 60, line_height(14), 40, 14, max_lines=5)
+    assert len(block.lines) == 1
+    assert block.lines[0].endswith(ELLIPSIS)
+
+
+def test_whitespace_is_normalised():
+    assert fit_text("  SHOP \n NOW  ", 500, 100, 30, 10).lines == ("SHOP NOW",)
+
+
+def test_fit_is_memoized():
+    first = fit_text("Memo check", 300, 60, 40, 10)
+    assert fit_text("Memo check", 300, 60, 40, 10) is first
+
+
+def test_wrap_breaks_words_wider_than_the_line():
+    lines = wrap("Supercalifragilisticexpialidocious", 20, 60)
+    assert len(lines) > 1
+    assert "".join(lines) == "Supercalifragilisticexpialidocious"
+    assert all(measure(line, 20) <= 60 for line in lines)
+
+
+def test_positions_centre_the_block():
+    block = fit_text("SHOP NOW", 400, 80, 40, 10)
+    (x, y), = block.positions((0, 0, 400, 80))
+    assert x == pytest.approx((400 - block.widths[0]) / 2, abs=1)
+    assert y == (80 - block.height) // 2